@@ -0,0 +1,154 @@
+"""
+Agreement Summary - Resumo materializado das parcelas por acordo
+
+Perguntas sobre parcelamentos agregam repetidamente payments → payment_parcels
+por payable_id. A materialized view guarda esse resultado pronto, uma linha
+por acordo, e é atualizada com REFRESH ... CONCURRENTLY: as leituras continuam
+durante a atualização.
+
+Uso:
+    python agreement_summary.py --install   # cria a view e o índice único
+    python agreement_summary.py --refresh   # atualiza uma vez
+    python agreement_summary.py --watch     # atualiza quando payments/payment_parcels mudarem
+"""
+import argparse
+import time
+from typing import Optional
+import psycopg2
+from config import DB_CONFIG, AGREEMENT_SUMMARY_REFRESH_SECONDS
+from change_tracker import NOTIFY_CHANNEL
+from database import SUMMARY_TABLES
+
+
+VIEW_NAME = SUMMARY_TABLES[0]
+
+# Tabelas de origem: a view só é atualizada quando alguma delas muda
+SOURCE_TABLES = ['payments', 'payment_parcels']
+
+# Status de payment_parcels (payment_status): 5 = Pago, 1 = Aberto, 2 = Cancelado (0 é Simulado)
+CREATE_SQL = f"""
+    CREATE MATERIALIZED VIEW IF NOT EXISTS {VIEW_NAME} AS
+    SELECT
+        pm.payable_id AS agreement_id,
+        COUNT(*) AS total_parcels,
+        COUNT(*) FILTER (WHERE pp.status = 5) AS paid_parcels,
+        COUNT(*) FILTER (WHERE pp.status = 1) AS open_parcels,
+        COUNT(*) FILTER (WHERE pp.status = 2) AS cancelled_parcels,
+        COALESCE(SUM(pp.total), 0) AS total_amount,
+        COALESCE(SUM(pp.total) FILTER (WHERE pp.status = 5), 0) AS paid_amount,
+        COALESCE(SUM(pp.total) FILTER (WHERE pp.status = 1), 0) AS open_amount,
+        COALESCE(SUM(pp.total) FILTER (WHERE pp.status = 2), 0) AS cancelled_amount,
+        MIN(pp.due_date) AS first_due_date,
+        MAX(pp.due_date) AS last_due_date,
+        MIN(pp.due_date) FILTER (WHERE pp.status = 1) AS next_open_due_date,
+        MAX(pp.updated_at) AS last_parcel_update
+    FROM payments pm
+    JOIN payment_parcels pp ON pp.payment_id = pm.id
+    WHERE pm.payable_type = 'Agreement'
+      AND pm.payable_id IS NOT NULL
+    GROUP BY pm.payable_id
+    WITH DATA
+"""
+
+# REFRESH ... CONCURRENTLY exige um índice único sem condição
+INDEX_SQL = f"CREATE UNIQUE INDEX IF NOT EXISTS {VIEW_NAME}_agreement_id ON {VIEW_NAME} (agreement_id)"
+
+SOURCE_CHANGES_SQL = """
+    SELECT COALESCE(SUM(n_tup_ins + n_tup_upd + n_tup_del), 0)
+    FROM pg_stat_user_tables
+    WHERE schemaname = 'public' AND relname = ANY (%s)
+"""
+
+
+def _connect():
+    """Conexão de escrita com o primário (as sessões do chatbot são somente leitura)"""
+    connection = psycopg2.connect(**DB_CONFIG)
+    connection.autocommit = True  # REFRESH ... CONCURRENTLY não roda dentro de transação
+    return connection
+
+
+def install() -> None:
+    """Cria a materialized view (já populada) e o índice único"""
+    connection = _connect()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_SQL)
+            cursor.execute(INDEX_SQL)
+            cursor.execute(f"ANALYZE {VIEW_NAME}")
+        print(f"✅ {VIEW_NAME} criada")
+    finally:
+        connection.close()
+
+
+def refresh(connection=None, concurrently: bool = True) -> float:
+    """
+    Atualiza a view e avisa o monitoramento do cache (modo notify)
+
+    Args:
+        connection: Conexão de escrita (padrão: nova conexão com DB_CONFIG)
+        concurrently: Mantém a view legível durante a atualização
+
+    Returns:
+        Duração da atualização em segundos
+    """
+    own_connection = connection is None
+    connection = connection or _connect()
+    try:
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            mode = "CONCURRENTLY " if concurrently else ""
+            cursor.execute(f"REFRESH MATERIALIZED VIEW {mode}{VIEW_NAME}")
+            cursor.execute("SELECT pg_notify(%s, %s)", (NOTIFY_CHANNEL, VIEW_NAME))
+        elapsed = time.perf_counter() - started
+        print(f"🔄 {VIEW_NAME} atualizada em {elapsed:.1f}s")
+        return elapsed
+    finally:
+        if own_connection:
+            connection.close()
+
+
+def watch(interval: Optional[float] = None) -> None:
+    """
+    Atualiza a view sempre que as tabelas de origem mudarem
+
+    As alterações são detectadas pelos contadores de pg_stat_user_tables,
+    verificados a cada intervalo; sem alteração, nada é executado.
+
+    Args:
+        interval: Intervalo entre verificações em segundos (padrão: AGREEMENT_SUMMARY_REFRESH_SECONDS)
+    """
+    interval = interval or AGREEMENT_SUMMARY_REFRESH_SECONDS
+    connection = _connect()
+    last_changes = None
+    print(f"👀 Atualizando {VIEW_NAME} quando {', '.join(SOURCE_TABLES)} mudarem (a cada {interval:g}s)")
+    try:
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(SOURCE_CHANGES_SQL, (SOURCE_TABLES,))
+                changes = cursor.fetchone()[0]
+            if changes != last_changes:
+                refresh(connection)
+                last_changes = changes
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=f'Resumo materializado das parcelas por acordo ({VIEW_NAME})')
+    parser.add_argument('--install', action='store_true', help='Cria a view e o índice único')
+    parser.add_argument('--refresh', action='store_true', help='Atualiza a view uma vez')
+    parser.add_argument('--watch', action='store_true', help='Atualiza sempre que as tabelas de origem mudarem')
+    parser.add_argument('--interval', type=float, help='Intervalo de verificação do --watch em segundos')
+    args = parser.parse_args()
+
+    if args.install:
+        install()
+    if args.refresh:
+        refresh()
+    if args.watch:
+        watch(args.interval)
+    if not (args.install or args.refresh or args.watch):
+        parser.print_help()
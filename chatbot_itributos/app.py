@@ -5,13 +5,19 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+from concurrent.futures import Future
 import sys
 
 # Importar módulos locais
-from database import DatabaseService
-from llm_service import LLMService
-from cache_manager import CacheManager
+from question_cache import QuestionCache
+from result_codec import to_dataframe
+from cache_warmup import warm_up, start_startup_warmup
+from services import get_database, get_cache, get_question_cache, get_query_log, get_llm
+from cancellation import CancelToken, QueryCancelled, run_cancellable, run_in_background
+from contributors import extract_documents
+from config import CACHE_WARMUP_ON_STARTUP, EXAMPLE_QUESTIONS, REQUEST_DEADLINE_SECONDS
+import time
 
 
 # Configuração da página
@@ -107,24 +113,36 @@ st.markdown("""
 
 # Inicialização de serviços no session_state
 def init_services():
-    """Inicializa serviços se ainda não estiverem no session_state"""
+    """
+    Associa a sessão aos serviços compartilhados do processo
+    
+    Banco, cache e LLM são criados uma única vez por processo (services.py);
+    o session_state guarda apenas referências a eles e o estado do usuário.
+    """
     if 'db' not in st.session_state:
-        st.session_state.db = DatabaseService()
-        st.session_state.db.connect()
+        st.session_state.db = get_database()
     
     if 'cache' not in st.session_state:
-        st.session_state.cache = CacheManager()
+        st.session_state.cache = get_cache()
+        if CACHE_WARMUP_ON_STARTUP:
+            start_startup_warmup()
+    
+    if 'question_cache' not in st.session_state:
+        st.session_state.question_cache = get_question_cache()
     
     if 'llm_provider' not in st.session_state:
         st.session_state.llm_provider = 'gemini'
     
     if 'llm' not in st.session_state:
         try:
-            st.session_state.llm = LLMService(provider=st.session_state.llm_provider)
+            st.session_state.llm = get_llm(st.session_state.llm_provider)
         except Exception as e:
             st.error(f"Erro ao inicializar LLM: {e}")
             st.session_state.llm = None
     
+    if 'query_log' not in st.session_state:
+        st.session_state.query_log = get_query_log()
+    
     if 'chat_history' not in st.session_state:
         st.session_state.chat_history = []
     
@@ -156,7 +174,7 @@ def render_sidebar():
         if llm_option != st.session_state.llm_provider:
             st.session_state.llm_provider = llm_option
             try:
-                st.session_state.llm = LLMService(provider=llm_option)
+                st.session_state.llm = get_llm(llm_option)
                 st.success(f"✅ {llm_option.capitalize()} ativado!")
             except Exception as e:
                 st.error(f"❌ Erro ao ativar {llm_option}: {e}")
@@ -183,6 +201,54 @@ def render_sidebar():
             st.success("✅ Conectado")
             st.text(f"Database: {db_info['database']}")
             st.text(f"Tabelas: {db_info['tables_count']}")
+            pool_stats = st.session_state.db.get_pool_stats()
+            if pool_stats:
+                st.text(
+                    f"Conexões: {pool_stats['in_use']} em uso, {pool_stats['idle']} livres "
+                    f"(máx. {pool_stats['max_size']})"
+                )
+                if pool_stats['waits']:
+                    st.text(
+                        f"Esperas por conexão: {pool_stats['waits']} "
+                        f"(p95: {pool_stats['wait_p95_ms']:.0f} ms, timeouts: {pool_stats['timeouts']})"
+                    )
+            prepared = st.session_state.db.get_prepared_stats()
+            if prepared['prepared']:
+                st.text(
+                    f"Prepared statements: {prepared['prepared']}, "
+                    f"reaproveitados {prepared['reuse_rate']:.0%} das execuções"
+                )
+            contributors = st.session_state.db.get_contributor_cache_stats()
+            if contributors.get('entries'):
+                st.text(f"Contribuintes em memória: {contributors['entries']}")
+            for replica in st.session_state.db.get_replica_stats():
+                if replica['healthy']:
+                    st.text(
+                        f"Réplica {replica['name']}: atraso {replica['lag_seconds']:.0f}s, "
+                        f"{replica['in_use']} em uso, {replica['routed']} consultas"
+                    )
+                else:
+                    st.text(f"Réplica {replica['name']}: indisponível")
+            active = st.session_state.db.get_active_queries()
+            if active:
+                pids = ', '.join(f"{query['server']}/{query['pid']}" for query in active)
+                st.text(f"Consultas em execução: {len(active)} ({pids})")
+            metrics = st.session_state.db.get_query_metrics()
+            if metrics['count']:
+                st.text(
+                    f"Tempo no banco: p50 {metrics['wall_p50_ms']:.0f} ms, p95 {metrics['wall_p95_ms']:.0f} ms, "
+                    f"p99 {metrics['wall_p99_ms']:.0f} ms ({metrics['count']} execuções)"
+                )
+                if len(metrics['servers']) > 1:
+                    for server, server_stats in metrics['servers'].items():
+                        st.text(f"  {server}: p95 {server_stats['wall_p95_ms']:.0f} ms ({server_stats['count']})")
+                if metrics['planning_avg_ms'] is not None:
+                    st.text(f"Planejamento médio: {metrics['planning_avg_ms']:.1f} ms")
+                if metrics['errors'] or metrics['cancelled']:
+                    st.text(f"Erros: {metrics['errors']}, canceladas: {metrics['cancelled']}")
+                if st.button("📊 Exportar medições", use_container_width=True):
+                    count = st.session_state.db.dump_query_metrics()
+                    st.success(f"✅ {count} medições gravadas em cache/query_metrics.jsonl")
         else:
             st.error(f"❌ Erro: {db_info.get('error', 'Desconectado')}")
         
@@ -193,12 +259,66 @@ def render_sidebar():
         cache_stats = st.session_state.cache.get_stats()
         st.text(f"Consultas em cache: {cache_stats['size']}")
         st.text(f"TTL: {cache_stats['ttl_hours']:.1f}h")
+        st.text(f"Taxa de acerto: {cache_stats['hit_ratio']:.0%}")
+        st.text(
+            f"Disco: {cache_stats['bytes_used'] / 1024 / 1024:.1f} / "
+            f"{cache_stats['size_limit'] / 1024 / 1024:.0f} MB ({cache_stats['eviction_policy'].upper()})"
+        )
+        st.text(
+            f"Leitura: média {cache_stats['latency_mean_ms']:.1f} ms, p95 {cache_stats['latency_p95_ms']:.1f} ms"
+        )
+        st.text(
+            f"Remoções: {cache_stats['evictions'] + cache_stats['memory']['evictions']}"
+            f" (grandes demais: {cache_stats['skipped_too_large']})"
+        )
+        memory_stats = cache_stats['memory']
+        disk_stats = cache_stats['disk']
+        st.text(f"Memória: {memory_stats['entries']} itens, {memory_stats['bytes_used'] / 1024 / 1024:.1f} MB")
+        st.text(
+            f"Acertos memória: {memory_stats['hits']} ({memory_stats['avg_latency_ms']:.2f} ms)"
+        )
+        st.text(
+            f"Acertos disco: {disk_stats['hits']} ({disk_stats['avg_latency_ms']:.2f} ms)"
+        )
+        st.text(f"Falhas: {disk_stats['misses']}")
+        st.text(f"Invalidações por alteração: {cache_stats['invalidations']}")
+        if cache_stats['stale_hits']:
+            st.text(f"Expirados servidos: {cache_stats['stale_hits']} (atualizados: {cache_stats['revalidations']})")
+        if cache_stats['coalesced']:
+            st.text(f"Execuções compartilhadas: {cache_stats['coalesced']}")
+        shape_stats = st.session_state.cache.get_shape_stats(top=5)
+        if shape_stats:
+            with st.expander(f"Formatos de consulta ({cache_stats['shapes']})"):
+                for shape in shape_stats:
+                    st.caption(
+                        f"{shape['hits']}/{shape['hits'] + shape['misses']} acertos — {shape['shape'][:120]}"
+                    )
+        if st.session_state.question_cache:
+            question_stats = st.session_state.question_cache.get_stats()
+            st.text(f"Perguntas em cache: {question_stats['size']}")
         
         if st.button("🗑️ Limpar Cache", use_container_width=True):
             st.session_state.cache.clear()
+            if st.session_state.question_cache:
+                st.session_state.question_cache.clear()
             st.success("Cache limpo!")
             st.rerun()
         
+        if st.button("🔥 Aquecer Cache", use_container_width=True, disabled=st.session_state.llm is None):
+            with st.spinner("Aquecendo cache com exemplos e perguntas frequentes..."):
+                report = warm_up(
+                    st.session_state.db,
+                    st.session_state.cache,
+                    st.session_state.llm,
+                    st.session_state.question_cache
+                )
+            st.success(
+                f"Aquecimento: {report['covered']}/{report['total']} perguntas em cache "
+                f"em {report['duration_seconds']:.1f}s"
+            )
+            if report['errors']:
+                st.warning(f"{report['errors']} pergunta(s) com erro no aquecimento")
+        
         st.divider()
         
         # Histórico
@@ -213,6 +333,147 @@ def render_sidebar():
             st.rerun()
 
 
+def new_cancel_token() -> CancelToken:
+    """Cria o token da execução atual (acionado pelo botão Parar ou pelo prazo)"""
+    token = CancelToken(REQUEST_DEADLINE_SECONDS)
+    st.session_state.cancel_token = token
+    return token
+
+
+def wait_for(func, token: CancelToken, label: str, on_poll=None):
+    """
+    Executa func em segundo plano e aguarda mostrando o tempo decorrido
+    
+    Atualizar o contador é o ponto em que o Streamlit interrompe o script
+    quando o usuário clica em Parar; a interrupção cancela o token, que
+    cancela a consulta no banco ou a requisição ao LLM.
+    
+    Args:
+        func: Trabalho a executar (deve receber o token)
+        token: Token de cancelamento da execução
+        label: Texto exibido antes do tempo decorrido
+        on_poll: Chamado a cada verificação, na thread do script (opcional)
+    
+    Returns:
+        Resultado de func()
+    """
+    status = st.empty()
+    started = time.perf_counter()
+    
+    def poll():
+        status.caption(f"{label} ({time.perf_counter() - started:.0f}s)")
+        if on_poll is not None:
+            on_poll()
+    
+    result = run_cancellable(func, token, on_poll=poll)
+    status.empty()
+    return result
+
+
+def stream_sql_generation(question: str, schema_context: str,
+                          token: CancelToken) -> Tuple[Dict[str, Any], Optional[Future]]:
+    """
+    Gera o SQL mostrando a explicação enquanto o modelo a escreve
+    
+    O LLM responde em streaming; assim que o campo "sql" fica completo, a
+    avaliação de custo (EXPLAIN) começa em segundo plano, em paralelo com o
+    restante da resposta.
+    
+    Args:
+        question: Pergunta do usuário
+        schema_context: Schema enviado ao LLM
+        token: Token de cancelamento da execução
+    
+    Returns:
+        (resposta do LLM, Future da avaliação do SQL final ou None se não iniciada)
+    """
+    db = st.session_state.db
+    llm = st.session_state.llm
+    stream = {'reader': None, 'sql': None, 'check': None}
+    
+    def on_update(reader):
+        # Thread do LLM: só guarda o estado; a página é atualizada em render()
+        stream['reader'] = reader
+        sql = reader.fields.get('sql')
+        if isinstance(sql, str) and sql.strip() and sql != stream['sql']:
+            stream['sql'] = sql
+            stream['check'] = run_in_background(lambda: db.check_query(sql))
+    
+    sql_status = st.empty()
+    explanation_box = st.empty()
+    
+    def render():
+        reader = stream['reader']
+        if reader is None:
+            return
+        if stream['check'] is not None:
+            sql_status.caption("🧭 SQL recebido — avaliando o custo enquanto a explicação é gerada")
+        explanation = reader.partial('explanation')
+        if explanation:
+            cursor = '' if 'explanation' in reader.fields else ' ▌'
+            explanation_box.info(f"💡 **Explicação:** {explanation}{cursor}")
+    
+    llm_response = wait_for(
+        lambda: llm.generate_sql(question, schema_context, token=token, on_update=on_update),
+        token, "🤖 Aguardando o modelo", on_poll=render
+    )
+    sql_status.empty()
+    explanation_box.empty()
+    
+    # A avaliação só vale se foi do SQL final (o fallback do Gemini recomeça a resposta)
+    check = stream['check'] if stream['sql'] == llm_response.get('sql') else None
+    return llm_response, check
+
+
+def stream_results_explanation(response: Dict[str, Any], df: pd.DataFrame) -> str:
+    """
+    Explica os resultados em linguagem natural, mostrando o texto enquanto o modelo escreve
+
+    Args:
+        response: Resposta exibida (pergunta, SQL)
+        df: Resultados da consulta
+
+    Returns:
+        Explicação (ou mensagem de erro)
+    """
+    llm = st.session_state.llm
+    token = new_cancel_token()
+    stream = {'text': ''}
+
+    def on_text(text):
+        # Thread do LLM: só guarda o texto; a página é atualizada em render()
+        stream['text'] = text
+
+    explanation_box = st.empty()
+
+    def render():
+        if stream['text']:
+            explanation_box.info(f"🧠 **Sobre os resultados:** {stream['text']} ▌")
+
+    try:
+        text = wait_for(
+            lambda: llm.explain_results(
+                response.get('question', ''), df.to_dict('records'), response['sql'],
+                token=token, on_text=on_text
+            ),
+            token, "🧠 Analisando os resultados", on_poll=render
+        )
+    except QueryCancelled as e:
+        text = f"⛔ Explicação interrompida: {e}"
+    explanation_box.empty()
+    return text
+
+
+def cancelled_response(error: QueryCancelled) -> Dict[str, Any]:
+    """Resposta exibida quando a execução é cancelada"""
+    return {
+        'error': True,
+        'message': f"⛔ Consulta cancelada: {error}",
+        'sql': None,
+        'results': []
+    }
+
+
 def process_question(question: str) -> Dict[str, Any]:
     """
     Processa pergunta do usuário
@@ -224,8 +485,10 @@ def process_question(question: str) -> Dict[str, Any]:
         Dict com sql, results, explanation
     """
     try:
+        started_at = time.perf_counter()
         st.session_state.processing = True
         st.session_state.stop_requested = False
+        token = new_cancel_token()
         
         # Verificar se foi solicitada interrupção
         if st.session_state.stop_requested:
@@ -237,67 +500,66 @@ def process_question(question: str) -> Dict[str, Any]:
                 'results': []
             }
         
-        # Obter schema do banco
-        schema_context = st.session_state.db.get_schema_context()
-        
-        # Gerar SQL com LLM
-        with st.spinner("🤖 Gerando consulta SQL..."):
-            if st.session_state.stop_requested:
-                st.session_state.processing = False
-                return {'error': True, 'message': '⛔ Interrompido', 'sql': None, 'results': []}
-            llm_response = st.session_state.llm.generate_sql(question, schema_context)
-        
-        if 'error' in llm_response or not llm_response.get('sql'):
+        # CPF/CNPJ citado que não existe: responde sem chamar o LLM
+        documents = extract_documents(question)
+        if documents and not st.session_state.db.get_contributors_by_cpf_cnpj(documents):
+            st.session_state.processing = False
             return {
                 'error': True,
-                'message': llm_response.get('explanation', 'Erro ao gerar SQL'),
+                'message': f"🔎 Nenhum contribuinte cadastrado com o CPF/CNPJ {', '.join(documents)}",
                 'sql': None,
                 'results': []
             }
         
-        sql = llm_response['sql']
-        explanation = llm_response.get('explanation', '')
-        
-        # Verificar cache
-        cached_results = st.session_state.cache.get(sql)
-        if cached_results is not None:
-            st.session_state.processing = False
-            return {
-                'error': False,
-                'sql': sql,
-                'results': cached_results,
-                'explanation': explanation,
-                'from_cache': True
-            }
-        
-        # Verificar interrupção antes de executar
-        if st.session_state.stop_requested:
-            st.session_state.processing = False
-            return {'error': True, 'message': '⛔ Interrompido', 'sql': None, 'results': []}
+        # Obter schema do banco
+        schema_context = st.session_state.db.get_question_schema_context(question)
         
-        # Executar query
-        with st.spinner("💾 Executando consulta no banco..."):
-            results = st.session_state.db.execute_query(sql)
+        # Verificar cache de perguntas antes de chamar o LLM
+        question_cache = st.session_state.question_cache
+        question_context = None
+        llm_response = None
+        if question_cache:
+            question_context = QuestionCache.context_hash(
+                schema_context,
+                st.session_state.llm_provider,
+                st.session_state.llm.get_model_name()
+            )
+            llm_response = question_cache.get(question, question_context)
         
-        # Armazenar no cache
-        st.session_state.cache.set(sql, results)
+        # Gerar SQL com LLM (a avaliação do SQL começa antes do fim da resposta)
+        precheck = None
+        if llm_response is None:
+            with st.spinner("🤖 Gerando consulta SQL..."):
+                if st.session_state.stop_requested:
+                    st.session_state.processing = False
+                    return {'error': True, 'message': '⛔ Interrompido', 'sql': None, 'results': []}
+                llm_response, precheck = stream_sql_generation(question, schema_context, token)
+            
+            if 'error' in llm_response or not llm_response.get('sql'):
+                return {
+                    'error': True,
+                    'message': llm_response.get('explanation', 'Erro ao gerar SQL'),
+                    'sql': None,
+                    'results': []
+                }
+            
+            if question_cache:
+                question_cache.set(question, question_context, llm_response)
         
-        # Salvar no histórico
-        st.session_state.query_history.append({
-            'timestamp': datetime.now(),
-            'question': question,
-            'sql': sql,
-            'results_count': len(results)
-        })
+        sql = llm_response['sql']
+        explanation = llm_response.get('explanation', '')
+        question_match = llm_response.get('match')
         
+        response = run_query(
+            question, sql, explanation, llm_response.get('tables_used'), question_match, started_at,
+            token=token, precheck=precheck
+        )
         st.session_state.processing = False
-        return {
-            'error': False,
-            'sql': sql,
-            'results': results,
-            'explanation': explanation,
-            'from_cache': False
-        }
+        return response
+    
+    except QueryCancelled as e:
+        st.session_state.processing = False
+        return cancelled_response(e)
     
     except Exception as e:
         st.session_state.processing = False
@@ -309,6 +571,141 @@ def process_question(question: str) -> Dict[str, Any]:
         }
 
 
+def run_query(question: str, sql: str, explanation: str, tables_used: Optional[List[str]],
+              question_match: Optional[str], started_at: float, confirmed: bool = False,
+              token: Optional[CancelToken] = None, precheck: Optional[Future] = None) -> Dict[str, Any]:
+    """
+    Obtém o resultado do SQL pelo cache ou executando no banco
+    
+    Antes de executar, o custo estimado é avaliado (EXPLAIN): a query pode ser
+    recusada, exigir confirmação do usuário ou receber LIMIT automático.
+    
+    Args:
+        question: Pergunta do usuário
+        sql: SQL gerado pelo LLM
+        explanation: Explicação gerada pelo LLM
+        tables_used: Tabelas informadas pelo LLM
+        question_match: Tipo de reaproveitamento do cache de perguntas
+        started_at: Início do processamento (time.perf_counter)
+        confirmed: Se o usuário já confirmou a execução (pula a avaliação)
+        token: Token de cancelamento (padrão: novo token com REQUEST_DEADLINE_SECONDS)
+        precheck: Avaliação de custo de sql já iniciada (stream_sql_generation)
+    
+    Returns:
+        Dict de resposta usado por render_results
+    
+    Raises:
+        QueryCancelled: se a execução for cancelada
+    """
+    db = st.session_state.db
+    cache = st.session_state.cache
+    token = token or new_cancel_token()
+    limit_reason = None
+    
+    def cached_response(sql_to_check: str) -> Optional[Dict[str, Any]]:
+        # Resultado expirado na janela de tolerância é exibido e atualizado em segundo plano
+        cached = cache.lookup(sql_to_check, revalidate=lambda: db.fetch_capped(sql_to_check))
+        if cached.value is None:
+            return None
+        st.session_state.query_log.append(
+            question, sql_to_check, explanation, tables_used,
+            rows=len(cached.value), duration_ms=(time.perf_counter() - started_at) * 1000,
+            from_cache=True
+        )
+        return {
+            'error': False,
+            'question': question,
+            'sql': sql_to_check,
+            'results': cached.value,
+            'explanation': explanation,
+            'from_cache': True,
+            'stale': cached.stale,
+            'limit_reason': limit_reason,
+            'question_match': question_match
+        }
+    
+    # Verificar cache
+    response = cached_response(sql)
+    if response:
+        return response
+    
+    # Verificar interrupção antes de executar
+    if st.session_state.stop_requested:
+        return {'error': True, 'message': '⛔ Interrompido', 'sql': None, 'results': []}
+    
+    # Avaliar custo estimado antes de executar
+    if not confirmed:
+        decision = precheck.result() if precheck is not None else db.check_query(sql)
+        if decision.action == 'reject':
+            return {
+                'error': True,
+                'message': f"🛑 Consulta recusada: {decision.reason}",
+                'sql': decision.sql,
+                'results': []
+            }
+        if decision.action == 'confirm':
+            return {
+                'error': False,
+                'needs_confirmation': True,
+                'question': question,
+                'sql': decision.sql,
+                'explanation': explanation,
+                'tables_used': tables_used,
+                'question_match': question_match,
+                'governor_reason': decision.reason,
+                'limit_reason': decision.reason if decision.limited else None,
+                'results': []
+            }
+        if decision.limited:
+            limit_reason = decision.reason
+            sql = decision.sql
+            response = cached_response(sql)
+            if response:
+                return response
+    
+    # Executar query e armazenar no cache (marcado com as tabelas lidas para
+    # invalidação); se outra sessão já executa a mesma query, aguarda o resultado dela
+    with st.spinner("💾 Executando consulta no banco..."):
+        results, coalesced = wait_for(
+            lambda: cache.execute_once(
+                sql,
+                lambda: db.fetch_capped(sql, token=token),
+                tables=tables_used
+            ),
+            token, "💾 Consulta em execução"
+        )
+    
+    # Salvar no histórico
+    st.session_state.query_history.append({
+        'timestamp': datetime.now(),
+        'question': question,
+        'sql': sql,
+        'results_count': len(results)
+    })
+    st.session_state.query_log.append(
+        question, sql, explanation, tables_used,
+        rows=len(results), duration_ms=(time.perf_counter() - started_at) * 1000,
+        from_cache=coalesced
+    )
+    
+    return {
+        'error': False,
+        'question': question,
+        'sql': sql,
+        'results': results,
+        'explanation': explanation,
+        'from_cache': coalesced,
+        'truncated': getattr(results, 'truncated', False),
+        'limit_reason': limit_reason,
+        'question_match': question_match
+    }
+
+
+def is_numeric_column(series: pd.Series) -> bool:
+    """Coluna numérica (inclusive inteiros anuláveis Int64), exceto booleanos"""
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
 def render_results(response: Dict[str, Any], message_id: str = "main"):
     """Renderiza resultados da consulta"""
     if response['error']:
@@ -319,6 +716,32 @@ def render_results(response: Dict[str, Any], message_id: str = "main"):
     if response.get('explanation'):
         st.info(f"💡 **Explicação:** {response['explanation']}")
     
+    # Consulta pesada aguardando confirmação
+    if response.get('needs_confirmation'):
+        st.warning(f"🛑 {response['governor_reason']}")
+        with st.expander("📄 Ver SQL", expanded=False):
+            st.code(response['sql'], language='sql')
+        if st.button("▶️ Executar mesmo assim", key=f"confirm_{message_id}"):
+            try:
+                confirmed = run_query(
+                    response['question'], response['sql'], response.get('explanation', ''),
+                    response.get('tables_used'), response.get('question_match'),
+                    time.perf_counter(), confirmed=True
+                )
+            except QueryCancelled as e:
+                confirmed = cancelled_response(e)
+            except Exception as e:
+                confirmed = {'error': True, 'message': f"Erro ao processar consulta: {str(e)}", 'sql': None, 'results': []}
+            # Substitui a resposta no histórico da conversa
+            response.clear()
+            response.update(confirmed)
+            st.rerun()
+        return
+    
+    # Resultado expirado servido enquanto é atualizado
+    if response.get('stale'):
+        st.warning("⏳ Resultado do cache expirado — exibindo a versão anterior enquanto é atualizado em segundo plano.")
+    
     # Aviso de fallback
     if response.get('fallback_used'):
         provider_name = response.get('fallback_provider', 'alternativo').capitalize()
@@ -327,19 +750,30 @@ def render_results(response: Dict[str, Any], message_id: str = "main"):
     # SQL
     with st.expander("📄 Ver SQL", expanded=False):
         st.code(response['sql'], language='sql')
+        if response.get('question_match') == 'exact':
+            st.caption("🧠 SQL reaproveitado de pergunta idêntica")
+        elif response.get('question_match') == 'similar':
+            st.caption("🧠 SQL reaproveitado de pergunta semelhante")
         if response.get('from_cache'):
             st.caption("✅ Resultado obtido do cache")
     
-    # Resultados
+    # Resultados (resultados do cache já chegam como DataFrame)
     results = response['results']
-    if not results:
+    df = results if isinstance(results, pd.DataFrame) else to_dataframe(results)
+    if df.empty:
         st.warning("⚠️ Nenhum resultado encontrado")
         return
     
-    st.success(f"✅ {len(results)} registro(s) encontrado(s)")
+    st.success(f"✅ {len(df)} registro(s) encontrado(s)")
+    if response.get('limit_reason'):
+        st.info(f"✂️ {response['limit_reason']}. Refine a pergunta para ver todos os dados.")
+    if response.get('truncated'):
+        st.warning(
+            f"✂️ Resultado truncado nos primeiros {len(df)} registros (limite de linhas/memória). "
+            "Refine a pergunta para ver todos os dados."
+        )
     
     # Tabela
-    df = pd.DataFrame(results)
     
     # Formatação automática de valores monetários
     def format_currency_columns(dataframe):
@@ -359,8 +793,8 @@ def render_results(response: Dict[str, Any], message_id: str = "main"):
         for col in df_formatted.columns:
             col_lower = str(col).lower()
             
-            # Verificar se é coluna numérica
-            if df_formatted[col].dtype in ['float64', 'float32', 'int64', 'int32']:
+            # Verificar se é coluna numérica (os tipos vêm do PostgreSQL, sem inspecionar valores)
+            if is_numeric_column(df_formatted[col]):
                 # Verificar se o nome da coluna contém palavras-chave monetárias
                 is_money_column = any(keyword in col_lower for keyword in money_keywords)
                 
@@ -386,7 +820,15 @@ def render_results(response: Dict[str, Any], message_id: str = "main"):
     
     df_display = format_currency_columns(df)
     st.dataframe(df_display, use_container_width=True, height=400)
-    
+
+    # Explicação dos resultados (sob demanda, guardada na resposta do histórico)
+    if not response.get('results_explanation'):
+        if st.button("🧠 Explicar resultados", key=f"explain_{message_id}",
+                     disabled=st.session_state.llm is None):
+            response['results_explanation'] = stream_results_explanation(response, df)
+    if response.get('results_explanation'):
+        st.info(f"🧠 **Sobre os resultados:** {response['results_explanation']}")
+
     # Opções de exportação
     col1, col2 = st.columns([1, 1])
     with col1:
@@ -400,7 +842,7 @@ def render_results(response: Dict[str, Any], message_id: str = "main"):
     
     with col2:
         # Tentar criar gráfico se houver dados numéricos
-        numeric_cols = df.select_dtypes(include=['float64', 'int64']).columns.tolist()
+        numeric_cols = [col for col in df.columns if is_numeric_column(df[col])]
         if len(numeric_cols) >= 1 and len(df.columns) >= 2:
             with st.expander("📊 Visualização", expanded=False):
                 chart_type = st.selectbox("Tipo de gráfico:", ["Barras", "Linha", "Pizza"], key=f"chart_type_{message_id}")
@@ -448,15 +890,15 @@ def render_chat_interface():
     
     with col1:
         if st.button("📊 Histórico de contribuinte", use_container_width=True):
-            st.session_state.example_question = "Me dê um histórico financeiro do contribuinte 34.019.100/0001-81"
+            st.session_state.example_question = EXAMPLE_QUESTIONS[0]
     
     with col2:
         if st.button("💰 Parcelamentos ativos", use_container_width=True):
-            st.session_state.example_question = "Quais são os parcelamentos ativos?"
+            st.session_state.example_question = EXAMPLE_QUESTIONS[1]
     
     with col3:
         if st.button("📈 Pagamentos do mês", use_container_width=True):
-            st.session_state.example_question = "Mostre os pagamentos realizados em dezembro de 2024"
+            st.session_state.example_question = EXAMPLE_QUESTIONS[2]
     
     # Campo de input elegante estilo Gemini
     st.markdown("### 💬 Faça sua pergunta")
@@ -489,16 +931,29 @@ def render_chat_interface():
     
     with col_btn2:
         # Botão parar sempre visível, mas só funcional durante processamento
+        # (o clique interrompe o script em andamento, que cancela a execução)
         stop_clicked = st.button(
             "⛔ Parar", 
             type="secondary", 
             use_container_width=True,
-            disabled=not st.session_state.get('processing', False)
+            disabled=not (submit_clicked or st.session_state.get('processing', False))
         )
         
         if stop_clicked and st.session_state.get('processing', False):
             st.session_state.stop_requested = True
-            st.warning("⚠️ Solicitação de parada enviada...")
+            token = st.session_state.get('cancel_token')
+            if token:
+                token.cancel('Interrompido pelo usuário')
+            
+            # A pergunta interrompida fica sem resposta; registra a interrupção
+            history = st.session_state.chat_history
+            if history and history[-1]['role'] == 'user':
+                history.append({
+                    'role': 'assistant',
+                    'response': cancelled_response(QueryCancelled('Interrompido pelo usuário'))
+                })
+            st.session_state.processing = False
+            st.session_state.stop_requested = False
             st.rerun()
     
     # JavaScript para CTRL+ENTER
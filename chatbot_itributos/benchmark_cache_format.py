@@ -0,0 +1,93 @@
+"""
+Benchmark - Formato de armazenamento dos resultados em cache
+
+Compara o formato antigo (lista de dicionários em pickle) com o formato
+colunar (Arrow IPC + zstd) em tamanho e tempo até obter um DataFrame.
+
+Uso:
+    python benchmark_cache_format.py                 # dados sintéticos (50.000 linhas)
+    python benchmark_cache_format.py --rows 200000
+    python benchmark_cache_format.py --sql "SELECT * FROM payment_parcels LIMIT 50000"
+"""
+import argparse
+import pickle
+import random
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Callable, Dict, List
+import pandas as pd
+from result_codec import encode_results, decode_results
+
+
+def synthetic_parcels(rows: int) -> List[Dict]:
+    """Gera linhas no formato de payment_parcels retornado por execute_query"""
+    random.seed(42)
+    start = date(2022, 1, 10)
+    results = []
+    for i in range(rows):
+        value = Decimal(random.randint(1000, 500000)) / 100
+        results.append({
+            'id': i + 1,
+            'payment_id': 100000 + i // 12,
+            'parcel_number': i % 12 + 1,
+            'value': value,
+            'total': value + Decimal(random.randint(0, 5000)) / 100,
+            'due_date': start + timedelta(days=30 * (i % 48)),
+            'status': random.choice([0, 1, 1, 2, 5, 5, 5]),
+            'updated_at': datetime(2024, 1, 1) + timedelta(minutes=i),
+        })
+    return results
+
+
+def best_of(func: Callable, repeat: int) -> float:
+    """Menor tempo (segundos) entre as repetições"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(results: List[Dict], repeat: int) -> None:
+    pickle_blob = pickle.dumps(results, protocol=pickle.HIGHEST_PROTOCOL)
+    arrow_blob, _ = encode_results(results)
+
+    measurements = [
+        ('pickle (lista de dicts)', len(pickle_blob),
+         best_of(lambda: pickle.dumps(results, protocol=pickle.HIGHEST_PROTOCOL), repeat),
+         best_of(lambda: pd.DataFrame(pickle.loads(pickle_blob)), repeat)),
+        ('arrow ipc + zstd', len(arrow_blob),
+         best_of(lambda: encode_results(results), repeat),
+         best_of(lambda: decode_results(arrow_blob), repeat)),
+    ]
+
+    print(f"\n📊 {len(results)} linhas, melhor de {repeat} execuções\n")
+    print(f"{'Formato':<26}{'Tamanho (MB)':>14}{'Gravação (ms)':>16}{'Leitura → DataFrame (ms)':>28}")
+    print("-" * 84)
+    for name, size, write_seconds, read_seconds in measurements:
+        print(f"{name:<26}{size / 1024 / 1024:>14.2f}{write_seconds * 1000:>16.1f}{read_seconds * 1000:>28.1f}")
+
+    base_size, base_read = measurements[0][1], measurements[0][3]
+    print(f"\nArrow: {base_size / measurements[1][1]:.1f}x menor, "
+          f"{base_read / measurements[1][3]:.1f}x mais rápido para carregar")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark do formato de cache de resultados')
+    parser.add_argument('--rows', type=int, default=50000, help='Linhas sintéticas (padrão: 50000)')
+    parser.add_argument('--repeat', type=int, default=5, help='Repetições por medição (padrão: 5)')
+    parser.add_argument('--sql', help='Usa o resultado desta query no banco em vez de dados sintéticos')
+    args = parser.parse_args()
+
+    if args.sql:
+        from database import DatabaseService
+        db = DatabaseService()
+        db.connect()
+        data = db.execute_query(args.sql)
+        db.disconnect()
+    else:
+        data = synthetic_parcels(args.rows)
+
+    run(data, args.repeat)
@@ -0,0 +1,89 @@
+"""
+Benchmark - Carregamento de resultados em DataFrame
+
+Compara o caminho por linhas (RealDictCursor → lista de dicts → DataFrame)
+com o COPY (...) TO STDOUT carregado direto em colunas Arrow tipadas, em
+tempo, pico de memória Python e tipos das colunas.
+
+Uso:
+    python benchmark_copy.py                       # 10.000, 100.000 e 1.000.000 linhas sintéticas
+    python benchmark_copy.py --rows 10000 50000
+    python benchmark_copy.py --sql "SELECT * FROM payment_parcels"
+"""
+import argparse
+import time
+import tracemalloc
+from typing import Callable, List, Tuple
+import pandas as pd
+from database import DatabaseService
+
+
+# Linhas no formato de payment_parcels geradas no próprio servidor
+SYNTHETIC_SQL = """
+    SELECT
+        g AS id,
+        100000 + g / 12 AS payment_id,
+        (g % 12 + 1)::int2 AS parcel_number,
+        round((random() * 5000)::numeric, 2) AS value,
+        date '2022-01-10' + (g % 1440) AS due_date,
+        (array[0, 1, 1, 2, 5, 5, 5])[g % 7 + 1] AS status,
+        timestamp '2024-01-01' + g * interval '1 minute' AS updated_at,
+        md5(g::text) AS barcode
+    FROM generate_series(1, {rows}) AS g
+"""
+
+
+def measure(func: Callable[[], pd.DataFrame], repeat: int) -> Tuple[float, float, pd.DataFrame]:
+    """Melhor tempo (s) e pico de memória Python (MB) entre as repetições"""
+    best_seconds, best_peak, df = float('inf'), float('inf'), None
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        df = func()
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        best_seconds = min(best_seconds, seconds)
+        best_peak = min(best_peak, peak / 1024 / 1024)
+    return best_seconds, best_peak, df
+
+
+def run(db: DatabaseService, sql: str, label: str, repeat: int) -> None:
+    rows_seconds, rows_peak, rows_df = measure(lambda: pd.DataFrame(db.execute_query(sql)), repeat)
+    copy_seconds, copy_peak, copy_df = measure(lambda: db.copy_to_arrow(sql, max_rows=0).to_pandas(date_as_object=False), repeat)
+
+    print(f"\n📊 {label}: {len(copy_df)} linhas, melhor de {repeat} execuções\n")
+    print(f"{'Caminho':<28}{'Tempo (ms)':>12}{'Pico Python (MB)':>18}{'DataFrame (MB)':>16}")
+    print("-" * 74)
+    for name, seconds, peak, df in (
+        ('linhas → dicts → DataFrame', rows_seconds, rows_peak, rows_df),
+        ('COPY → Arrow → DataFrame', copy_seconds, copy_peak, copy_df),
+    ):
+        df_mb = df.memory_usage(deep=True).sum() / 1024 / 1024
+        print(f"{name:<28}{seconds * 1000:>12.1f}{peak:>18.1f}{df_mb:>16.1f}")
+    print(f"\nCOPY: {rows_seconds / copy_seconds:.1f}x mais rápido")
+    print("(o pico Python não inclui os buffers do Arrow, alocados fora do interpretador)")
+
+    print("\nTipos (linhas → COPY):")
+    for column in copy_df.columns:
+        print(f"  {column:<20}{str(rows_df[column].dtype):>16} → {copy_df[column].dtype}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark do carregamento de resultados em DataFrame')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help='Tamanhos do resultado sintético (padrão: 10000 100000 1000000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetições por medição (padrão: 3)')
+    parser.add_argument('--sql', help='Mede esta query em vez dos dados sintéticos')
+    args = parser.parse_args()
+
+    database = DatabaseService()
+    if not database.connect():
+        raise SystemExit(1)
+
+    if args.sql:
+        run(database, args.sql, 'query informada', args.repeat)
+    else:
+        for size in args.rows:
+            run(database, SYNTHETIC_SQL.format(rows=size), f'sintético {size:,}'.replace(',', '.'), args.repeat)
+    database.disconnect()
@@ -0,0 +1,118 @@
+"""
+Benchmark - Seleção de tabelas por pergunta (schema enviado ao LLM)
+
+Para um conjunto fixo de perguntas com as tabelas necessárias conhecidas,
+compara o prompt com o schema completo e com as tabelas selecionadas:
+tamanho (tokens estimados), cobertura das tabelas necessárias e, com --llm,
+se o SQL gerado é válido (EXPLAIN) em cada caso.
+
+Uso:
+    python benchmark_schema_pruning.py              # tamanho do prompt e cobertura
+    python benchmark_schema_pruning.py --llm        # também gera o SQL com os dois contextos
+"""
+import argparse
+import time
+from typing import Any, Dict, List, Optional, Set
+from database import DatabaseService
+from llm_service import LLMService
+from schema_pruning import select_tables
+from sql_utils import extract_tables
+
+
+# Perguntas e as tabelas sem as quais não há resposta correta
+QUESTIONS = [
+    ("Me dê um histórico financeiro do contribuinte 34.019.100/0001-81", {'unico_people', 'payments'}),
+    ("Quais são os parcelamentos ativos?", {'agreements', 'agreement_operations', 'payments', 'payment_parcels'}),
+    ("Mostre os pagamentos realizados em dezembro de 2024", {'payments'}),
+    ("Quais parcelas estão vencidas e em aberto?", {'payment_parcels'}),
+    ("Qual o telefone e o email do contribuinte 111.444.777-35?", {'unico_people'}),
+    ("Quantas dívidas ativas foram inscritas em 2023?", {'active_debts'}),
+    ("Qual a situação das dívidas ativas do exercício de 2022?", {'active_debts', 'active_debt_status'}),
+    ("Qual o código de barras do boleto da parcela 3 do pagamento 1520?", {'payment_entries', 'payment_parcels'}),
+    ("Quanto foi arrecadado por receita em 2024?", {'revenues'}),
+    ("Quais impostos de IPTU foram lançados em 2024?", {'taxable_debts'}),
+    ("Quantas parcelas pagas e abertas tem cada acordo?", {'agreements', 'mv_agreement_parcel_summary'}),
+    ("Quais carnês foram impressos no arquivo de remessa de janeiro?", {'graphic_files', 'graphic_files_payment_parcels'}),
+]
+
+
+def estimate_tokens(text: str) -> int:
+    """Tokens aproximados (≈ 4 caracteres por token em português nos modelos atuais)"""
+    return len(text) // 4
+
+
+def check_sql(db: DatabaseService, llm: LLMService, question: str, context: str) -> Dict[str, Any]:
+    """Gera o SQL com o contexto dado e confere se o PostgreSQL aceita o plano"""
+    start = time.perf_counter()
+    response = llm.generate_sql(question, context)
+    seconds = time.perf_counter() - start
+    sql = response.get('sql')
+    if 'error' in response or not sql:
+        return {'valid': False, 'seconds': seconds, 'tables': set()}
+    try:
+        db.explain(sql)
+        valid = True
+    except Exception:
+        valid = False
+    return {'valid': valid, 'seconds': seconds, 'tables': set(extract_tables(sql))}
+
+
+def run(db: DatabaseService, llm: Optional[LLMService]) -> None:
+    full_context = db.get_schema_context()
+    graph = db.get_schema_graph()
+    full_prompt = estimate_tokens(LLMService._build_sql_prompt("", full_context))
+
+    print(f"\n📊 Seleção de tabelas: {len(QUESTIONS)} perguntas, schema completo com {len(graph.columns)} tabelas\n")
+    print(f"{'Pergunta':<52}{'Tabelas':>8}{'Cobertura':>11}{'Schema (tok)':>14}{'Prompt (tok)':>14}{'Redução':>9}")
+    print("-" * 108)
+
+    covered = 0
+    reductions = []
+    llm_results = {'full': [], 'pruned': []}
+    for question, expected in QUESTIONS:
+        tables = select_tables(question, graph) or list(graph.columns)
+        context = db.get_schema_context(tables)
+        prompt = estimate_tokens(LLMService._build_sql_prompt(question, context))
+        missing: Set[str] = (expected & set(graph.columns)) - set(tables)
+        covered += not missing
+        reduction = 1 - prompt / (full_prompt + estimate_tokens(question))
+        reductions.append(reduction)
+        label = question if len(question) <= 50 else question[:47] + '...'
+        print(
+            f"{label:<52}{len(tables):>8}{'ok' if not missing else 'falta ' + str(len(missing)):>11}"
+            f"{estimate_tokens(context):>14}{prompt:>14}{reduction:>9.0%}"
+        )
+        if missing:
+            print(f"    faltando: {', '.join(sorted(missing))}")
+
+        if llm is not None:
+            llm_results['full'].append(check_sql(db, llm, question, full_context))
+            pruned = check_sql(db, llm, question, context)
+            pruned['outside'] = pruned['tables'] - set(tables)
+            llm_results['pruned'].append(pruned)
+
+    print(f"\nSchema completo: ~{estimate_tokens(full_context)} tokens (prompt ~{full_prompt})")
+    print(f"Redução média do prompt: {sum(reductions) / len(reductions):.0%}")
+    print(f"Cobertura das tabelas necessárias: {covered}/{len(QUESTIONS)} perguntas")
+
+    if llm is not None:
+        print(f"\nSQL gerado ({llm.provider} {llm.get_model_name()}):")
+        for name, label in (('full', 'schema completo'), ('pruned', 'tabelas selecionadas')):
+            results = llm_results[name]
+            valid = sum(1 for r in results if r['valid'])
+            seconds = sum(r['seconds'] for r in results) / len(results)
+            print(f"  {label:<22} válidos {valid}/{len(results)}, {seconds:.1f}s por pergunta")
+        outside = sum(1 for r in llm_results['pruned'] if r['outside'])
+        print(f"  SQL com tabela fora das selecionadas: {outside}/{len(llm_results['pruned'])}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark da seleção de tabelas por pergunta')
+    parser.add_argument('--llm', action='store_true', help='Gera o SQL com os dois contextos e confere com EXPLAIN')
+    args = parser.parse_args()
+
+    database = DatabaseService()
+    if not database.connect():
+        raise SystemExit(1)
+    run(database, LLMService() if args.llm else None)
+    database.disconnect()
@@ -3,33 +3,323 @@ Cache Manager - Gerenciamento de cache para consultas SQL
 """
 import hashlib
 import json
-from typing import Any, Optional
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from diskcache import Cache
-from config import CACHE_DIR, CACHE_TTL_SECONDS
+from config import (
+    CACHE_DIR,
+    CACHE_TTL_SECONDS,
+    CACHE_MEMORY_MAX_BYTES,
+    CACHE_SIZE_LIMIT_BYTES,
+    CACHE_MAX_ENTRY_BYTES,
+    CACHE_EVICTION_POLICY,
+    CACHE_STALE_GRACE_SECONDS,
+    CACHE_STALE_GRACE_BY_TABLE,
+    CACHE_REVALIDATE_WORKERS,
+    CACHE_COALESCE_TIMEOUT_SECONDS,
+)
+from sql_utils import extract_tables, canonicalize_sql, shape_sql
+from result_codec import encode_results, decode_results, estimate_size, copy_results
+from cancellation import QueryCancelled
 import os
 
 
+# Intervalo para recarregar do disco as versões de tabela alteradas por outros processos
+TABLE_VERSIONS_REFRESH_SECONDS = 2.0
+
+# Resultado de uma consulta ao cache: stale=True indica entrada expirada dentro da
+# janela de tolerância, servida enquanto é atualizada em segundo plano
+CacheLookup = namedtuple('CacheLookup', ['value', 'stale', 'tier'])
+CACHE_MISS = CacheLookup(None, False, None)
+
+# Políticas de remoção aceitas → política equivalente do diskcache. 'ttl' remove
+# primeiro as entradas gravadas há mais tempo, que com TTL uniforme são as
+# próximas a expirar (entradas já expiradas são sempre removidas antes)
+EVICTION_POLICIES = {
+    'lru': 'least-recently-used',
+    'lfu': 'least-frequently-used',
+    'ttl': 'least-recently-stored',
+}
+
+# Quantidade de latências recentes usadas para média e p95
+LATENCY_SAMPLES = 1000
+
+# Quantidade máxima de formatos de query acompanhados nas estatísticas
+MAX_TRACKED_SHAPES = 500
+
+# Atualizações em segundo plano (stale-while-revalidate), compartilhadas pelo processo
+_revalidate_executor = ThreadPoolExecutor(max_workers=CACHE_REVALIDATE_WORKERS, thread_name_prefix='cache-revalidate')
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+# Execuções em andamento por chave de cache (single-flight), compartilhadas por
+# todas as sessões do processo: chave → Future com o resultado da execução
+_in_flight: Dict[str, Future] = {}
+_in_flight_lock = threading.Lock()
+
+
+class TierStats:
+    """Contadores de acerto, falha e latência de uma camada do cache"""
+    
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.total_seconds = 0.0
+        self.lock = threading.Lock()
+    
+    def record(self, hit: bool, seconds: float) -> None:
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.total_seconds += seconds
+    
+    def as_dict(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'avg_latency_ms': (self.total_seconds / lookups * 1000) if lookups else 0.0
+            }
+    
+    def reset(self) -> None:
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+            self.total_seconds = 0.0
+
+
+class MemoryTier:
+    """Camada LRU em memória, limitada pelo total de bytes das entradas"""
+    
+    def __init__(self, max_bytes: int):
+        """
+        Args:
+            max_bytes: Limite de bytes ocupados pelas entradas em memória
+        """
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (value, size, expire_at)
+        self.bytes_used = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+    
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """
+        Busca entrada e a marca como mais recente
+        
+        Returns:
+            Tupla (encontrado, valor)
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False, None
+            
+            value, size, expire_at = entry
+            if expire_at is not None and expire_at <= time.time():
+                self._remove(key)
+                return False, None
+            
+            self.entries.move_to_end(key)
+            return True, value
+    
+    def set(self, key: str, value: Any, size: int, expire_at: Optional[float]) -> List[tuple]:
+        """
+        Armazena entrada, removendo as menos recentes se o limite for excedido
+        
+        Returns:
+            Lista de entradas removidas (key, value, expire_at) para rebaixamento
+        """
+        with self.lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                return []
+            
+            self.entries[key] = (value, size, expire_at)
+            self.bytes_used += size
+            
+            evicted = []
+            while self.bytes_used > self.max_bytes:
+                old_key, (old_value, old_size, old_expire) = self.entries.popitem(last=False)
+                self.bytes_used -= old_size
+                self.evictions += 1
+                evicted.append((old_key, old_value, old_expire))
+            return evicted
+    
+    def delete(self, key: str) -> bool:
+        with self.lock:
+            return self._remove(key)
+    
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.bytes_used = 0
+            self.evictions = 0
+    
+    def _remove(self, key: str) -> bool:
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+        self.bytes_used -= entry[1]
+        return True
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class TableVersions:
+    """
+    Versão de cada tabela, incrementada a cada alteração detectada
+
+    Cada entrada do cache guarda as versões das tabelas que leu; se alguma
+    versão mudou desde então, a entrada é descartada. As versões ficam em
+    disco (compartilhadas entre processos) e espelhadas em memória para que
+    acertos na camada em memória não precisem acessar o disco.
+    """
+    
+    def __init__(self, directory: str):
+        self.store = Cache(directory)
+        self.local = {}
+        self.refreshed_at = 0.0
+        self.lock = threading.Lock()
+    
+    def _refresh(self, force: bool = False) -> None:
+        now = time.time()
+        if not force and now - self.refreshed_at < TABLE_VERSIONS_REFRESH_SECONDS:
+            return
+        versions = {key: self.store.get(key, 0) for key in self.store.iterkeys() if isinstance(key, str)}
+        with self.lock:
+            self.local = versions
+            self.refreshed_at = now
+    
+    def snapshot(self, tables: Iterable[str]) -> Dict[str, int]:
+        """Versões atuais (lidas do disco) das tabelas informadas"""
+        return {table: self.store.get(table, 0) for table in tables}
+    
+    def is_current(self, versions: Dict[str, int], from_disk: bool = False) -> bool:
+        """
+        Verifica se nenhuma das tabelas mudou desde o snapshot
+        
+        Args:
+            versions: Snapshot retornado por snapshot()
+            from_disk: Se True, lê as versões do disco em vez do espelho em memória
+        """
+        if from_disk:
+            return all(self.store.get(table, 0) == version for table, version in versions.items())
+        self._refresh()
+        return all(self.local.get(table, 0) == version for table, version in versions.items())
+    
+    def bump(self, table: str) -> int:
+        """Incrementa a versão da tabela, invalidando as entradas que a leram"""
+        version = self.store.incr(table, default=0)
+        # Chave em tupla: fica fora das versões lidas por _refresh
+        self.store.set(('changed_at', table), time.time())
+        with self.lock:
+            self.local[table] = version
+        return version
+    
+    def changed_within(self, tables: Iterable[str], seconds: float) -> List[str]:
+        """
+        Tabelas alteradas (bump) nos últimos seconds segundos
+        
+        Usado para não ler de uma réplica atrasada uma tabela que acabou de
+        mudar no primário: o resultado voltaria ao cache com a versão nova.
+        """
+        since = time.time() - seconds
+        return [table for table in tables if self.store.get(('changed_at', table), 0) >= since]
+    
+    def all(self) -> Dict[str, int]:
+        self._refresh(force=True)
+        return dict(self.local)
+
+
+# Versões compartilhadas por todas as instâncias do processo (por diretório)
+_table_versions = {}
+_table_versions_lock = threading.Lock()
+
+
+def get_table_versions(cache_dir: str) -> TableVersions:
+    """Retorna o controle de versões de tabelas do diretório de cache"""
+    directory = os.path.abspath(os.path.join(cache_dir, 'tables'))
+    with _table_versions_lock:
+        if directory not in _table_versions:
+            _table_versions[directory] = TableVersions(directory)
+        return _table_versions[directory]
+
+
 class CacheManager:
-    """Gerenciador de cache em disco para consultas SQL"""
+    """Gerenciador de cache em duas camadas (memória LRU + disco) para consultas SQL"""
     
-    def __init__(self, cache_dir: Optional[str] = None, ttl: Optional[int] = None):
+    def __init__(self, cache_dir: Optional[str] = None, ttl: Optional[int] = None,
+                 memory_max_bytes: Optional[int] = None, stale_grace: Optional[int] = None,
+                 stale_grace_by_table: Optional[Dict[str, int]] = None,
+                 size_limit: Optional[int] = None, max_entry_bytes: Optional[int] = None,
+                 eviction_policy: Optional[str] = None):
         """
         Inicializa o gerenciador de cache
         
         Args:
             cache_dir: Diretório para armazenar o cache (padrão: CACHE_DIR do config)
             ttl: Tempo de vida do cache em segundos (padrão: CACHE_TTL_SECONDS)
+            memory_max_bytes: Limite de bytes da camada em memória (padrão: CACHE_MEMORY_MAX_BYTES, 0 desativa)
+            stale_grace: Janela (segundos) em que uma entrada expirada ainda é servida
+                enquanto é atualizada (padrão: CACHE_STALE_GRACE_SECONDS, 0 desativa)
+            stale_grace_by_table: Janela por tabela (padrão: CACHE_STALE_GRACE_BY_TABLE)
+            size_limit: Limite total do cache em disco em bytes (padrão: CACHE_SIZE_LIMIT_BYTES)
+            max_entry_bytes: Resultados maiores que isso não são armazenados (padrão: CACHE_MAX_ENTRY_BYTES)
+            eviction_policy: 'lru', 'lfu' ou 'ttl' (padrão: CACHE_EVICTION_POLICY)
         """
         self.cache_dir = cache_dir or CACHE_DIR
         self.ttl = ttl or CACHE_TTL_SECONDS
+        self.stale_grace = CACHE_STALE_GRACE_SECONDS if stale_grace is None else stale_grace
+        self.stale_grace_by_table = (
+            CACHE_STALE_GRACE_BY_TABLE if stale_grace_by_table is None else stale_grace_by_table
+        )
+        if memory_max_bytes is None:
+            memory_max_bytes = CACHE_MEMORY_MAX_BYTES
+        self.size_limit = size_limit or CACHE_SIZE_LIMIT_BYTES
+        self.max_entry_bytes = max_entry_bytes or CACHE_MAX_ENTRY_BYTES
+        self.eviction_policy = (eviction_policy or CACHE_EVICTION_POLICY).lower()
+        if self.eviction_policy not in EVICTION_POLICIES:
+            raise ValueError(
+                f"Política de remoção '{self.eviction_policy}' não suportada. Use: {', '.join(EVICTION_POLICIES)}"
+            )
         
         # Cria diretório se não existir
         os.makedirs(self.cache_dir, exist_ok=True)
         
-        # Inicializa cache
-        self.cache = Cache(self.cache_dir)
+        # Inicializa camadas. A remoção automática do diskcache fica desligada
+        # (cull_limit=0) e é feita em set() via cull(), para contar as remoções
+        self.cache = Cache(
+            self.cache_dir,
+            size_limit=self.size_limit,
+            eviction_policy=EVICTION_POLICIES[self.eviction_policy],
+            cull_limit=0
+        )
+        self.memory = MemoryTier(memory_max_bytes) if memory_max_bytes > 0 else None
+        self.memory_stats = TierStats()
+        self.disk_stats = TierStats()
+        self.table_versions = get_table_versions(self.cache_dir)
+        self.invalidations = 0
+        self.stale_hits = 0
+        self.revalidations = 0
+        self.disk_evictions = 0
+        self.skipped_too_large = 0
+        self.coalesced = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.shape_stats = OrderedDict()  # shape_fingerprint -> {'shape', 'hits', 'misses'}
+        self.shape_lock = threading.Lock()
         print(f"📦 Cache inicializado em: {self.cache_dir}")
         print(f"⏱️  TTL: {self.ttl} segundos ({self.ttl/3600:.1f} horas)")
+        print(f"📏 Limite: {self.size_limit / 1024 / 1024:.0f} MB (política: {self.eviction_policy})")
+        if self.memory is not None:
+            print(f"🧮 Camada em memória: até {memory_max_bytes / 1024 / 1024:.0f} MB")
     
     def _generate_key(self, sql: str, params: Optional[dict] = None) -> str:
         """
@@ -40,9 +330,11 @@ class CacheManager:
             params: Parâmetros da query (opcional)
         
         Returns:
-            Hash MD5 da query + parâmetros
+            Hash MD5 da forma canônica da query + parâmetros
         """
-        content = sql.strip().lower()
+        # Formatação, comentários, caixa de palavras-chave e aliases não mudam a
+        # chave; literais são mantidos exatamente como escritos
+        content = canonicalize_sql(sql)
         if params:
             content += json.dumps(params, sort_keys=True)
         
@@ -57,43 +349,381 @@ class CacheManager:
             params: Parâmetros da query (opcional)
         
         Returns:
-            Resultado em cache ou None se não encontrado
+            Resultado em cache (DataFrame para resultados tabulares) ou None se não encontrado
+        """
+        return self.lookup(sql, params).value
+    
+    def lookup(self, sql: str, params: Optional[dict] = None,
+               revalidate: Optional[Callable[[], Any]] = None) -> CacheLookup:
+        """
+        Recupera resultado do cache, com suporte a stale-while-revalidate
+        
+        Se a entrada expirou mas ainda está na janela de tolerância e um
+        revalidate foi informado, o valor antigo é devolvido imediatamente
+        (stale=True) e revalidate() é executado em segundo plano para
+        atualizar a entrada. Sem revalidate, entradas expiradas são falhas.
+        
+        Args:
+            sql: Query SQL
+            params: Parâmetros da query (opcional)
+            revalidate: Função que reexecuta a query e retorna o novo resultado
+        
+        Returns:
+            CacheLookup(value, stale, tier) — value None indica falha
         """
         key = self._generate_key(sql, params)
-        result = self.cache.get(key)
         
-        if result is not None:
-            print(f"✅ Cache HIT: {key[:12]}...")
+        # Camada 1: memória (sem acesso a disco nem desserialização)
+        if self.memory is not None:
+            start = time.perf_counter()
+            found, entry = self.memory.get(key)
+            if found and not self.table_versions.is_current(entry[0]):
+                self._discard_invalidated(key)
+                found = False
+            lookup = self._resolve(key, entry, 'memory', sql, params, revalidate) if found else CACHE_MISS
+            elapsed = time.perf_counter() - start
+            self.memory_stats.record(lookup.value is not None, elapsed)
+            if lookup.value is not None:
+                self.latencies.append(elapsed)
+                print(f"⚡ Cache HIT (memória{', expirado' if lookup.stale else ''}): {key[:12]}...")
+                self._record_shape(sql, True)
+                return lookup._replace(value=copy_results(lookup.value))
+        
+        # Camada 2: disco
+        start = time.perf_counter()
+        entry, expire_time = self.cache.get(key, expire_time=True)
+        lookup = CACHE_MISS
+        if isinstance(entry, tuple) and len(entry) == 3:
+            versions, blob, fresh_until = entry
+            if self.table_versions.is_current(versions, from_disk=True):
+                value = decode_results(blob)
+                lookup = self._resolve(key, (versions, value, fresh_until), 'disk', sql, params, revalidate)
+                if lookup.value is not None:
+                    self._promote(key, (versions, value, fresh_until), estimate_size(value, blob), expire_time)
+                    lookup = lookup._replace(value=copy_results(value))
+            else:
+                self._discard_invalidated(key)
+        elapsed = time.perf_counter() - start
+        self.disk_stats.record(lookup.value is not None, elapsed)
+        
+        if lookup.value is not None:
+            self.latencies.append(elapsed)
+            print(f"✅ Cache HIT (disco{', expirado' if lookup.stale else ''}): {key[:12]}...")
         else:
             print(f"❌ Cache MISS: {key[:12]}...")
+        self._record_shape(sql, lookup.value is not None)
+        
+        return lookup
+    
+    def _record_shape(self, sql: str, hit: bool) -> None:
+        """Contabiliza acerto/falha no formato parametrizado da query"""
+        shape = shape_sql(sql)
+        shape_key = hashlib.md5(shape.encode()).hexdigest()
+        with self.shape_lock:
+            stats = self.shape_stats.pop(shape_key, None)
+            if stats is None:
+                stats = {'shape': shape, 'hits': 0, 'misses': 0}
+            stats['hits' if hit else 'misses'] += 1
+            self.shape_stats[shape_key] = stats
+            while len(self.shape_stats) > MAX_TRACKED_SHAPES:
+                self.shape_stats.popitem(last=False)
+    
+    def get_shape_stats(self, top: int = 10) -> List[dict]:
+        """
+        Estatísticas por formato de query (literais trocados por '?')
+        
+        Args:
+            top: Quantidade de formatos retornados, dos mais consultados
+        
+        Returns:
+            Lista de dicts com 'fingerprint', 'shape', 'hits', 'misses' e 'hit_ratio'
+        """
+        with self.shape_lock:
+            items = [(key, dict(stats)) for key, stats in self.shape_stats.items()]
+        items.sort(key=lambda item: item[1]['hits'] + item[1]['misses'], reverse=True)
+        return [
+            {
+                'fingerprint': key,
+                **stats,
+                'hit_ratio': stats['hits'] / (stats['hits'] + stats['misses'])
+            }
+            for key, stats in items[:top]
+        ]
+    
+    def _resolve(self, key: str, entry: tuple, tier: str, sql: str, params: Optional[dict],
+                 revalidate: Optional[Callable[[], Any]]) -> CacheLookup:
+        """Decide se uma entrada válida é fresca, expirada servível ou falha"""
+        versions, value, fresh_until = entry
+        if time.time() < fresh_until:
+            return CacheLookup(value, False, tier)
+        if revalidate is None:
+            return CACHE_MISS
+        
+        self.stale_hits += 1
+        self._schedule_revalidation(key, sql, params, list(versions), revalidate)
+        return CacheLookup(value, True, tier)
+    
+    def _schedule_revalidation(self, key: str, sql: str, params: Optional[dict],
+                               tables: List[str], revalidate: Callable[[], Any]) -> None:
+        """Reexecuta a query em segundo plano (uma única vez por chave) e atualiza a entrada"""
+        with _revalidating_lock:
+            if key in _revalidating:
+                return
+            _revalidating.add(key)
+        
+        def run():
+            try:
+                self.execute_once(sql, revalidate, params, tables=tables)
+                self.revalidations += 1
+                print(f"🔄 Entrada expirada atualizada em segundo plano: {key[:12]}...")
+            except Exception as e:
+                print(f"⚠️  Falha ao atualizar entrada expirada {key[:12]}...: {e}")
+            finally:
+                with _revalidating_lock:
+                    _revalidating.discard(key)
+        
+        _revalidate_executor.submit(run)
+    
+    def _promote(self, key: str, entry: tuple, size: int, expire_at: Optional[float]) -> None:
+        """Coloca a entrada (versões, resultado, validade) na camada em memória, rebaixando as que forem removidas"""
+        if self.memory is None:
+            return
+        for old_key, old_entry, old_expire in self.memory.set(key, entry, size, expire_at):
+            self._demote(old_key, old_entry, old_expire)
+    
+    def _demote(self, key: str, entry: tuple, expire_at: Optional[float]) -> None:
+        """Garante que uma entrada removida da memória continue disponível em disco"""
+        remaining = (expire_at - time.time()) if expire_at is not None else None
+        if remaining is not None and remaining <= 0:
+            return
+        versions, value, fresh_until = entry
+        if key not in self.cache and self.table_versions.is_current(versions):
+            blob, _ = encode_results(value)
+            self.cache.set(key, (versions, blob, fresh_until), expire=remaining)
+            self._enforce_size_limit()
+    
+    def _enforce_size_limit(self) -> None:
+        """Remove entradas expiradas e, se preciso, as escolhidas pela política até caber no limite"""
+        if self.cache.volume() > self.size_limit:
+            removed = self.cache.cull()
+            self.disk_evictions += removed
+            if removed:
+                print(f"🧹 {removed} entrada(s) removida(s) do cache em disco (política: {self.eviction_policy})")
+    
+    def _grace_for(self, tables: Iterable[str]) -> int:
+        """Janela de tolerância: a maior entre as configuradas para as tabelas lidas"""
+        return max([self.stale_grace] + [self.stale_grace_by_table.get(t, 0) for t in tables])
+    
+    def _discard_invalidated(self, key: str) -> None:
+        """Remove de ambas as camadas uma entrada cujas tabelas mudaram"""
+        if self.memory is not None:
+            self.memory.delete(key)
+        self.cache.delete(key)
+        self.invalidations += 1
+        print(f"♻️  Cache invalidado por alteração de tabela: {key[:12]}...")
+    
+    @staticmethod
+    def _read_tables(sql: str, tables: Optional[List[str]] = None) -> List[str]:
+        """Tabelas lidas pela query: as extraídas do SQL somadas às informadas"""
+        return sorted(set(extract_tables(sql)) | {t.lower() for t in (tables or [])})
+    
+    def versions_for(self, sql: str, tables: Optional[List[str]] = None) -> Dict[str, int]:
+        """
+        Versões atuais das tabelas lidas pela query
         
-        return result
+        Tirado antes de executar a query e passado a set(): uma alteração que
+        chegue durante a execução invalida o resultado em vez de ser carimbada nele.
+        """
+        return self.table_versions.snapshot(self._read_tables(sql, tables))
     
-    def set(self, sql: str, result: Any, params: Optional[dict] = None) -> None:
+    def set(self, sql: str, result: Any, params: Optional[dict] = None,
+            tables: Optional[List[str]] = None, grace: Optional[int] = None,
+            versions: Optional[Dict[str, int]] = None) -> None:
         """
         Armazena resultado no cache
         
+        Resultados tabulares são gravados em formato colunar (Arrow + zstd) e
+        lidos de volta como DataFrame.
+        
         Args:
             sql: Query SQL
-            result: Resultado da query
+            result: Resultado da query (lista de dicionários ou DataFrame);
+                resultados com truncated=True não são armazenados
             params: Parâmetros da query (opcional)
+            tables: Tabelas lidas pela query (ex.: 'tables_used' do LLM); são
+                somadas às tabelas extraídas do próprio SQL
+            grace: Janela de stale-while-revalidate desta query em segundos
+                (padrão: maior janela configurada entre as tabelas lidas)
+            versions: Versões das tabelas tiradas antes da execução (versions_for);
+                sem elas, as versões atuais são usadas
         """
         key = self._generate_key(sql, params)
-        self.cache.set(key, result, expire=self.ttl)
-        print(f"💾 Resultado armazenado no cache: {key[:12]}...")
+        if getattr(result, 'truncated', False):
+            # Resultado parcial (limite de linhas/bytes): não é servido como completo
+            self.skipped_too_large += 1
+            print(f"⚠️  Resultado truncado não armazenado no cache: {key[:12]}...")
+            return
+        if versions is None:
+            versions = self.versions_for(sql, tables)
+        elif not self.table_versions.is_current(versions, from_disk=True):
+            # Tabela alterada enquanto a query executava: o resultado já nasce desatualizado
+            print(f"♻️  Resultado não armazenado, tabela alterada durante a execução: {key[:12]}...")
+            return
+        blob, value = encode_results(result)
+        if len(blob) > self.max_entry_bytes:
+            self.skipped_too_large += 1
+            print(f"⚠️  Resultado grande demais para o cache ({len(blob) / 1024 / 1024:.1f} MB): {key[:12]}...")
+            return
+        if grace is None:
+            grace = self._grace_for(versions)
+        fresh_until = time.time() + self.ttl
+        
+        # Escrita em ambas as camadas: o disco sobrevive a reinícios e é
+        # compartilhado entre processos, a memória atende leituras quentes.
+        # A entrada só é removida ao fim da janela de tolerância.
+        if value is result:
+            value = copy_results(value)  # DataFrame de quem chamou: a memória guarda a sua própria cópia
+        entry = (versions, value, fresh_until)
+        self.cache.set(key, (versions, blob, fresh_until), expire=self.ttl + grace)
+        self._promote(key, entry, estimate_size(value, blob), fresh_until + grace)
+        self._enforce_size_limit()
+        print(f"💾 Resultado armazenado no cache: {key[:12]}... (tabelas: {', '.join(versions) or '-'})")
+    
+    def execute_once(self, sql: str, execute: Callable[[], Any], params: Optional[dict] = None,
+                     tables: Optional[List[str]] = None,
+                     timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """
+        Executa a query e armazena o resultado, agrupando execuções idênticas simultâneas
+        
+        A primeira chamada para uma chave executa execute() e grava o cache; as
+        chamadas que chegam enquanto ela está em andamento (de outras threads
+        ou sessões do mesmo processo) aguardam e recebem o mesmo resultado, ou
+        a mesma exceção. Se a espera passar de timeout, ou se a execução for
+        cancelada por quem a iniciou, a chamada executa por conta própria.
+        
+        Args:
+            sql: Query SQL
+            execute: Função que executa a query e retorna o resultado
+            params: Parâmetros da query (opcional)
+            tables: Tabelas lidas pela query (ver set())
+            timeout: Espera máxima em segundos pela execução em andamento
+                (padrão: CACHE_COALESCE_TIMEOUT_SECONDS)
+        
+        Returns:
+            Tupla (resultado, coalesced) — coalesced=True se o resultado veio
+            de uma execução iniciada por outra chamada
+        """
+        key = self._generate_key(sql, params)
+        with _in_flight_lock:
+            future = _in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                _in_flight[key] = future
+        
+        if not leader:
+            print(f"🔗 Aguardando execução em andamento: {key[:12]}...")
+            try:
+                result = future.result(timeout=CACHE_COALESCE_TIMEOUT_SECONDS if timeout is None else timeout)
+            except FutureTimeoutError:
+                print(f"⚠️  Execução em andamento demorou demais, executando novamente: {key[:12]}...")
+                return execute(), False
+            except QueryCancelled:
+                # Cancelada por quem a iniciou (botão Parar de outra sessão): não vale para esta
+                return self.execute_once(sql, execute, params, tables, timeout)
+            self.coalesced += 1
+            return result, True
+        
+        try:
+            versions = self.versions_for(sql, tables)
+            result = execute()
+            self.set(sql, result, params, tables=tables, versions=versions)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with _in_flight_lock:
+                _in_flight.pop(key, None)
+        return result, False
+    
+    def invalidate_table(self, table: str) -> int:
+        """
+        Invalida todas as entradas que leram a tabela
+        
+        Args:
+            table: Nome da tabela alterada
+        
+        Returns:
+            Nova versão da tabela
+        """
+        version = self.table_versions.bump(table.lower())
+        print(f"♻️  Tabela alterada, cache invalidado: {table} (versão {version})")
+        return version
     
     def clear(self) -> None:
         """Limpa todo o cache"""
         self.cache.clear()
+        if self.memory is not None:
+            self.memory.clear()
+        self.memory_stats.reset()
+        self.disk_stats.reset()
+        self.latencies.clear()
+        self.invalidations = 0
+        self.stale_hits = 0
+        self.revalidations = 0
+        self.disk_evictions = 0
+        self.skipped_too_large = 0
+        self.coalesced = 0
+        with self.shape_lock:
+            self.shape_stats.clear()
         print("🗑️  Cache limpo")
     
+    def close(self) -> None:
+        """Fecha o acesso ao diretório do cache"""
+        self.cache.close()
+    
     def get_stats(self) -> dict:
         """Retorna estatísticas do cache"""
+        memory = self.memory_stats.as_dict()
+        disk = self.disk_stats.as_dict()
+        hits = memory['hits'] + disk['hits']
+        lookups = hits + disk['misses']
+        latencies = sorted(self.latencies)
+        memory_bytes = self.memory.bytes_used if self.memory is not None else 0
+        memory_evictions = self.memory.evictions if self.memory is not None else 0
+        disk_bytes = self.cache.volume()
+        
         return {
             'size': len(self.cache),
+            'hit_ratio': hits / lookups if lookups else 0.0,
+            'bytes_used': disk_bytes,
+            'size_limit': self.size_limit,
+            'max_entry_bytes': self.max_entry_bytes,
+            'eviction_policy': self.eviction_policy,
+            'evictions': self.disk_evictions,
+            'skipped_too_large': self.skipped_too_large,
+            'latency_mean_ms': (sum(latencies) / len(latencies) * 1000) if latencies else 0.0,
+            'latency_p95_ms': latencies[int(0.95 * (len(latencies) - 1))] * 1000 if latencies else 0.0,
             'directory': self.cache_dir,
             'ttl_seconds': self.ttl,
-            'ttl_hours': self.ttl / 3600
+            'ttl_hours': self.ttl / 3600,
+            'memory': {
+                **memory,
+                'entries': len(self.memory) if self.memory is not None else 0,
+                'bytes_used': memory_bytes,
+                'max_bytes': self.memory.max_bytes if self.memory is not None else 0,
+                'evictions': memory_evictions
+            },
+            'disk': disk,
+            'invalidations': self.invalidations,
+            'stale_grace_seconds': self.stale_grace,
+            'stale_hits': self.stale_hits,
+            'revalidations': self.revalidations,
+            'coalesced': self.coalesced,
+            'in_flight': len(_in_flight),
+            'shapes': len(self.shape_stats)
         }
     
     def invalidate_query(self, sql: str, params: Optional[dict] = None) -> bool:
@@ -108,7 +738,9 @@ class CacheManager:
             True se a chave foi encontrada e removida
         """
         key = self._generate_key(sql, params)
-        return self.cache.delete(key)
+        removed_memory = self.memory.delete(key) if self.memory is not None else False
+        removed_disk = self.cache.delete(key)
+        return removed_memory or removed_disk
 
 
 # Exemplo de uso
@@ -0,0 +1,190 @@
+"""
+Cache Warm-up - Pré-carrega o cache com as perguntas de exemplo e as mais frequentes
+
+Uso:
+    python cache_warmup.py                    # exemplos + 20 perguntas mais frequentes
+    python cache_warmup.py --top 50 --workers 4
+    python cache_warmup.py --no-llm           # apenas pares pergunta/SQL do histórico
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from config import EXAMPLE_QUESTIONS, CACHE_WARMUP_TOP_N, CACHE_WARMUP_WORKERS, LLM_PROVIDER
+from cache_manager import CacheManager
+from database import DatabaseService
+from llm_service import LLMService
+from question_cache import QuestionCache, normalize_question
+from query_log import QueryLog
+from services import get_database, get_cache, get_question_cache, get_llm
+
+
+def _warm_item(item: Dict[str, Any], db: DatabaseService, cache: CacheManager,
+               llm: Optional[LLMService], question_cache: Optional[QuestionCache]) -> Dict[str, Any]:
+    """Resolve o SQL de uma pergunta e garante o resultado em cache"""
+    start = time.perf_counter()
+    report = {'question': item['question'], 'source': item['source']}
+    try:
+        llm_response = None
+        question_context = None
+        if item.get('sql'):
+            llm_response = {
+                'sql': item['sql'],
+                'explanation': item.get('explanation', ''),
+                'tables_used': item.get('tables_used', [])
+            }
+        else:
+            # Mesmo contexto (tabelas da pergunta) que o app usa, para o cache de perguntas coincidir
+            schema_context = db.get_question_schema_context(item['question'])
+            if llm is not None and question_cache is not None:
+                question_context = QuestionCache.context_hash(schema_context, llm.provider, llm.get_model_name())
+                llm_response = question_cache.get(item['question'], question_context)
+
+        if llm_response is None:
+            if llm is None:
+                report.update(status='skipped', detail='sem SQL no histórico e LLM desativado')
+                return report
+            llm_response = llm.generate_sql(item['question'], schema_context)
+            if 'error' in llm_response or not llm_response.get('sql'):
+                report.update(status='error', detail=llm_response.get('explanation', 'Erro ao gerar SQL'))
+                return report
+
+        if question_cache and question_context:
+            question_cache.set(item['question'], question_context, llm_response)
+
+        sql = llm_response['sql']
+        cached = cache.get(sql)
+        if cached is not None:
+            report.update(status='already_cached', rows=len(cached))
+            return report
+        
+        # Queries pesadas dependem de confirmação do usuário: não são aquecidas
+        decision = db.check_query(sql)
+        if decision.action != 'allow':
+            report.update(status='skipped', detail=decision.reason)
+            return report
+        sql = decision.sql
+        cached = cache.get(sql)
+        if cached is not None:
+            report.update(status='already_cached', rows=len(cached))
+        else:
+            results, _ = cache.execute_once(sql, lambda: db.fetch_capped(sql), tables=llm_response.get('tables_used'))
+            report.update(status='cached', rows=len(results))
+    except Exception as e:
+        report.update(status='error', detail=str(e))
+    finally:
+        report['seconds'] = time.perf_counter() - start
+    return report
+
+
+def warm_up(db: DatabaseService, cache: CacheManager, llm: Optional[LLMService] = None,
+            question_cache: Optional[QuestionCache] = None, top_n: Optional[int] = None,
+            max_workers: Optional[int] = None,
+            examples: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Reexecuta perguntas de exemplo e as mais frequentes do histórico para encher o cache
+
+    Perguntas do histórico reaproveitam o SQL já registrado; as demais passam
+    pelo cache de perguntas e, se necessário, pelo LLM.
+
+    Args:
+        db: Serviço de banco de dados
+        cache: Cache de resultados
+        llm: Serviço de LLM (None: apenas perguntas com SQL conhecido)
+        question_cache: Cache de perguntas a preencher (opcional)
+        top_n: Quantidade de perguntas frequentes do histórico (padrão: CACHE_WARMUP_TOP_N)
+        max_workers: Perguntas processadas em paralelo (padrão: CACHE_WARMUP_WORKERS)
+        examples: Perguntas de exemplo (padrão: EXAMPLE_QUESTIONS)
+
+    Returns:
+        Relatório com duração, cobertura e resultado de cada pergunta
+    """
+    start = time.perf_counter()
+    top_n = CACHE_WARMUP_TOP_N if top_n is None else top_n
+    max_workers = max_workers or CACHE_WARMUP_WORKERS
+
+    # Perguntas do histórico primeiro: o SQL registrado dispensa o LLM
+    items = [{**record, 'source': 'historico'} for record in QueryLog().top_questions(top_n)]
+    known = {tuple(normalize_question(item['question'])) for item in items}
+    for question in (EXAMPLE_QUESTIONS if examples is None else examples):
+        if tuple(normalize_question(question)) not in known:
+            items.append({'question': question, 'source': 'exemplo'})
+
+    print(f"🔥 Aquecendo cache: {len(items)} pergunta(s), {max_workers} em paralelo")
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='cache-warmup') as executor:
+        reports = list(executor.map(
+            lambda item: _warm_item(item, db, cache, llm, question_cache),
+            items
+        ))
+
+    covered = [r for r in reports if r['status'] in ('cached', 'already_cached')]
+    summary = {
+        'duration_seconds': time.perf_counter() - start,
+        'total': len(reports),
+        'covered': len(covered),
+        'newly_cached': sum(1 for r in reports if r['status'] == 'cached'),
+        'errors': sum(1 for r in reports if r['status'] == 'error'),
+        'items': reports
+    }
+    print(
+        f"✅ Aquecimento concluído em {summary['duration_seconds']:.1f}s: "
+        f"{summary['covered']}/{summary['total']} em cache ({summary['newly_cached']} novas, "
+        f"{summary['errors']} erro(s))"
+    )
+    return summary
+
+
+# Aquecimento de inicialização: executado uma única vez por processo
+_startup_thread = None
+_startup_lock = threading.Lock()
+
+
+def start_startup_warmup() -> None:
+    """
+    Inicia o aquecimento em segundo plano, uma vez por processo
+
+    Usa os serviços compartilhados do processo; as consultas do aquecimento
+    emprestam conexões do mesmo pool que atende as sessões.
+    """
+    global _startup_thread
+
+    def run():
+        try:
+            try:
+                llm = get_llm(LLM_PROVIDER)
+            except Exception as e:
+                print(f"⚠️  Aquecimento sem LLM: {e}")
+                llm = None
+            warm_up(get_database(), get_cache(), llm, get_question_cache())
+        except Exception as e:
+            print(f"⚠️  Falha no aquecimento do cache: {e}")
+
+    with _startup_lock:
+        if _startup_thread is None:
+            _startup_thread = threading.Thread(target=run, name='cache-warmup-startup', daemon=True)
+            _startup_thread.start()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Aquecimento do cache do chatbot')
+    parser.add_argument('--top', type=int, default=CACHE_WARMUP_TOP_N,
+                        help=f'Perguntas mais frequentes do histórico (padrão: {CACHE_WARMUP_TOP_N})')
+    parser.add_argument('--workers', type=int, default=CACHE_WARMUP_WORKERS,
+                        help=f'Perguntas em paralelo (padrão: {CACHE_WARMUP_WORKERS})')
+    parser.add_argument('--provider', default=LLM_PROVIDER, help='Provedor de LLM (gemini ou ollama)')
+    parser.add_argument('--no-llm', action='store_true', help='Não chama o LLM (apenas SQL do histórico)')
+    args = parser.parse_args()
+
+    database = DatabaseService()
+    if not database.connect():
+        raise SystemExit(1)
+
+    llm_service = None if args.no_llm else LLMService(provider=args.provider)
+    result = warm_up(database, CacheManager(), llm_service, QuestionCache(), args.top, args.workers)
+
+    print()
+    for entry in result['items']:
+        detail = f" — {entry['detail']}" if entry.get('detail') else ''
+        print(f"  [{entry['status']:<14}] {entry['seconds']:6.1f}s  ({entry['source']}) {entry['question'][:70]}{detail}")
+    database.disconnect()
@@ -0,0 +1,132 @@
+"""
+Cancellation - Cancelamento de consultas e chamadas ao LLM em andamento
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Optional
+
+
+# Execuções canceláveis, compartilhadas pelo processo (uma por pergunta em andamento)
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='cancellable')
+
+
+class QueryCancelled(Exception):
+    """Execução interrompida pelo usuário ou por tempo limite"""
+
+
+class CancelToken:
+    """
+    Sinal de cancelamento compartilhado entre quem pede a parada e quem executa
+
+    Quem executa registra callbacks que interrompem o trabalho de fato
+    (cancelar o comando no PostgreSQL, fechar a conexão HTTP); cancel()
+    chama todos uma única vez.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        """
+        Args:
+            timeout: Prazo em segundos; ao passar, check() cancela o token
+        """
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.reason = None
+        self._event = threading.Event()
+        self._callbacks = {}
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = 'Interrompido pelo usuário') -> None:
+        """Cancela e executa os callbacks registrados"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks = list(self._callbacks.values())
+            self._callbacks.clear()
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"⚠️  Falha ao cancelar: {e}")
+
+    def register(self, callback: Callable[[], Any]) -> Callable[[], None]:
+        """
+        Registra uma ação de cancelamento
+
+        Se o token já foi cancelado, a ação é executada imediatamente.
+
+        Returns:
+            Função que remove o registro (chamar quando o trabalho terminar)
+        """
+        key = object()
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks[key] = callback
+                return lambda: self._callbacks.pop(key, None)
+        callback()
+        return lambda: None
+
+    def check(self) -> None:
+        """Cancela se o prazo passou e levanta QueryCancelled se cancelado"""
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel('Tempo limite excedido')
+        if self._event.is_set():
+            raise QueryCancelled(self.reason)
+
+
+def run_in_background(func: Callable[[], Any]) -> Future:
+    """
+    Inicia func() no executor compartilhado sem aguardar
+
+    Para trabalho que pode começar antes de quem precisa do resultado
+    terminar (ex.: avaliar o SQL enquanto o LLM ainda escreve a explicação).
+
+    Returns:
+        Future com o resultado de func()
+    """
+    return _executor.submit(func)
+
+
+def run_cancellable(func: Callable[[], Any], token: CancelToken, poll_interval: float = 0.25,
+                    on_poll: Optional[Callable[[], Any]] = None) -> Any:
+    """
+    Executa func() em outra thread e aguarda verificando o token
+
+    A thread que chama fica livre para reagir: on_poll é chamado a cada
+    poll_interval (no Streamlit, atualizar um elemento da página é o ponto em
+    que um clique em "Parar" interrompe o script). Qualquer interrupção da
+    espera — token cancelado, prazo excedido ou exceção em on_poll — cancela
+    o token, o que interrompe a consulta ou a requisição em andamento.
+
+    Args:
+        func: Trabalho a executar (deve usar o token para ser interrompível)
+        token: Token de cancelamento
+        poll_interval: Intervalo entre verificações em segundos
+        on_poll: Chamado a cada verificação (opcional)
+
+    Returns:
+        Resultado de func()
+
+    Raises:
+        QueryCancelled: se o token for cancelado antes do fim
+    """
+    token.check()
+    future = _executor.submit(func)
+    try:
+        while True:
+            try:
+                return future.result(timeout=poll_interval)
+            except FutureTimeoutError:
+                pass
+            if on_poll is not None:
+                on_poll()
+            token.check()
+    except BaseException:
+        token.cancel(token.reason or 'Interrompido')
+        raise
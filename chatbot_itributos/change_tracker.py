@@ -0,0 +1,246 @@
+"""
+Change Tracker - Invalidação do cache por tabela a partir de alterações no banco
+"""
+import argparse
+import select
+import threading
+import time
+from typing import Dict, List, Optional
+import psycopg2
+from config import DB_CONFIG, CACHE_INVALIDATION_MODE, CACHE_INVALIDATION_INTERVAL
+from cache_manager import CacheManager
+from database import MAIN_TABLES
+
+
+NOTIFY_CHANNEL = 'itributos_table_changes'
+
+NOTIFY_FUNCTION_SQL = f"""
+    CREATE OR REPLACE FUNCTION itributos_notify_table_change() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{NOTIFY_CHANNEL}', TG_TABLE_NAME);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+COUNTERS_SQL = """
+    SELECT relname, n_tup_ins + n_tup_upd + n_tup_del AS changes
+    FROM pg_stat_user_tables
+    WHERE schemaname = 'public'
+"""
+
+# Chave (não textual, para não se confundir com nomes de tabela) dos últimos contadores lidos
+COUNTERS_KEY = ('pg_stat_counters',)
+
+
+class TableChangeTracker:
+    """
+    Detecta alterações nas tabelas e invalida as entradas do cache que as leram
+
+    Modos:
+        - 'poll': compara periodicamente os contadores de pg_stat_user_tables
+          (não exige nenhuma alteração no banco; atraso de até um intervalo)
+        - 'notify': escuta LISTEN/NOTIFY disparado por triggers nas tabelas
+          (imediato; exige install_notify_triggers uma vez)
+    """
+
+    def __init__(self, cache: CacheManager, mode: Optional[str] = None,
+                 interval: Optional[int] = None):
+        """
+        Args:
+            cache: Gerenciador de cache a invalidar
+            mode: 'poll' ou 'notify' (padrão: CACHE_INVALIDATION_MODE)
+            interval: Intervalo de verificação em segundos (padrão: CACHE_INVALIDATION_INTERVAL)
+        """
+        self.cache = cache
+        self.mode = mode or CACHE_INVALIDATION_MODE
+        self.interval = interval or CACHE_INVALIDATION_INTERVAL
+        self.connection = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.last_check = None
+        self.changes_detected = 0
+
+        if self.mode not in ('poll', 'notify'):
+            raise ValueError(f"Modo de invalidação '{self.mode}' não suportado. Use 'poll' ou 'notify'")
+
+    def _connect(self):
+        if self.connection is None or self.connection.closed:
+            self.connection = psycopg2.connect(**DB_CONFIG)
+            self.connection.autocommit = True
+            if self.mode == 'notify':
+                with self.connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        return self.connection
+
+    def _invalidate(self, tables: List[str]) -> None:
+        for table in sorted(set(tables)):
+            self.cache.invalidate_table(table)
+            self.changes_detected += 1
+
+    def poll_once(self) -> List[str]:
+        """
+        Compara os contadores de modificação com a última leitura
+
+        Returns:
+            Tabelas alteradas desde a última leitura
+        """
+        with self._connect().cursor() as cursor:
+            cursor.execute(COUNTERS_SQL)
+            counters: Dict[str, int] = {name: changes for name, changes in cursor.fetchall()}
+
+        # Os contadores anteriores ficam junto das versões de tabela para que
+        # alterações feitas com a aplicação parada também sejam detectadas
+        store = self.cache.table_versions.store
+        previous = store.get(COUNTERS_KEY)
+        store.set(COUNTERS_KEY, counters)
+        self.last_check = time.time()
+        if previous is None:
+            return []
+
+        # Contador menor indica reinício das estatísticas: trata como alteração
+        changed = [name for name, changes in counters.items() if previous.get(name) != changes]
+        self._invalidate(changed)
+        return changed
+
+    def listen_once(self, timeout: float) -> List[str]:
+        """
+        Aguarda notificações de alteração por até timeout segundos
+
+        Returns:
+            Tabelas notificadas
+        """
+        connection = self._connect()
+        if select.select([connection], [], [], timeout) != ([], [], []):
+            connection.poll()
+
+        changed = []
+        while connection.notifies:
+            changed.append(connection.notifies.pop(0).payload)
+        self.last_check = time.time()
+        self._invalidate(changed)
+        return changed
+
+    def _run(self) -> None:
+        print(f"👀 Monitorando alterações de tabelas (modo: {self.mode}, intervalo: {self.interval}s)")
+        while not self.stop_event.is_set():
+            try:
+                if self.mode == 'notify':
+                    self.listen_once(self.interval)
+                else:
+                    self.poll_once()
+                    self.stop_event.wait(self.interval)
+            except Exception as e:
+                print(f"⚠️  Erro ao verificar alterações de tabelas: {e}")
+                if self.connection is not None:
+                    self.connection.close()
+                self.connection = None
+                self.stop_event.wait(self.interval)
+
+    def start(self) -> None:
+        """Inicia o monitoramento em uma thread de fundo"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name='table-change-tracker', daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Interrompe o monitoramento e fecha a conexão"""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=self.interval + 1)
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def get_stats(self) -> dict:
+        """Retorna estado do monitoramento"""
+        return {
+            'mode': self.mode,
+            'interval_seconds': self.interval,
+            'running': bool(self.thread and self.thread.is_alive()),
+            'last_check': self.last_check,
+            'changes_detected': self.changes_detected
+        }
+
+
+def install_notify_triggers(tables: Optional[List[str]] = None) -> None:
+    """
+    Cria os triggers de NOTIFY usados pelo modo 'notify'
+
+    Args:
+        tables: Tabelas monitoradas (padrão: MAIN_TABLES)
+    """
+    connection = psycopg2.connect(**DB_CONFIG)
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(NOTIFY_FUNCTION_SQL)
+            for table in tables or MAIN_TABLES:
+                cursor.execute(f"DROP TRIGGER IF EXISTS trg_itributos_notify_change ON {table}")
+                cursor.execute(f"""
+                    CREATE TRIGGER trg_itributos_notify_change
+                    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+                    FOR EACH STATEMENT EXECUTE PROCEDURE itributos_notify_table_change()
+                """)
+                print(f"✅ Trigger de notificação criado em {table}")
+    finally:
+        connection.close()
+
+
+# Monitor único por processo
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def start_change_tracker(cache: CacheManager) -> Optional[TableChangeTracker]:
+    """
+    Inicia (uma única vez por processo) o monitoramento de alterações
+
+    Args:
+        cache: Gerenciador de cache a invalidar
+
+    Returns:
+        Monitor ativo ou None se CACHE_INVALIDATION_MODE='off'
+    """
+    global _tracker
+    if CACHE_INVALIDATION_MODE == 'off':
+        return None
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = TableChangeTracker(cache)
+            _tracker.start()
+        return _tracker
+
+
+def stop_change_tracker() -> None:
+    """Interrompe o monitor do processo, se estiver ativo"""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is not None:
+            _tracker.stop()
+            _tracker = None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Invalidação do cache por alteração de tabelas')
+    parser.add_argument('--install-triggers', action='store_true',
+                        help='Cria os triggers de NOTIFY nas tabelas principais')
+    parser.add_argument('--once', action='store_true',
+                        help='Executa uma única verificação por contadores e sai')
+    args = parser.parse_args()
+
+    if args.install_triggers:
+        install_notify_triggers()
+    elif args.once:
+        tracker = TableChangeTracker(CacheManager(), mode='poll')
+        print(f"Tabelas alteradas: {tracker.poll_once() or 'nenhuma'}")
+    else:
+        tracker = TableChangeTracker(CacheManager())
+        tracker.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            tracker.stop()
@@ -13,6 +13,65 @@ DB_CONFIG = {
     'password': os.getenv('DB_PASSWORD', 'postgres')
 }
 
+# Pool de conexões: conexões mantidas/máximas, espera por conexão livre (s),
+# reciclagem de ociosas/antigas (s) e teste com SELECT 1 após N segundos ociosa
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+DB_POOL_CHECKOUT_TIMEOUT = float(os.getenv('DB_POOL_CHECKOUT_TIMEOUT', '30'))
+DB_POOL_MAX_IDLE_SECONDS = float(os.getenv('DB_POOL_MAX_IDLE_SECONDS', '300'))
+DB_POOL_MAX_LIFETIME_SECONDS = float(os.getenv('DB_POOL_MAX_LIFETIME_SECONDS', '3600'))
+DB_POOL_HEALTH_CHECK_AFTER = float(os.getenv('DB_POOL_HEALTH_CHECK_AFTER', '30'))
+
+# Tempo máximo de cada comando SQL nas conexões do pool (segundos, 0 desativa)
+DB_STATEMENT_TIMEOUT_SECONDS = int(os.getenv('DB_STATEMENT_TIMEOUT_SECONDS', '60'))
+
+# Prazo de cada pergunta na interface (LLM + banco, segundos, 0 desativa); ao
+# passar, a requisição ao LLM e a consulta em andamento são canceladas
+REQUEST_DEADLINE_SECONDS = float(os.getenv('REQUEST_DEADLINE_SECONDS', '300'))
+
+# Sessões do chatbot somente leitura (default_transaction_read_only)
+DB_READ_ONLY = os.getenv('DB_READ_ONLY', 'true').lower() == 'true'
+
+# Réplicas de leitura (DSNs separados por vírgula, ex.: postgresql://leitor@replica1:5432/itributos);
+# as consultas do chatbot vão para a réplica saudável menos ocupada e só usam o primário
+# (DB_CONFIG) quando todas estão fora. Réplicas com atraso acima de DB_REPLICA_MAX_LAG_SECONDS
+# só são usadas se nenhuma estiver em dia
+DB_REPLICA_DSNS = [dsn.strip() for dsn in os.getenv('DB_REPLICA_DSNS', '').split(',') if dsn.strip()]
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv('DB_REPLICA_MAX_LAG_SECONDS', '30'))
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_CHECK_INTERVAL', '10'))
+DB_REPLICA_CONNECT_TIMEOUT = int(os.getenv('DB_REPLICA_CONNECT_TIMEOUT', '5'))
+
+# Intervalo (segundos) em que `python agreement_summary.py --watch` confere se payments/payment_parcels
+# mudaram para atualizar mv_agreement_parcel_summary
+AGREEMENT_SUMMARY_REFRESH_SECONDS = float(os.getenv('AGREEMENT_SUMMARY_REFRESH_SECONDS', '300'))
+
+# Avaliação das queries do LLM por EXPLAIN: custo estimado para pedir confirmação
+# ou recusar, e linhas estimadas a partir das quais a query recebe LIMIT GOVERNOR_ROW_CAP
+GOVERNOR_ENABLED = os.getenv('GOVERNOR_ENABLED', 'true').lower() == 'true'
+GOVERNOR_CONFIRM_COST = float(os.getenv('GOVERNOR_CONFIRM_COST', '1000000'))
+GOVERNOR_REJECT_COST = float(os.getenv('GOVERNOR_REJECT_COST', '50000000'))
+GOVERNOR_LIMIT_ROWS = int(os.getenv('GOVERNOR_LIMIT_ROWS', '50000'))
+GOVERNOR_ROW_CAP = int(os.getenv('GOVERNOR_ROW_CAP', '10000'))
+
+# Leitura de resultados com cursor no servidor: linhas por lote e limites de
+# linhas/bytes por consulta (resultados maiores são truncados; 0 desativa)
+QUERY_ITERSIZE = int(os.getenv('QUERY_ITERSIZE', '2000'))
+QUERY_MAX_ROWS = int(os.getenv('QUERY_MAX_ROWS', '100000'))
+QUERY_MAX_BYTES = int(os.getenv('QUERY_MAX_BYTES', str(256 * 1024 * 1024)))
+
+# Leitura de NUMERIC nas conexões do pool: float (float64, colunas numéricas no pandas),
+# cents (int64 em centavos) ou decimal (Decimal, mais lento)
+DB_NUMERIC_MODE = os.getenv('DB_NUMERIC_MODE', 'float').lower()
+
+# Prepared statements: literais das comparações viram parâmetros e consultas de
+# mesma estrutura reaproveitam o PREPARE (análise e plano) em cada conexão
+PREPARED_STATEMENTS_ENABLED = os.getenv('PREPARED_STATEMENTS_ENABLED', 'true').lower() == 'true'
+PREPARED_STATEMENTS_PER_CONNECTION = int(os.getenv('PREPARED_STATEMENTS_PER_CONNECTION', '100'))
+
+# Contribuintes consultados recentemente (busca por CPF/CNPJ), em memória no processo
+CONTRIBUTOR_CACHE_MAX_BYTES = int(os.getenv('CONTRIBUTOR_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))  # 0 desativa
+CONTRIBUTOR_CACHE_TTL = int(os.getenv('CONTRIBUTOR_CACHE_TTL', '600'))
+
 # Ollama Configuration
 OLLAMA_HOST = os.getenv('OLLAMA_HOST', 'http://localhost:11434')
 OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'qwen2.5:3b')
@@ -47,6 +106,61 @@ LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'gemini')
 # Configurações do Cache
 CACHE_DIR = os.getenv('CACHE_DIR', './cache')
 CACHE_TTL_SECONDS = int(os.getenv('CACHE_TTL_SECONDS', '3600'))
+CACHE_MEMORY_MAX_BYTES = int(os.getenv('CACHE_MEMORY_MAX_BYTES', str(128 * 1024 * 1024)))  # 0 desativa a camada em memória
+CACHE_SIZE_LIMIT_BYTES = int(os.getenv('CACHE_SIZE_LIMIT_BYTES', str(1024 * 1024 * 1024)))  # Limite do cache em disco
+CACHE_MAX_ENTRY_BYTES = int(os.getenv('CACHE_MAX_ENTRY_BYTES', str(50 * 1024 * 1024)))  # Resultados maiores não são armazenados
+CACHE_EVICTION_POLICY = os.getenv('CACHE_EVICTION_POLICY', 'lru').lower()  # lru, lfu ou ttl
+
+# Invalidação por tabela: 'poll' (pg_stat_user_tables), 'notify' (LISTEN/NOTIFY) ou 'off'
+CACHE_INVALIDATION_MODE = os.getenv('CACHE_INVALIDATION_MODE', 'poll').lower()
+CACHE_INVALIDATION_INTERVAL = int(os.getenv('CACHE_INVALIDATION_INTERVAL', '30'))
+
+# Stale-while-revalidate: janela (segundos) em que um resultado expirado ainda é exibido
+# enquanto é atualizado em segundo plano. Por tabela: "payments=1800,payment_parcels=1800"
+CACHE_STALE_GRACE_SECONDS = int(os.getenv('CACHE_STALE_GRACE_SECONDS', '0'))
+CACHE_STALE_GRACE_BY_TABLE = {
+    table.strip().lower(): int(seconds)
+    for table, seconds in (
+        item.split('=') for item in os.getenv('CACHE_STALE_GRACE_BY_TABLE', '').split(',') if '=' in item
+    )
+}
+CACHE_REVALIDATE_WORKERS = int(os.getenv('CACHE_REVALIDATE_WORKERS', '2'))
+
+# Execuções idênticas simultâneas aguardam a primeira (single-flight) por até N segundos
+CACHE_COALESCE_TIMEOUT_SECONDS = int(os.getenv('CACHE_COALESCE_TIMEOUT_SECONDS', '300'))
+
+# Cache de perguntas (pergunta normalizada → SQL gerado pelo LLM)
+QUESTION_CACHE_ENABLED = os.getenv('QUESTION_CACHE_ENABLED', 'true').lower() == 'true'
+QUESTION_CACHE_TTL_SECONDS = int(os.getenv('QUESTION_CACHE_TTL_SECONDS', '86400'))
+QUESTION_CACHE_SIMILARITY = float(os.getenv('QUESTION_CACHE_SIMILARITY', '1.0'))  # 1.0 = mesmos tokens, mesma ordem; < 1.0 ativa a busca aproximada
+QUESTION_CACHE_INDEX_SIZE = int(os.getenv('QUESTION_CACHE_INDEX_SIZE', '500'))
+
+# Contexto do schema: intervalo (segundos) para conferir se o DDL mudou
+SCHEMA_REFRESH_SECONDS = int(os.getenv('SCHEMA_REFRESH_SECONDS', '300'))
+
+# Envia ao LLM só as tabelas relevantes para a pergunta (false: schema completo sempre)
+SCHEMA_PRUNING_ENABLED = os.getenv('SCHEMA_PRUNING_ENABLED', 'true').lower() == 'true'
+
+# Histórico persistente de perguntas (usado pelo aquecimento do cache)
+QUERY_LOG_PATH = os.getenv('QUERY_LOG_PATH', os.path.join(CACHE_DIR, 'query_history.jsonl'))
+QUERY_LOG_MAX_LINES = int(os.getenv('QUERY_LOG_MAX_LINES', '50000'))
+QUERY_LOG_MAX_BYTES = int(os.getenv('QUERY_LOG_MAX_BYTES', str(64 * 1024 * 1024)))  # acima disso, só os registros recentes ficam
+
+# Medições por execução no banco (buffer circular em memória, exportável em JSON lines)
+QUERY_METRICS_SIZE = int(os.getenv('QUERY_METRICS_SIZE', '5000'))
+QUERY_METRICS_PATH = os.getenv('QUERY_METRICS_PATH', os.path.join(CACHE_DIR, 'query_metrics.jsonl'))
+
+# Aquecimento do cache (python cache_warmup.py ou na inicialização do app)
+CACHE_WARMUP_ON_STARTUP = os.getenv('CACHE_WARMUP_ON_STARTUP', 'false').lower() == 'true'
+CACHE_WARMUP_TOP_N = int(os.getenv('CACHE_WARMUP_TOP_N', '20'))
+CACHE_WARMUP_WORKERS = int(os.getenv('CACHE_WARMUP_WORKERS', '3'))
+
+# Perguntas dos botões de exemplo (também aquecidas no cache)
+EXAMPLE_QUESTIONS = [
+    "Me dê um histórico financeiro do contribuinte 34.019.100/0001-81",
+    "Quais são os parcelamentos ativos?",
+    "Mostre os pagamentos realizados em dezembro de 2024",
+]
 
 # Configurações do Streamlit
 STREAMLIT_PORT = int(os.getenv('STREAMLIT_PORT', '8501'))
@@ -0,0 +1,102 @@
+"""
+Contributors - CPF/CNPJ normalizado para busca de contribuintes
+
+unico_people.cpf_cnpj guarda o documento como foi cadastrado (com ou sem
+pontuação). As buscas comparam só os dígitos, pela mesma expressão de um
+índice funcional, então "34019100000181" e "34.019.100/0001-81" encontram o
+mesmo contribuinte sem varrer a tabela.
+
+Uso:
+    python contributors.py --install-index   # cria o índice funcional (CONCURRENTLY)
+"""
+import argparse
+import re
+from typing import List
+import psycopg2
+from config import DB_CONFIG
+
+
+# Chave de busca: só os dígitos do documento. Precisa ser idêntica à do índice
+DOCUMENT_KEY_SQL = "regexp_replace(cpf_cnpj, '[^0-9]', '', 'g')"
+
+INDEX_NAME = 'idx_unico_people_cpf_cnpj_digits'
+INDEX_SQL = f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} ON unico_people (({DOCUMENT_KEY_SQL}))"
+
+# CPF (11 dígitos) ou CNPJ (14), com ou sem pontuação, isolados de outros números
+DOCUMENT_PATTERN = re.compile(
+    r'(?<![\d.\-/])(\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2}|\d{3}\.?\d{3}\.?\d{3}-?\d{2})(?![\d.\-/]\d)'
+)
+
+
+def normalize_document(value: str) -> str:
+    """
+    Dígitos do CPF/CNPJ ("34.019.100/0001-81" → "34019100000181")
+
+    Returns:
+        String só com dígitos (vazia se não houver nenhum)
+    """
+    return re.sub(r'\D', '', value or '')
+
+
+def _check_digit(digits: str, weights: List[int]) -> str:
+    remainder = sum(int(d) * w for d, w in zip(digits, weights)) % 11
+    return '0' if remainder < 2 else str(11 - remainder)
+
+
+def is_valid_document(document: str) -> bool:
+    """Confere os dígitos verificadores de um CPF (11 dígitos) ou CNPJ (14)"""
+    if len(document) == 11:
+        weights = list(range(10, 1, -1))
+    elif len(document) == 14:
+        weights = [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
+    else:
+        return False
+    if len(set(document)) == 1:  # 000.000.000-00, 111.111.111-11...
+        return False
+    first = _check_digit(document, weights)
+    second = _check_digit(document[:-2] + first, [weights[0] + 1] + weights)
+    return document[-2:] == first + second
+
+
+def extract_documents(text: str) -> List[str]:
+    """
+    CPFs/CNPJs válidos citados no texto, normalizados e sem repetição
+
+    Números com dígitos verificadores inválidos (telefones, protocolos) são ignorados.
+
+    Args:
+        text: Pergunta do usuário
+
+    Returns:
+        Documentos (só dígitos) na ordem em que aparecem
+    """
+    documents = []
+    for match in DOCUMENT_PATTERN.findall(text or ''):
+        document = normalize_document(match)
+        if is_valid_document(document) and document not in documents:
+            documents.append(document)
+    return documents
+
+
+def install_index() -> None:
+    """Cria o índice funcional sem bloquear escritas (conexão de escrita com o primário)"""
+    connection = psycopg2.connect(**DB_CONFIG)
+    connection.autocommit = True  # CREATE INDEX CONCURRENTLY não roda dentro de transação
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(INDEX_SQL)
+            cursor.execute("ANALYZE unico_people")
+        print(f"✅ Índice {INDEX_NAME} criado")
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Busca de contribuintes por CPF/CNPJ normalizado')
+    parser.add_argument('--install-index', action='store_true', help=f'Cria o índice {INDEX_NAME}')
+    args = parser.parse_args()
+
+    if args.install_index:
+        install_index()
+    else:
+        parser.print_help()
@@ -3,29 +3,190 @@ Database Module - Conexão e operações no banco iTributos
 """
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from typing import List, Dict, Any, Optional
-from config import DB_CONFIG
+import hashlib
+import io
+import json
+import sys
+import threading
+import time
+import uuid
+from contextlib import ExitStack, contextmanager
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
+from config import (
+    DB_CONFIG,
+    DB_STATEMENT_TIMEOUT_SECONDS,
+    DB_REPLICA_DSNS,
+    CACHE_DIR,
+    PREPARED_STATEMENTS_ENABLED,
+    PREPARED_STATEMENTS_PER_CONNECTION,
+    CONTRIBUTOR_CACHE_MAX_BYTES,
+    CONTRIBUTOR_CACHE_TTL,
+    QUERY_ITERSIZE,
+    QUERY_MAX_ROWS,
+    QUERY_MAX_BYTES,
+    SCHEMA_REFRESH_SECONDS,
+    SCHEMA_PRUNING_ENABLED,
+)
+from db_pool import ConnectionPool, PooledConnection
+from db_replicas import ReplicaRouter
+from cancellation import CancelToken, QueryCancelled
+from cache_manager import MemoryTier, get_table_versions
+from contributors import DOCUMENT_KEY_SQL, normalize_document
+from query_metrics import QueryMetrics
+from query_governor import QueryGovernor, GovernorDecision
+from sql_utils import extract_tables, parameterize, top_level_limit
+from result_codec import to_dataframe
+from schema_catalog import (
+    SchemaGraph,
+    SchemaStore,
+    build_schema_graph,
+    schema_fingerprint,
+    load_catalog,
+    render_schema_context,
+)
+from schema_pruning import select_tables
+import pg_types
 import pandas as pd
 
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # Sem pyarrow, execute_to_dataframe usa o caminho por dicionários
+    pa = None
+
+
+# Tabelas principais do iTributos
+MAIN_TABLES = [
+    'unico_people',
+    'payments',
+    'payment_parcels',
+    'payment_status',
+    'active_debts',
+    'active_debt_status',
+    'agreements',
+    'agreement_operations',
+    'other_debts_agreement_operations',
+    'taxable_debts',
+    'revenues',
+    'payment_entries',
+    'graphic_files',
+    'graphic_files_payment_parcels'
+]
+
+# Resumos pré-calculados incluídos no contexto do LLM quando existirem no banco
+# (mv_agreement_parcel_summary: python agreement_summary.py --install)
+SUMMARY_TABLES = [
+    'mv_agreement_parcel_summary'
+]
+
+
+# Linhas medidas por consulta para estimar os bytes do resultado
+BYTES_SAMPLE_ROWS = 100
+
+# Execuções de uma leitura: a segunda só acontece se a réplica cair antes de
+# entregar linhas (e vai para outra réplica ou para o primário)
+READ_ATTEMPTS = 2
+
+
+class QueryResult(list):
+    """
+    Linhas retornadas por fetch_capped (lista de dicionários)
+    
+    Attributes:
+        truncated: True se o limite de linhas/bytes interrompeu a leitura
+        bytes: Tamanho aproximado das linhas em memória
+        columns: pg_types.Column de cada coluna (nome, OID, dtype pandas), na ordem do SELECT
+    """
+    
+    def __init__(self, rows=(), truncated: bool = False, size: int = 0,
+                 columns: Optional[List[pg_types.Column]] = None):
+        super().__init__(rows)
+        self.truncated = truncated
+        self.bytes = size
+        self.columns = columns or []
+
+
+class _ReplicaFailed(psycopg2.OperationalError):
+    """
+    Conexão com a réplica caiu durante a consulta
+
+    A réplica já saiu do rodízio: se nenhuma linha foi entregue, quem chamou
+    pode refazer a consulta, que vai para outra réplica ou para o primário.
+    """
+
+
+def _query_error(error: Exception, token: Optional[CancelToken] = None) -> Exception:
+    """Mensagem de erro de query para o usuário"""
+    if isinstance(error, QueryCancelled):
+        return error
+    if isinstance(error, psycopg2.errors.QueryCanceled):
+        if token is not None and token.cancelled:
+            return QueryCancelled(token.reason)
+        return Exception(f"Consulta interrompida: tempo limite de {DB_STATEMENT_TIMEOUT_SECONDS}s excedido")
+    return Exception(f"Erro ao executar query: {error}")
+
+
+def _fill_columns(cursor, pooled: PooledConnection, columns: Optional[list]) -> None:
+    """Preenche columns (se vazia) com os metadados das colunas do cursor"""
+    if columns is not None and not columns and cursor.description:
+        columns.extend(pg_types.describe(cursor.description, pooled.pool.numeric_mode))
+
+
+def _row_bytes(row: Dict[str, Any]) -> int:
+    """Tamanho aproximado de uma linha em memória"""
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values())
+
+
+def _count_row(record: Dict[str, Any], row: Dict[str, Any]) -> None:
+    """Conta a linha na medição; os bytes seguem a média das primeiras BYTES_SAMPLE_ROWS linhas"""
+    record['rows'] += 1
+    if record['rows'] <= BYTES_SAMPLE_ROWS:
+        record['bytes'] += _row_bytes(row)
+    else:
+        record['bytes'] += record['bytes'] // (record['rows'] - 1)
+
 
 class DatabaseService:
     """Serviço de banco de dados para iTributos"""
     
-    def __init__(self):
-        """Inicializa conexão com o banco"""
+    def __init__(self, replica_dsns: Optional[List[str]] = None):
+        """
+        Inicializa conexão com o banco
+        
+        Args:
+            replica_dsns: DSNs das réplicas de leitura (padrão: DB_REPLICA_DSNS)
+        """
         self.config = DB_CONFIG
-        self.connection = None
-        self.schema_cache = None
+        self.replica_dsns = DB_REPLICA_DSNS if replica_dsns is None else replica_dsns
+        self.pool = None
+        self.replicas = None
+        # Versões das tabelas do cache: leituras de tabelas recém-alteradas vão ao primário
+        self.table_versions = get_table_versions(CACHE_DIR) if self.replica_dsns else None
+        self.pool_lock = threading.Lock()
+        self.schema_cache = {}  # (tipo, *tabelas) -> (contexto ou grafo, momento da verificação)
+        self.schema_store = SchemaStore()
+        self.governor = QueryGovernor()
+        self.active_queries = {}  # (servidor, PID do backend) -> {'sql', 'started_at'}
+        self.active_lock = threading.Lock()
+        self.metrics = QueryMetrics()
+        self.unpreparable = set()  # PREPARE/EXECUTE falhou ou resultado maior que um lote (executadas sem parâmetros)
+        self.prepared_stats = {'prepared': 0, 'reused': 0, 'unpreparable': 0, 'deallocated': 0}
+        # Contribuintes por CPF/CNPJ normalizado (None se desativado)
+        self.contributor_cache = MemoryTier(CONTRIBUTOR_CACHE_MAX_BYTES) if CONTRIBUTOR_CACHE_MAX_BYTES > 0 else None
         
     def connect(self) -> bool:
         """
-        Estabelece conexão com o banco
+        Cria o pool de conexões com o banco (e o roteamento para as réplicas)
         
         Returns:
             True se conectado com sucesso
         """
         try:
-            self.connection = psycopg2.connect(**self.config)
+            with self.pool_lock:
+                if self.pool is None:
+                    self.pool = ConnectionPool(self.config)
+                if self.replica_dsns and self.replicas is None:
+                    self.replicas = ReplicaRouter(self.replica_dsns)
             print(f"✅ Conectado ao banco: {self.config['database']}")
             return True
         except Exception as e:
@@ -33,166 +194,524 @@ class DatabaseService:
             return False
     
     def disconnect(self):
-        """Fecha conexão com o banco"""
-        if self.connection:
-            self.connection.close()
-            print("🔌 Conexão fechada")
+        """Fecha as conexões do pool"""
+        with self.pool_lock:
+            if self.replicas:
+                self.replicas.close()
+                self.replicas = None
+            if self.pool:
+                self.pool.close()
+                self.pool = None
+                print("🔌 Conexão fechada")
     
-    def execute_query(self, sql: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
+    def execute_query(self, sql: str, params: Optional[tuple] = None,
+                      token: Optional[CancelToken] = None) -> List[Dict[str, Any]]:
         """
         Executa query SQL e retorna resultados
         
         Args:
             sql: Query SQL
             params: Parâmetros da query (opcional)
+            token: Cancela o comando no servidor quando acionado (opcional)
         
         Returns:
             Lista de dicionários com os resultados
         """
-        if not self.connection or self.connection.closed:
-            self.connect()
+        if not self.pool and not self.connect():
+            raise Exception("Erro ao executar query: sem conexão com o banco")
+        
+        for attempt in range(READ_ATTEMPTS):
+            try:
+                # A conexão volta ao pool (com rollback) ao final do bloco
+                with self._read_connection(sql) as pooled, self._running(pooled, sql, token) as record:
+                    with pooled.connection.cursor(cursor_factory=RealDictCursor) as cursor:
+                        cursor.execute(sql, params)
+                        results = cursor.fetchall()
+                        
+                        # Converte RealDictRow para dict comum
+                        rows = [dict(row) for row in results]
+                        for row in rows:
+                            _count_row(record, row)
+                        return rows
+            except _ReplicaFailed as e:
+                if attempt + 1 == READ_ATTEMPTS:
+                    raise _query_error(e, token)
+            except Exception as e:
+                raise _query_error(e, token)
+    
+    def iter_query(self, sql: str, params: Optional[tuple] = None,
+                   itersize: Optional[int] = None,
+                   token: Optional[CancelToken] = None,
+                   columns: Optional[List[pg_types.Column]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Executa query com cursor no servidor e devolve as linhas uma a uma
+        
+        As linhas são buscadas em lotes de itersize, então a memória usada
+        não depende do tamanho do resultado. A conexão fica emprestada até o
+        gerador terminar ou ser fechado.
+        
+        Args:
+            sql: Query SQL
+            params: Parâmetros da query (opcional)
+            itersize: Linhas buscadas por ida ao servidor (padrão: QUERY_ITERSIZE)
+            token: Cancela o comando no servidor quando acionado (opcional)
+            columns: Lista preenchida com os metadados das colunas (opcional)
+        
+        Yields:
+            Dicionário por linha
+        """
+        if not self.pool and not self.connect():
+            raise Exception("Erro ao executar query: sem conexão com o banco")
+        
+        cursor_name = f"chatbot_{uuid.uuid4().hex[:16]}"
+        sent = False
+        for attempt in range(READ_ATTEMPTS):
+            try:
+                with self._read_connection(sql) as pooled, self._running(pooled, sql, token, 'cursor') as record:
+                    with pooled.connection.cursor(name=cursor_name, cursor_factory=RealDictCursor) as cursor:
+                        cursor.itersize = itersize or QUERY_ITERSIZE
+                        cursor.execute(sql, params)
+                        # Em cursor no servidor, description só existe após o primeiro FETCH
+                        for row in cursor:
+                            _fill_columns(cursor, pooled, columns)
+                            row = dict(row)
+                            _count_row(record, row)
+                            sent = True
+                            yield row
+                        _fill_columns(cursor, pooled, columns)
+                return
+            except _ReplicaFailed as e:
+                # Linhas já entregues não podem ser refeitas em outro servidor
+                if sent or attempt + 1 == READ_ATTEMPTS:
+                    raise _query_error(e, token)
+            except psycopg2.Error as e:
+                raise _query_error(e, token)
+    
+    def fetch_capped(self, sql: str, params: Optional[tuple] = None,
+                     max_rows: Optional[int] = None, max_bytes: Optional[int] = None,
+                     itersize: Optional[int] = None,
+                     token: Optional[CancelToken] = None) -> QueryResult:
+        """
+        Executa query lendo no máximo max_rows linhas / max_bytes bytes
+        
+        Args:
+            sql: Query SQL
+            params: Parâmetros da query (opcional)
+            max_rows: Limite de linhas (padrão: QUERY_MAX_ROWS, 0 sem limite)
+            max_bytes: Limite aproximado de memória (padrão: QUERY_MAX_BYTES, 0 sem limite)
+            itersize: Linhas buscadas por ida ao servidor (padrão: QUERY_ITERSIZE)
+            token: Cancela o comando no servidor quando acionado (opcional)
+        
+        Returns:
+            QueryResult com as linhas lidas; truncated=True se algum limite foi atingido
+        """
+        max_rows = QUERY_MAX_ROWS if max_rows is None else max_rows
+        max_bytes = QUERY_MAX_BYTES if max_bytes is None else max_bytes
         
+        result = QueryResult()
+        if PREPARED_STATEMENTS_ENABLED and params is None and max_rows:
+            rows = self.iter_prepared(sql, max_rows + 1, itersize, token, result.columns)
+        else:
+            rows = self.iter_query(sql, params, itersize, token, result.columns)
         try:
-            with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
-                cursor.execute(sql, params)
-                results = cursor.fetchall()
-                
-                # Converte RealDictRow para dict comum
-                return [dict(row) for row in results]
-        except Exception as e:
-            self.connection.rollback()
-            raise Exception(f"Erro ao executar query: {e}")
+            for row in rows:
+                if max_rows and len(result) >= max_rows:
+                    result.truncated = True
+                    break
+                result.bytes += _row_bytes(row)
+                result.append(row)
+                if max_bytes and result.bytes >= max_bytes:
+                    result.truncated = True
+                    break
+        finally:
+            rows.close()  # Fecha o cursor e devolve a conexão ao pool
+        
+        if result.truncated:
+            print(f"✂️  Resultado truncado em {len(result)} linhas ({result.bytes / 1024 / 1024:.1f} MB)")
+        return result
+    
+    def iter_prepared(self, sql: str, limit: int, itersize: Optional[int] = None,
+                      token: Optional[CancelToken] = None,
+                      columns: Optional[List[pg_types.Column]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Executa query por um prepared statement compartilhado entre consultas de mesma estrutura
+        
+        Os literais das comparações viram parâmetros (sql_utils.parameterize):
+        "histórico do contribuinte X" para CPFs diferentes usa o mesmo PREPARE
+        em cada conexão, pulando análise e planejamento nas repetições.
+        
+        EXECUTE não pode ser lido por cursor no servidor (DECLARE não aceita
+        EXECUTE) e o libpq recebe o resultado inteiro. Por isso só consultas
+        que cabem em um lote (limit ou LIMIT da própria query até itersize
+        linhas) usam o statement; as demais, as sem literais e as recusadas
+        pelo PREPARE ou EXECUTE (tipos incompatíveis) seguem por iter_query
+        com o SQL original.
+        
+        Args:
+            sql: Query SQL sem parâmetros
+            limit: Máximo de linhas retornadas
+            itersize: Tamanho do lote (padrão: QUERY_ITERSIZE)
+            token: Cancela o comando no servidor quando acionado (opcional)
+            columns: Lista preenchida com os metadados das colunas (opcional)
+        
+        Yields:
+            Dicionário por linha
+        """
+        own_limit = top_level_limit(sql)
+        cap = int(limit) if own_limit is None else min(int(limit), own_limit)
+        if cap > (itersize or QUERY_ITERSIZE):
+            # Mais de um lote: o cursor no servidor mantém a memória constante
+            yield from self.iter_query(sql, None, itersize, token, columns)
+            return
+        
+        template, values = parameterize(sql)
+        statement = f"SELECT * FROM (\n{template}\n) AS capped LIMIT {cap}"
+        name = f"chatbot_{hashlib.md5(statement.encode('utf-8')).hexdigest()[:16]}"
+        if not values or name in self.unpreparable:
+            yield from self.iter_query(sql, None, itersize, token, columns)
+            return
+        
+        if not self.pool and not self.connect():
+            raise Exception("Erro ao executar query: sem conexão com o banco")
+        
+        rows = None
+        for attempt in range(READ_ATTEMPTS):
+            try:
+                with self._read_connection(sql) as pooled, self._running(pooled, sql, token, 'prepared') as record:
+                    with pooled.connection.cursor(cursor_factory=RealDictCursor) as cursor:
+                        if not self._prepare(pooled, cursor, name, statement):
+                            self.unpreparable.add(name)
+                            record['kind'] = 'prepare_failed'
+                        else:
+                            rows = self._execute_prepared(pooled, cursor, name, values)
+                            if rows is None:
+                                self.unpreparable.add(name)
+                                record['kind'] = 'execute_failed'
+                            else:
+                                _fill_columns(cursor, pooled, columns)
+                                for row in rows:
+                                    _count_row(record, row)
+                break
+            except _ReplicaFailed as e:
+                if attempt + 1 == READ_ATTEMPTS:
+                    raise _query_error(e, token)
+            except psycopg2.Error as e:
+                raise _query_error(e, token)
+        
+        if rows is not None:
+            yield from rows
+            return
+        
+        # PREPARE/EXECUTE recusado: executa o SQL original
+        yield from self.iter_query(sql, None, itersize, token, columns)
+    
+    def _execute_prepared(self, pooled: PooledConnection, cursor, name: str,
+                          values: List[Any]) -> Optional[List[Dict[str, Any]]]:
+        """
+        EXECUTE do prepared statement
+        
+        Returns:
+            Linhas lidas, ou None se o PostgreSQL recusou os valores (o
+            statement é desalocado e a consulta segue sem parâmetros)
+        """
+        placeholders = ', '.join(['%s'] * len(values))
+        try:
+            cursor.execute(f"EXECUTE {name} ({placeholders})", values)
+            return [dict(row) for row in cursor.fetchall()]
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            raise  # Cancelamento ou conexão perdida: não é problema do statement
+        except psycopg2.Error as e:
+            pooled.connection.rollback()
+            pooled.prepared.pop(name, None)
+            cursor.execute(f"DEALLOCATE {name}")
+            self.prepared_stats['unpreparable'] += 1
+            print(f"⚠️  Consulta executada sem prepared statement: {str(e).strip().splitlines()[0]}")
+            return None
+    
+    def _prepare(self, pooled: PooledConnection, cursor, name: str, statement: str) -> bool:
+        """
+        Garante o prepared statement na conexão (LRU de PREPARED_STATEMENTS_PER_CONNECTION)
+        
+        Returns:
+            False se o PostgreSQL recusou o PREPARE
+        """
+        if name in pooled.prepared:
+            pooled.prepared[name] += 1
+            pooled.prepared.move_to_end(name)
+            self.prepared_stats['reused'] += 1
+            return True
+        
+        try:
+            cursor.execute(f"PREPARE {name} AS {statement}")
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            raise  # Cancelamento ou conexão perdida: não é problema do statement
+        except psycopg2.Error as e:
+            pooled.connection.rollback()
+            self.prepared_stats['unpreparable'] += 1
+            print(f"⚠️  Consulta executada sem prepared statement: {str(e).strip().splitlines()[0]}")
+            return False
+        
+        # PREPARE/DEALLOCATE não são desfeitos pelo rollback ao devolver a conexão
+        pooled.prepared[name] = 1
+        self.prepared_stats['prepared'] += 1
+        while len(pooled.prepared) > max(PREPARED_STATEMENTS_PER_CONNECTION, 1):
+            oldest, _ = pooled.prepared.popitem(last=False)
+            cursor.execute(f"DEALLOCATE {oldest}")
+            self.prepared_stats['deallocated'] += 1
+        return True
+    
+    def get_prepared_stats(self) -> Dict[str, Any]:
+        """Prepared statements criados e execuções que reaproveitaram um PREPARE"""
+        stats = dict(self.prepared_stats)
+        executions = stats['prepared'] + stats['reused']
+        stats['reuse_rate'] = stats['reused'] / executions if executions else 0.0
+        return stats
+    
+    def explain(self, sql: str, params: Optional[tuple] = None) -> Dict[str, Any]:
+        """
+        Plano estimado da query, sem executá-la
+        
+        O tempo de planejamento (SUMMARY) vai para a medição da próxima
+        execução do mesmo SQL.
+        
+        Returns:
+            Nó raiz de EXPLAIN (FORMAT JSON), com 'Total Cost' e 'Plan Rows'
+        """
+        rows = self.execute_query(f"EXPLAIN (FORMAT JSON, SUMMARY)\n{sql}", params)
+        plan = rows[0]['QUERY PLAN']
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        if params is None and 'Planning Time' in plan[0]:
+            self.metrics.note_planning(sql, plan[0]['Planning Time'])
+        return plan[0]['Plan']
+    
+    def check_query(self, sql: str) -> GovernorDecision:
+        """
+        Avalia a query pelo custo estimado antes de executá-la
+        
+        Args:
+            sql: Query SQL (gerada pelo LLM)
+        
+        Returns:
+            GovernorDecision: action 'allow', 'confirm' ou 'reject'; sql é a
+            versão a executar (com LIMIT se limited=True)
+        """
+        decision = self.governor.evaluate(sql, self.explain)
+        if decision.cost is not None:
+            print(
+                f"🧭 EXPLAIN: custo {decision.cost:,.0f}, ~{decision.rows:,.0f} linhas → {decision.action}"
+                f"{' (limitada)' if decision.limited else ''}"
+            )
+        return decision
     
-    def execute_to_dataframe(self, sql: str, params: Optional[tuple] = None) -> pd.DataFrame:
+    def execute_to_dataframe(self, sql: str, params: Optional[tuple] = None,
+                             max_rows: Optional[int] = None,
+                             token: Optional[CancelToken] = None) -> pd.DataFrame:
         """
         Executa query e retorna como DataFrame pandas
         
+        Com pyarrow, os dados vêm por COPY direto para colunas tipadas (ver
+        copy_to_arrow); se o COPY falhar, usa a leitura linha a linha.
+        
         Args:
             sql: Query SQL
             params: Parâmetros da query (opcional)
+            max_rows: Limite de linhas (padrão: QUERY_MAX_ROWS, 0 sem limite)
+            token: Cancela o comando no servidor quando acionado (opcional)
+        
+        Returns:
+            DataFrame pandas com os resultados (attrs['truncated'] indica se o limite foi atingido)
+        """
+        if pa is not None:
+            try:
+                table = self.copy_to_arrow(sql, params, max_rows, token)
+                df = table.to_pandas(date_as_object=False)
+                df.attrs['truncated'] = (table.schema.metadata or {}).get(b'truncated') == b'true'
+                return df
+            except QueryCancelled:
+                raise
+            except Exception as e:
+                print(f"⚠️  COPY indisponível para esta query, usando leitura por linhas: {e}")
+        
+        result = self.fetch_capped(sql, params, max_rows=max_rows, token=token)
+        df = to_dataframe(result)
+        df.attrs['truncated'] = result.truncated
+        return df
+    
+    def copy_to_arrow(self, sql: str, params: Optional[tuple] = None,
+                      max_rows: Optional[int] = None,
+                      token: Optional[CancelToken] = None) -> 'pa.Table':
+        """
+        Executa query via COPY (...) TO STDOUT e carrega o CSV direto em uma tabela Arrow
+        
+        Nenhum objeto Python é criado por célula: o CSV do servidor é lido pelo
+        parser do Arrow com os tipos de cada coluna (inteiros, NUMERIC como
+        float64, datas, timestamps, booleanos e texto) obtidos dos OIDs.
+        O limite de linhas vai no próprio COPY (LIMIT max_rows + 1): a linha
+        extra só indica que o resultado foi truncado.
+        
+        Args:
+            sql: Query SQL (SELECT/WITH)
+            params: Parâmetros da query (opcional)
+            max_rows: Limite de linhas (padrão: QUERY_MAX_ROWS, 0 sem limite)
+            token: Cancela o comando no servidor quando acionado (opcional)
         
         Returns:
-            DataFrame pandas com os resultados
+            Tabela pyarrow com os resultados; truncada no limite, com
+            schema.metadata[b'truncated'] = b'true'
+        
+        Raises:
+            QueryCancelled: se o token for cancelado
         """
-        results = self.execute_query(sql, params)
-        return pd.DataFrame(results)
+        if pa is None:
+            raise RuntimeError("pyarrow é necessário para carregar resultados via COPY")
+        if not self.pool and not self.connect():
+            raise Exception("Erro ao executar query: sem conexão com o banco")
+        
+        query = sql.strip()
+        while query.endswith(';'):
+            query = query[:-1].rstrip()
+        
+        max_rows = QUERY_MAX_ROWS if max_rows is None else max_rows
+        
+        for attempt in range(READ_ATTEMPTS):
+            buffer = io.BytesIO()
+            try:
+                with self._read_connection(sql) as pooled, self._running(pooled, sql, token, 'copy') as record:
+                    with pooled.connection.cursor() as cursor:
+                        statement = cursor.mogrify(query, params).decode() if params else query
+                        columns = self._describe(cursor, statement)
+                        # Quebras de linha isolam comentários de linha no fim da query
+                        if max_rows:
+                            statement = f"SELECT * FROM (\n{statement}\n) AS capped LIMIT {max_rows + 1}"
+                        cursor.copy_expert(f"COPY (\n{statement}\n) TO STDOUT WITH (FORMAT csv)", buffer)
+                    record['bytes'] = buffer.tell()
+                    table = self._read_copy_csv(buffer, columns)
+                    record['rows'] = table.num_rows
+                break
+            except _ReplicaFailed as e:
+                if attempt + 1 == READ_ATTEMPTS:
+                    raise _query_error(e, token)
+            except psycopg2.errors.QueryCanceled as e:
+                raise _query_error(e, token)
+        
+        if max_rows and table.num_rows > max_rows:
+            table = table.slice(0, max_rows).replace_schema_metadata({b'truncated': b'true'})
+            print(f"✂️  Resultado truncado em {max_rows} linhas")
+        return table
+    
+    @staticmethod
+    def _read_copy_csv(buffer: io.BytesIO, columns: List[Tuple[str, int]]) -> 'pa.Table':
+        """Tabela Arrow a partir do CSV gerado pelo COPY, com os tipos das colunas"""
+        names = [name for name, _ in columns]
+        types = [pg_types.arrow_type(type_oid) for _, type_oid in columns]
+        if buffer.tell() == 0:
+            return pa.Table.from_arrays([pa.array([], type=t) for t in types], names=names)
+        
+        buffer.seek(0)
+        return pa_csv.read_csv(
+            buffer,
+            read_options=pa_csv.ReadOptions(column_names=names),
+            parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+            convert_options=pa_csv.ConvertOptions(
+                column_types=dict(zip(names, types)),
+                # No CSV do COPY, NULL é vazio sem aspas e '' é "" com aspas
+                null_values=[''],
+                strings_can_be_null=True,
+                quoted_strings_can_be_null=False,
+                true_values=['t'],
+                false_values=['f']
+            )
+        )
+    
+    @staticmethod
+    def _describe(cursor, query: str) -> List[Tuple[str, int]]:
+        """Nomes e OIDs das colunas da query, sem ler linhas"""
+        cursor.execute(f"SELECT * FROM (\n{query}\n) AS q LIMIT 0")
+        return [(column.name, column.type_code) for column in cursor.description]
     
     def get_schema_context(self, tables: Optional[List[str]] = None) -> str:
         """
         Retorna contexto do schema para o LLM
         
+        O contexto é gerado a partir do pg_catalog (uma única query) e guardado
+        em disco sob a impressão digital do DDL; só é gerado de novo quando o
+        schema muda. A impressão digital é conferida a cada SCHEMA_REFRESH_SECONDS.
+        
         Args:
-            tables: Lista de tabelas específicas (se None, retorna tabelas principais)
+            tables: Lista de tabelas específicas (se None, tabelas principais e resumos)
         
         Returns:
             String formatada com schema do banco
         """
-        if self.schema_cache and not tables:
-            return self.schema_cache
-        
-        # Tabelas principais do iTributos
-        main_tables = tables or [
-            'unico_people',
-            'payments',
-            'payment_parcels',
-            'payment_status',
-            'active_debts',
-            'active_debt_status',
-            'agreements',
-            'agreement_operations',
-            'other_debts_agreement_operations',
-            'taxable_debts',
-            'revenues',
-            'payment_entries',
-            'graphic_files',
-            'graphic_files_payment_parcels'
-        ]
-        
-        schema_parts = []
-        
-        for table in main_tables:
-            try:
-                columns_query = """
-                    SELECT 
-                        column_name,
-                        data_type,
-                        is_nullable,
-                        column_default
-                    FROM information_schema.columns
-                    WHERE table_name = %s
-                    ORDER BY ordinal_position
-                """
-                columns = self.execute_query(columns_query, (table,))
-                
-                if columns:
-                    schema_parts.append(f"\nTabela: {table}")
-                    schema_parts.append("Colunas:")
-                    for col in columns:
-                        nullable = "NULL" if col['is_nullable'] == 'YES' else "NOT NULL"
-                        schema_parts.append(
-                            f"  - {col['column_name']}: {col['data_type']} {nullable}"
-                        )
-            except Exception as e:
-                print(f"Erro ao obter schema de {table}: {e}")
-        
-        # Adiciona informações importantes sobre relacionamentos
-        schema_parts.append("\n=== RELACIONAMENTOS (CRÍTICO) ===")
-        schema_parts.append("agreements:")
-        schema_parts.append("  - agreements.agreement_operation_id → agreement_operations.id")
-        schema_parts.append("  - agreements.id ← payments.payable_id (quando payable_type='Agreement')")
-        schema_parts.append("")
-        schema_parts.append("agreement_operations:")
-        schema_parts.append("  - agreement_operations.id ← agreements.agreement_operation_id")
-        schema_parts.append("  - agreement_operations.person_id → unico_people.id")
-        schema_parts.append("")
-        schema_parts.append("payments:")
-        schema_parts.append("  - payments.person_id → unico_people.id")
-        schema_parts.append("  - payments.id ← payment_parcels.payment_id")
-        schema_parts.append("  - payments.payable_id → agreements.id (quando payable_type='Agreement')")
-        schema_parts.append("")
-        schema_parts.append("payment_parcels:")
-        schema_parts.append("  - payment_parcels.payment_id → payments.id")
-        schema_parts.append("  - payment_parcels.status → payment_status.id")
-        
-        schema_parts.append("\n=== VALORES DE STATUS ===")
-        schema_parts.append("payment_parcels.status:")
-        schema_parts.append("  - 0 = Cancelado")
-        schema_parts.append("  - 1 = Aberto (em aberto, não pago)")
-        schema_parts.append("  - 5 = Pago")
-        schema_parts.append("")
-        schema_parts.append("active_debts.status:")
-        schema_parts.append("  - É um INTEGER que referencia active_debt_status.id")
-        schema_parts.append("  - NÃO existe coluna 'active_debt_status' na tabela active_debts")
-        schema_parts.append("  - Use: ad.status para filtrar, NÃO ad.active_debt_status")
-        
-        schema_parts.append("\n=== CAMPOS IMPORTANTES ===")
-        schema_parts.append("unico_people:")
-        schema_parts.append("  - cpf_cnpj: CPF/CNPJ do contribuinte")
-        schema_parts.append("  - name: Nome do contribuinte")
-        schema_parts.append("")
-        schema_parts.append("payments:")
-        schema_parts.append("  - payable_type: 'Agreement' (parcelamento) ou outros")
-        schema_parts.append("  - payable_id: ID do acordo quando type='Agreement'")
-        schema_parts.append("  - person_id: ID do contribuinte")
-        schema_parts.append("")
-        schema_parts.append("agreements:")
-        schema_parts.append("  - protocol_number: Número do protocolo do parcelamento")
-        schema_parts.append("  - agreement_operation_id: FK para agreement_operations")
-        schema_parts.append("")
-        schema_parts.append("payment_entries:")
-        schema_parts.append("  - barcode: Código de barras do boleto")
-        
-        context = "\n".join(schema_parts)
-        
-        # Cache apenas se for schema completo
-        if not tables:
-            self.schema_cache = context
-        
-        return context
+        tables = list(tables or MAIN_TABLES + SUMMARY_TABLES)
+        return self._schema_artifact('context', tables, render_schema_context)
+    
+    def get_schema_graph(self, tables: Optional[List[str]] = None) -> SchemaGraph:
+        """
+        Colunas e relacionamentos das tabelas, guardados como o contexto (por impressão digital do DDL)
+        
+        Args:
+            tables: Lista de tabelas (se None, tabelas principais e resumos)
+        """
+        tables = list(tables or MAIN_TABLES + SUMMARY_TABLES)
+        return self._schema_artifact('graph', tables, build_schema_graph)
+    
+    def get_question_schema_context(self, question: str) -> str:
+        """
+        Contexto do schema só com as tabelas relevantes para a pergunta
+        
+        As tabelas vêm de schema_pruning.select_tables (termos da pergunta e
+        caminhos no grafo de relacionamentos); cada subconjunto tem seu texto
+        guardado como o contexto completo. Sem tabela reconhecida, ou com
+        SCHEMA_PRUNING_ENABLED=false, devolve o contexto completo.
+        
+        Args:
+            question: Pergunta do usuário
+        
+        Returns:
+            String formatada com schema do banco
+        """
+        if not SCHEMA_PRUNING_ENABLED:
+            return self.get_schema_context()
+        tables = select_tables(question, self.get_schema_graph())
+        return self.get_schema_context(tables)
+    
+    def _schema_artifact(self, kind: str, tables: List[str],
+                         build: Callable[[List[Dict[str, Any]], List[str]], Any]) -> Any:
+        """
+        Contexto ou grafo do schema, gerado do catálogo só quando o DDL muda
+        
+        A impressão digital é conferida a cada SCHEMA_REFRESH_SECONDS; se o
+        catálogo estiver inacessível, usa o último resultado conhecido.
+        """
+        key = (kind, *tables)
+        cached = self.schema_cache.get(key)
+        if cached and time.monotonic() - cached[1] < SCHEMA_REFRESH_SECONDS:
+            return cached[0]
+        
+        database = f"{self.config['host']}:{self.config['port']}/{self.config['database']}"
+        try:
+            fingerprint = schema_fingerprint(self.execute_query, tables)
+            value = self.schema_store.get(database, tables, fingerprint, kind)
+            if value is None:
+                value = build(load_catalog(self.execute_query, tables), tables)
+                self.schema_store.set(database, tables, fingerprint, value, kind)
+                if kind == 'context':
+                    print(f"🗂️  Contexto do schema gerado (DDL {fingerprint[:12]}...)")
+        except Exception as e:
+            # Catálogo inacessível: usa o último resultado conhecido
+            value = cached[0] if cached else self.schema_store.get_latest(database, tables, kind)
+            if value is None:
+                raise
+            print(f"⚠️  Schema não verificado, usando {kind} salvo: {e}")
+        
+        self.schema_cache[key] = (value, time.monotonic())
+        return value
     
     def get_contributor_by_cpf_cnpj(self, cpf_cnpj: str) -> Optional[Dict[str, Any]]:
         """
-        Busca contribuinte por CPF/CNPJ
+        Busca contribuinte por CPF/CNPJ, com ou sem pontuação
         
         Args:
             cpf_cnpj: CPF ou CNPJ do contribuinte
@@ -200,14 +719,208 @@ class DatabaseService:
         Returns:
             Dados do contribuinte ou None
         """
-        sql = """
-            SELECT id, cpf_cnpj, name, email, phone
+        document = normalize_document(cpf_cnpj)
+        return self.get_contributors_by_cpf_cnpj([document]).get(document)
+    
+    def get_contributors_by_cpf_cnpj(self, documents: List[str],
+                                     use_cache: bool = True) -> Dict[str, Dict[str, Any]]:
+        """
+        Busca vários contribuintes por CPF/CNPJ em uma única consulta
+        
+        Os documentos são comparados só pelos dígitos (índice funcional de
+        contributors.py --install-index), em um único ANY(array). Os
+        encontrados ficam no cache em memória por CONTRIBUTOR_CACHE_TTL.
+        
+        Args:
+            documents: CPFs/CNPJs, com ou sem pontuação
+            use_cache: Consulta e alimenta o cache de contribuintes
+        
+        Returns:
+            Dict documento normalizado -> dados do contribuinte (ausentes não aparecem)
+        """
+        keys = list(dict.fromkeys(filter(None, map(normalize_document, documents))))
+        cache = self.contributor_cache if use_cache else None
+        
+        found = {}
+        missing = []
+        for key in keys:
+            hit, contributor = cache.get(key) if cache is not None else (False, None)
+            if hit:
+                found[key] = dict(contributor)  # cópia: a entrada em cache é compartilhada entre sessões
+            else:
+                missing.append(key)
+        if not missing:
+            return found
+        
+        # Homônimos de documento (cadastros duplicados): o de menor id
+        sql = f"""
+            SELECT DISTINCT ON (document) {DOCUMENT_KEY_SQL} AS document,
+                   id, cpf_cnpj, name, email, phone
             FROM unico_people
-            WHERE cpf_cnpj = %s
-            LIMIT 1
+            WHERE {DOCUMENT_KEY_SQL} = ANY(%s::text[])
+            ORDER BY document, id
+        """
+        expire_at = time.time() + CONTRIBUTOR_CACHE_TTL
+        for row in self.execute_query(sql, (missing,)):
+            key = row.pop('document')
+            found[key] = row
+            if cache is not None:
+                cache.set(key, dict(row), _row_bytes(row), expire_at)
+        return found
+    
+    def get_contributor_cache_stats(self) -> Dict[str, Any]:
+        """Entradas e memória do cache de contribuintes (vazio se desativado)"""
+        cache = self.contributor_cache
+        if cache is None:
+            return {}
+        return {'entries': len(cache), 'bytes': cache.bytes_used, 'evictions': cache.evictions}
+    
+    @contextmanager
+    def _read_connection(self, sql: Optional[str] = None) -> Iterator[PooledConnection]:
+        """
+        Empresta uma conexão para leitura
+        
+        Vem de uma réplica escolhida pelo ReplicaRouter; do primário se não
+        houver réplicas configuradas, se todas estiverem fora ou se sql lê uma
+        tabela alterada dentro do atraso da réplica (ela ainda pode ter as
+        linhas anteriores, que iriam para o cache com a versão nova).
+        
+        Uma réplica com erro de conexão sai do rodízio até a próxima
+        verificação. Se o erro ocorre ao obter a conexão, a próxima réplica
+        (ou o primário) é usada; se ocorre durante a consulta, é levantado
+        como _ReplicaFailed, para quem chamou refazê-la se ainda não entregou
+        linhas.
+        
+        Args:
+            sql: Query a executar (para conferir as tabelas recém-alteradas)
         """
-        results = self.execute_query(sql, (cpf_cnpj,))
-        return results[0] if results else None
+        replica = self._choose_replica(sql)
+        with ExitStack() as stack:
+            try:
+                pooled = stack.enter_context(self._pool_for(replica).connection())
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                if replica is None:
+                    raise
+                self.replicas.mark_failed(replica, e)
+                replica = self._choose_replica(sql)
+                pooled = stack.enter_context(self._pool_for(replica).connection())
+            try:
+                yield pooled
+            except (psycopg2.errors.QueryCanceled, _ReplicaFailed):
+                raise
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                if replica is None:
+                    raise
+                self.replicas.mark_failed(replica, e)
+                raise _ReplicaFailed(str(e).strip()) from e
+    
+    def _choose_replica(self, sql: Optional[str]):
+        """Réplica para a leitura, ou None para ler do primário"""
+        replica = self.replicas.choose() if self.replicas else None
+        if replica is not None and sql and self._recently_changed(sql, replica):
+            return None
+        return replica
+    
+    def _pool_for(self, replica) -> ConnectionPool:
+        return replica.pool if replica is not None else self.pool
+    
+    def _recently_changed(self, sql: str, replica) -> bool:
+        """Se sql lê uma tabela alterada há menos tempo que o atraso tolerado da réplica"""
+        window = max(self.replicas.max_lag_seconds, replica.lag_seconds or 0)
+        changed = self.table_versions.changed_within(extract_tables(sql), window)
+        if changed:
+            print(f"🎯 Leitura no primário: {', '.join(changed)} alterada(s) há menos de {window:.0f}s")
+        return bool(changed)
+    
+    @contextmanager
+    def _running(self, pooled: PooledConnection, sql: str, token: Optional[CancelToken],
+                 kind: str = 'query') -> Iterator[Dict[str, Any]]:
+        """
+        Registra a consulta em andamento pelo PID do backend, liga o token ao
+        cancelamento e mede a execução (QueryMetrics)
+        
+        Args:
+            kind: Caminho de execução registrado na medição
+        
+        Yields:
+            Registro da medição, em que o chamador conta linhas e bytes
+        """
+        if token is not None:
+            token.check()
+        key = (pooled.pool.name if pooled.pool else '', pooled.connection.get_backend_pid())
+        with self.active_lock:
+            self.active_queries[key] = {'sql': sql, 'started_at': time.time()}
+        unregister = token.register(lambda: self._cancel_running(pooled, key[1])) if token else None
+        record = self.metrics.start(sql, kind, *key)
+        status = 'ok'
+        try:
+            yield record
+        except GeneratorExit:  # Leitura encerrada pelo consumidor (limite de linhas)
+            raise
+        except (QueryCancelled, psycopg2.errors.QueryCanceled):
+            status = 'cancelled'
+            raise
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            if unregister:
+                unregister()
+            with self.active_lock:
+                self.active_queries.pop(key, None)
+            self.metrics.finish(record, status)
+    
+    def _cancel_running(self, pooled: PooledConnection, pid: int) -> None:
+        """Interrompe o comando da conexão (cancel request do protocolo; pg_cancel_backend se falhar)"""
+        try:
+            pooled.connection.cancel()
+        except psycopg2.Error:
+            self.cancel_backend(pid, pooled.pool)
+        print(f"⛔ Consulta cancelada (PID {pid})")
+    
+    def cancel_backend(self, pid: int, pool: Optional[ConnectionPool] = None) -> bool:
+        """
+        Cancela o comando em execução em um backend do PostgreSQL
+        
+        Args:
+            pid: PID do backend (ver get_active_queries)
+            pool: Pool do servidor onde o backend roda (padrão: primário)
+        
+        Returns:
+            True se o sinal de cancelamento foi enviado
+        """
+        try:
+            with (pool or self.pool).connection() as pooled:
+                with pooled.connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_cancel_backend(%s)", (pid,))
+                    return bool(cursor.fetchone()[0])
+        except Exception as e:
+            print(f"⚠️  Erro ao cancelar backend {pid}: {e}")
+            return False
+    
+    def get_active_queries(self) -> List[Dict[str, Any]]:
+        """Consultas em execução por este processo (servidor, PID do backend, SQL, início)"""
+        with self.active_lock:
+            return [
+                {'server': server, 'pid': pid, **info}
+                for (server, pid), info in self.active_queries.items()
+            ]
+    
+    def get_replica_stats(self) -> List[Dict[str, Any]]:
+        """Estado das réplicas de leitura (vazio se não configuradas)"""
+        return self.replicas.get_stats() if self.replicas else []
+    
+    def get_query_metrics(self) -> Dict[str, Any]:
+        """Percentis das execuções recentes no banco (ver QueryMetrics.summary)"""
+        return self.metrics.summary()
+    
+    def dump_query_metrics(self, path: Optional[str] = None) -> int:
+        """Grava as medições em memória em JSON lines (padrão: QUERY_METRICS_PATH)"""
+        return self.metrics.dump(path)
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Retorna estatísticas do pool de conexões (vazio se não conectado)"""
+        return self.pool.get_stats() if self.pool else {}
     
     def test_connection(self) -> Dict[str, Any]:
         """
@@ -0,0 +1,347 @@
+"""
+DB Pool - Pool de conexões PostgreSQL seguro para threads
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+import psycopg2
+from psycopg2 import extensions
+from config import (
+    DB_CONFIG,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_CHECKOUT_TIMEOUT,
+    DB_POOL_MAX_IDLE_SECONDS,
+    DB_POOL_MAX_LIFETIME_SECONDS,
+    DB_POOL_HEALTH_CHECK_AFTER,
+    DB_STATEMENT_TIMEOUT_SECONDS,
+    DB_READ_ONLY,
+    DB_NUMERIC_MODE,
+)
+from pg_types import register_numeric_casters
+
+
+# Quantidade de tempos de espera recentes usados para média e p95
+WAIT_SAMPLES = 1000
+
+
+class PoolTimeout(Exception):
+    """Nenhuma conexão ficou livre dentro do tempo de espera"""
+
+
+class PooledConnection:
+    """Conexão do pool com os metadados usados para reciclagem e verificação"""
+
+    def __init__(self, connection, pool: Optional['ConnectionPool'] = None):
+        self.connection = connection
+        self.pool = pool
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.uses = 0
+        # Prepared statements criados nesta sessão (nome -> execuções), do menos ao mais recente
+        self.prepared: 'OrderedDict[str, int]' = OrderedDict()
+
+    @property
+    def idle_seconds(self) -> float:
+        return time.time() - self.last_used
+
+    @property
+    def age_seconds(self) -> float:
+        return time.time() - self.created_at
+
+    def close(self) -> None:
+        try:
+            if not self.connection.closed:
+                self.connection.close()
+        except psycopg2.Error:
+            pass
+
+
+class ConnectionPool:
+    """
+    Pool de conexões com tamanho mínimo/máximo, verificação na retirada e
+    reciclagem de conexões ociosas ou antigas
+
+    Conexões são emprestadas com connection() (ou acquire/release) e devolvidas
+    ao pool ao final; quando todas estão em uso, a retirada aguarda na fila até
+    checkout_timeout.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, min_size: Optional[int] = None,
+                 max_size: Optional[int] = None, checkout_timeout: Optional[float] = None,
+                 max_idle_seconds: Optional[float] = None, max_lifetime_seconds: Optional[float] = None,
+                 health_check_after: Optional[float] = None,
+                 statement_timeout: Optional[int] = None, read_only: Optional[bool] = None,
+                 numeric_mode: Optional[str] = None, name: str = 'primário'):
+        """
+        Args:
+            config: Parâmetros de conexão (padrão: DB_CONFIG)
+            min_size: Conexões mantidas abertas (padrão: DB_POOL_MIN_SIZE)
+            max_size: Limite de conexões abertas (padrão: DB_POOL_MAX_SIZE)
+            checkout_timeout: Espera máxima por uma conexão livre em segundos (padrão: DB_POOL_CHECKOUT_TIMEOUT)
+            max_idle_seconds: Conexões ociosas acima de min_size são fechadas após esse tempo
+                (padrão: DB_POOL_MAX_IDLE_SECONDS)
+            max_lifetime_seconds: Conexões são recriadas após esse tempo (padrão: DB_POOL_MAX_LIFETIME_SECONDS)
+            health_check_after: Conexões ociosas há mais que isso são testadas com SELECT 1
+                na retirada (padrão: DB_POOL_HEALTH_CHECK_AFTER, 0 testa sempre)
+            statement_timeout: statement_timeout de cada conexão em segundos
+                (padrão: DB_STATEMENT_TIMEOUT_SECONDS, 0 desativa)
+            read_only: Abre as sessões com default_transaction_read_only (padrão: DB_READ_ONLY)
+            numeric_mode: Leitura de NUMERIC: 'float', 'cents' ou 'decimal' (padrão: DB_NUMERIC_MODE)
+            name: Identificação do servidor nas estatísticas e logs
+        """
+        self.config = config or DB_CONFIG
+        self.min_size = DB_POOL_MIN_SIZE if min_size is None else min_size
+        self.max_size = max(max_size or DB_POOL_MAX_SIZE, self.min_size, 1)
+        self.checkout_timeout = DB_POOL_CHECKOUT_TIMEOUT if checkout_timeout is None else checkout_timeout
+        self.max_idle_seconds = DB_POOL_MAX_IDLE_SECONDS if max_idle_seconds is None else max_idle_seconds
+        self.max_lifetime_seconds = (
+            DB_POOL_MAX_LIFETIME_SECONDS if max_lifetime_seconds is None else max_lifetime_seconds
+        )
+        self.health_check_after = DB_POOL_HEALTH_CHECK_AFTER if health_check_after is None else health_check_after
+        self.statement_timeout = DB_STATEMENT_TIMEOUT_SECONDS if statement_timeout is None else statement_timeout
+        self.read_only = DB_READ_ONLY if read_only is None else read_only
+        self.numeric_mode = numeric_mode or DB_NUMERIC_MODE
+        self.name = name
+
+        self.idle = deque()  # Conexões livres; as usadas mais recentemente ficam à direita
+        self.in_use = set()
+        self.opening = 0  # Conexões sendo abertas fora do lock
+        self.closed = False
+        self.condition = threading.Condition()
+
+        # Métricas
+        self.created = 0
+        self.recycled = 0
+        self.health_check_failures = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.wait_times = deque(maxlen=WAIT_SAMPLES)
+
+        for _ in range(self.min_size):
+            self.idle.append(self._open())
+
+    @property
+    def size(self) -> int:
+        """Conexões abertas (livres + em uso + sendo abertas)"""
+        return len(self.idle) + len(self.in_use) + self.opening
+
+    def _open(self) -> PooledConnection:
+        """Abre uma nova conexão com o banco"""
+        settings = []
+        if self.statement_timeout:
+            # Vale para toda a sessão, inclusive queries que ignorem o governor
+            settings.append(f"-c statement_timeout={self.statement_timeout * 1000}")
+        if self.read_only:
+            # Toda transação da sessão é somente leitura (INSERT/UPDATE/DDL falham)
+            settings.append("-c default_transaction_read_only=on")
+        options = {'options': ' '.join(settings)} if settings else {}
+        connection = psycopg2.connect(**self.config, **options)
+        register_numeric_casters(connection, self.numeric_mode)
+        connection = PooledConnection(connection, self)
+        with self.condition:
+            self.created += 1
+        return connection
+
+    def _is_healthy(self, pooled: PooledConnection) -> bool:
+        """Verifica a conexão antes de entregá-la"""
+        connection = pooled.connection
+        if connection.closed:
+            return False
+        if self.max_lifetime_seconds and pooled.age_seconds > self.max_lifetime_seconds:
+            return False
+        if pooled.idle_seconds >= self.health_check_after:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                connection.rollback()
+            except psycopg2.Error:
+                return False
+        return True
+
+    def _reap_idle(self) -> list:
+        """Retira do pool as conexões ociosas excedentes (chamado com o lock)"""
+        expired = []
+        if not self.max_idle_seconds:
+            return expired
+        # As conexões ociosas há mais tempo ficam à esquerda
+        while (self.idle and self.size > self.min_size
+               and self.idle[0].idle_seconds > self.max_idle_seconds):
+            expired.append(self.idle.popleft())
+        self.recycled += len(expired)
+        return expired
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledConnection:
+        """
+        Retira uma conexão do pool
+
+        Args:
+            timeout: Espera máxima em segundos (padrão: checkout_timeout)
+
+        Returns:
+            Conexão verificada, a ser devolvida com release()
+
+        Raises:
+            PoolTimeout: se nenhuma conexão ficar livre a tempo
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        wait_start = None
+
+        while True:
+            candidate = None
+            open_new = False
+            with self.condition:
+                if self.closed:
+                    raise RuntimeError("Pool de conexões encerrado")
+                expired = self._reap_idle()
+                if self.idle:
+                    candidate = self.idle.pop()
+                    self.in_use.add(candidate)
+                elif self.size < self.max_size:
+                    self.opening += 1
+                    open_new = True
+                else:
+                    if wait_start is None:
+                        wait_start = time.monotonic()
+                        self.waits += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(
+                            f"Nenhuma conexão livre em {timeout:g}s "
+                            f"({len(self.in_use)}/{self.max_size} em uso)"
+                        )
+                    self.waiting += 1
+                    self.max_waiting = max(self.max_waiting, self.waiting)
+                    self.condition.wait(remaining)
+                    self.waiting -= 1
+
+            for pooled in expired:
+                pooled.close()
+
+            if open_new:
+                try:
+                    candidate = self._open()
+                except Exception:
+                    with self.condition:
+                        self.opening -= 1
+                        self.condition.notify()
+                    raise
+                with self.condition:
+                    self.opening -= 1
+                    self.in_use.add(candidate)
+            elif candidate is not None and not self._is_healthy(candidate):
+                # Conexão quebrada ou antiga: descarta e tenta de novo
+                self.health_check_failures += 1
+                self._discard(candidate)
+                continue
+
+            if candidate is None:
+                continue
+
+            with self.condition:
+                self.checkouts += 1
+                if wait_start is not None:
+                    self.wait_times.append(time.monotonic() - wait_start)
+            candidate.uses += 1
+            return candidate
+
+    def release(self, pooled: PooledConnection, discard: bool = False) -> None:
+        """
+        Devolve uma conexão ao pool
+
+        Transações abertas são desfeitas; conexões quebradas (ou com
+        discard=True) são fechadas.
+
+        Args:
+            pooled: Conexão retirada com acquire()
+            discard: Fecha a conexão em vez de devolvê-la
+        """
+        connection = pooled.connection
+        if not discard and not connection.closed:
+            try:
+                if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        if discard or connection.closed:
+            self._discard(pooled)
+            return
+
+        pooled.last_used = time.time()
+        with self.condition:
+            self.in_use.discard(pooled)
+            if self.closed:
+                pooled.close()
+            else:
+                self.idle.append(pooled)
+            self.condition.notify()
+
+    def _discard(self, pooled: PooledConnection) -> None:
+        """Fecha a conexão e libera sua vaga no pool"""
+        pooled.close()
+        with self.condition:
+            self.in_use.discard(pooled)
+            self.recycled += 1
+            self.condition.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator[PooledConnection]:
+        """
+        Empresta uma conexão durante o bloco with
+
+        Erros de conexão (OperationalError/InterfaceError) descartam a
+        conexão em vez de devolvê-la ao pool. Comandos cancelados
+        (statement_timeout, cancel()) não: a conexão continua válida.
+        """
+        pooled = self.acquire(timeout)
+        discard = False
+        try:
+            yield pooled
+        except psycopg2.errors.QueryCanceled:
+            raise
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.release(pooled, discard=discard)
+
+    def close(self) -> None:
+        """Fecha as conexões livres; as em uso são fechadas ao serem devolvidas"""
+        with self.condition:
+            self.closed = True
+            idle = list(self.idle)
+            self.idle.clear()
+            self.condition.notify_all()
+        for pooled in idle:
+            pooled.close()
+
+    def get_stats(self) -> dict:
+        """Retorna estatísticas do pool"""
+        with self.condition:
+            waits = sorted(self.wait_times)
+            return {
+                'name': self.name,
+                'size': self.size,
+                'idle': len(self.idle),
+                'in_use': len(self.in_use),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'waiting': self.waiting,
+                'max_waiting': self.max_waiting,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'wait_mean_ms': (sum(waits) / len(waits) * 1000) if waits else 0.0,
+                'wait_p95_ms': waits[int(0.95 * (len(waits) - 1))] * 1000 if waits else 0.0,
+                'created': self.created,
+                'recycled': self.recycled,
+                'health_check_failures': self.health_check_failures
+            }
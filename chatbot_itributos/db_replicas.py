@@ -0,0 +1,172 @@
+"""
+DB Replicas - Distribuição das consultas de leitura entre réplicas do PostgreSQL
+
+Uma thread verifica periodicamente cada réplica (conexão e atraso de
+replicação); choose() escolhe, entre as saudáveis, a que tem menos conexões
+em uso. Sem réplica disponível, o chamador usa o primário.
+"""
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import psycopg2
+from psycopg2 import extensions
+from config import (
+    DB_REPLICA_MAX_LAG_SECONDS,
+    DB_REPLICA_CHECK_INTERVAL,
+    DB_REPLICA_CONNECT_TIMEOUT,
+)
+from db_pool import ConnectionPool, PoolTimeout
+
+
+# Atraso de replicação em segundos (0 se a réplica já aplicou tudo o que recebeu,
+# para não acusar atraso quando o primário está sem escrita)
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END AS lag_seconds
+"""
+
+
+def _display_name(dsn: str) -> str:
+    """host:porta do DSN (sem usuário e senha)"""
+    try:
+        params = extensions.parse_dsn(dsn)
+    except psycopg2.ProgrammingError:
+        return 'réplica'
+    return f"{params.get('host', 'localhost')}:{params.get('port', '5432')}"
+
+
+class Replica:
+    """Réplica de leitura com seu pool e o resultado da última verificação"""
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self.name = _display_name(dsn)
+        self.pool: Optional[ConnectionPool] = None
+        self.healthy = False
+        self.lag_seconds: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.routed = 0
+
+
+class ReplicaRouter:
+    """Escolhe a réplica de leitura para cada consulta, considerando saúde, carga e atraso"""
+
+    def __init__(self, dsns: List[str], max_lag_seconds: Optional[float] = None,
+                 check_interval: Optional[float] = None):
+        """
+        Args:
+            dsns: DSNs das réplicas
+            max_lag_seconds: Atraso tolerado (padrão: DB_REPLICA_MAX_LAG_SECONDS, 0 ignora o atraso)
+            check_interval: Intervalo entre verificações em segundos (padrão: DB_REPLICA_CHECK_INTERVAL)
+        """
+        self.replicas = [Replica(dsn) for dsn in dsns]
+        self.max_lag_seconds = DB_REPLICA_MAX_LAG_SECONDS if max_lag_seconds is None else max_lag_seconds
+        self.check_interval = DB_REPLICA_CHECK_INTERVAL if check_interval is None else check_interval
+        self.lock = threading.Lock()
+        self.turn = 0
+        self.primary_fallbacks = 0
+        self.stop_event = threading.Event()
+
+        self.check_all()
+        self.thread = threading.Thread(target=self._run, name='replica-health', daemon=True)
+        self.thread.start()
+
+    def _check(self, replica: Replica) -> None:
+        """Verifica conexão e atraso de uma réplica"""
+        try:
+            if replica.pool is None:
+                replica.pool = ConnectionPool(
+                    {'dsn': replica.dsn, 'connect_timeout': DB_REPLICA_CONNECT_TIMEOUT},
+                    name=replica.name
+                )
+            with replica.pool.connection(timeout=DB_REPLICA_CONNECT_TIMEOUT) as pooled:
+                with pooled.connection.cursor() as cursor:
+                    cursor.execute(LAG_SQL)
+                    lag = cursor.fetchone()[0]
+        except PoolTimeout:
+            # Todas as conexões ocupadas: a réplica responde, mantém o estado anterior
+            return
+        except Exception as e:
+            if replica.healthy or replica.checked_at is None:
+                print(f"⚠️  Réplica {replica.name} indisponível: {e}")
+            replica.healthy = False
+            replica.error = str(e)
+        else:
+            if not replica.healthy and replica.checked_at is not None:
+                print(f"✅ Réplica {replica.name} disponível novamente")
+            replica.healthy = True
+            replica.lag_seconds = float(lag)
+            replica.error = None
+        replica.checked_at = time.time()
+
+    def check_all(self) -> None:
+        """Verifica todas as réplicas"""
+        for replica in self.replicas:
+            self._check(replica)
+
+    def _run(self) -> None:
+        while not self.stop_event.wait(self.check_interval):
+            self.check_all()
+
+    def choose(self) -> Optional[Replica]:
+        """
+        Réplica para a próxima consulta
+
+        Entre as saudáveis dentro do atraso tolerado, a que tem menos conexões
+        em uso (empates alternam). Se todas as saudáveis estiverem atrasadas,
+        a menos atrasada.
+
+        Returns:
+            Réplica escolhida, ou None se todas estiverem fora (usar o primário)
+        """
+        with self.lock:
+            healthy = [r for r in self.replicas if r.healthy and r.pool is not None]
+            if not healthy:
+                self.primary_fallbacks += 1
+                return None
+
+            current = [
+                r for r in healthy
+                if not self.max_lag_seconds or r.lag_seconds <= self.max_lag_seconds
+            ]
+            if current:
+                self.turn = (self.turn + 1) % len(current)
+                ordered = current[self.turn:] + current[:self.turn]
+                chosen = min(ordered, key=lambda r: len(r.pool.in_use))
+            else:
+                chosen = min(healthy, key=lambda r: r.lag_seconds)
+            chosen.routed += 1
+            return chosen
+
+    def mark_failed(self, replica: Replica, error: Exception) -> None:
+        """Tira a réplica do rodízio até a próxima verificação bem-sucedida"""
+        if replica.healthy:
+            print(f"⚠️  Réplica {replica.name} falhou, usando as demais: {error}")
+        replica.healthy = False
+        replica.error = str(error)
+
+    def close(self) -> None:
+        """Encerra a verificação e fecha os pools das réplicas"""
+        self.stop_event.set()
+        self.thread.join(timeout=5)
+        for replica in self.replicas:
+            if replica.pool is not None:
+                replica.pool.close()
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """Estado de cada réplica"""
+        return [
+            {
+                'name': replica.name,
+                'healthy': replica.healthy,
+                'lag_seconds': replica.lag_seconds,
+                'routed': replica.routed,
+                'in_use': len(replica.pool.in_use) if replica.pool is not None else 0,
+                'error': replica.error,
+            }
+            for replica in self.replicas
+        ]
@@ -0,0 +1,341 @@
+"""
+Index Advisor - Sugestão de índices a partir das consultas realmente executadas
+
+Lê o histórico do chatbot (QueryLog) e, se disponível, pg_stat_statements;
+extrai as colunas usadas em filtros e junções, monta índices candidatos e
+mede cada um com índices hipotéticos (HypoPG): o custo estimado de cada
+consulta é comparado com e sem o índice, sem criá-lo de fato.
+
+Uso:
+    python index_advisor.py                      # imprime o script de migração
+    python index_advisor.py --output indices.sql
+
+Requer a extensão hypopg no banco (CREATE EXTENSION hypopg); pg_stat_statements
+é opcional.
+"""
+import argparse
+import json
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import psycopg2
+from config import DB_CONFIG, DB_STATEMENT_TIMEOUT_SECONDS
+from query_log import QueryLog
+from sql_utils import column_predicates, extract_tables, shape_sql, tokenize
+
+
+# Consulta da carga de trabalho: SQL usado no EXPLAIN e peso (execuções)
+WorkloadQuery = namedtuple('WorkloadQuery', ['sql', 'weight', 'tables', 'generic'])
+
+# Índice candidato com o ganho medido
+Recommendation = namedtuple('Recommendation', ['table', 'columns', 'gain', 'gain_pct', 'queries'])
+
+STATEMENTS_SQL = """
+    SELECT query, calls
+    FROM pg_stat_statements
+    WHERE query ~* '^\\s*(select|with)\\s'
+    ORDER BY {time_column} DESC
+    LIMIT %s
+"""
+
+EXISTING_INDEXES_SQL = """
+    SELECT c.relname AS table_name, array_agg(a.attname::text ORDER BY k.ord) AS columns, x.indisunique
+    FROM pg_index x
+    JOIN pg_class c ON c.oid = x.indrelid
+    CROSS JOIN LATERAL unnest(x.indkey) WITH ORDINALITY AS k(attnum, ord)
+    LEFT JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = k.attnum
+    WHERE c.relname::text = ANY (%s) AND pg_table_is_visible(c.oid) AND x.indpred IS NULL
+    GROUP BY c.relname, x.indexrelid, x.indisunique
+"""
+
+# Colunas por índice composto (as primeiras igualdades mais frequentes + uma faixa)
+MAX_INDEX_COLUMNS = 3
+
+
+def _connect():
+    """Conexão somente leitura: índices hipotéticos existem só na memória da sessão"""
+    options = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_SECONDS * 1000}" if DB_STATEMENT_TIMEOUT_SECONDS else None
+    connection = psycopg2.connect(**DB_CONFIG, options=options)
+    connection.set_session(readonly=True, autocommit=True)
+    return connection
+
+
+def _is_select(sql: str) -> bool:
+    tokens = tokenize(sql)
+    return bool(tokens) and tokens[0].value.lower() in ('select', 'with')
+
+
+def collect_workload(cursor, query_log: Optional[QueryLog] = None,
+                     statements: int = 200) -> List[WorkloadQuery]:
+    """
+    Reúne as consultas a analisar, agrupadas pelo formato (shape_sql)
+
+    Do histórico vêm as execuções reais (respostas do cache não contam) com
+    literais concretos; de pg_stat_statements, a contagem de chamadas, que
+    prevalece quando o mesmo formato aparece nas duas fontes.
+
+    Args:
+        cursor: Cursor do banco
+        query_log: Histórico do chatbot (padrão: QueryLog())
+        statements: Consultas mais caras lidas de pg_stat_statements (0 ignora)
+
+    Returns:
+        Lista de WorkloadQuery
+    """
+    examples: Dict[str, str] = {}
+    weights: Counter = Counter()
+    generic = set()
+
+    for record in (query_log or QueryLog()).read():
+        sql = record.get('sql')
+        if not sql or record.get('from_cache') or not _is_select(sql):
+            continue
+        shape = shape_sql(sql)
+        examples.setdefault(shape, sql)
+        weights[shape] += 1
+
+    if statements:
+        try:
+            cursor.execute(
+                "SELECT 1 FROM pg_attribute WHERE attrelid = 'pg_stat_statements'::regclass "
+                "AND attname = 'total_exec_time'"
+            )
+            time_column = 'total_exec_time' if cursor.fetchone() else 'total_time'  # PostgreSQL 12 ou anterior
+            cursor.execute(STATEMENTS_SQL.format(time_column=time_column), (statements,))
+            for query, calls in cursor.fetchall():
+                shape = shape_sql(query)
+                if shape not in examples:
+                    examples[shape] = query
+                    generic.add(shape)  # Parâmetros $1...: exige EXPLAIN (GENERIC_PLAN)
+                weights[shape] = max(weights[shape], calls)
+        except psycopg2.Error as e:
+            print(f"⚠️  pg_stat_statements indisponível, usando apenas o histórico: {e.pgerror or e}")
+
+    return [
+        WorkloadQuery(examples[shape], weight, extract_tables(examples[shape]), shape in generic)
+        for shape, weight in weights.most_common()
+    ]
+
+
+def candidate_indexes(workload: List[WorkloadQuery]) -> Dict[Tuple[str, Tuple[str, ...]], float]:
+    """
+    Índices candidatos a partir das colunas filtradas e de junção
+
+    Para cada consulta e tabela: um índice por coluna, um composto com as
+    igualdades (mais frequentes primeiro) seguidas de uma coluna de faixa e,
+    para cada chave de junção, um composto com a chave seguida das igualdades.
+
+    Returns:
+        {(tabela, colunas): peso das consultas que o motivaram}
+    """
+    column_weight: Counter = Counter()
+    per_query = []
+    for query in workload:
+        by_table = defaultdict(lambda: {'eq': [], 'range': [], 'join': []})
+        for predicate in column_predicates(query.sql):
+            by_table[predicate.table][predicate.kind].append(predicate.column)
+            column_weight[(predicate.table, predicate.column)] += query.weight
+        per_query.append((query.weight, by_table))
+
+    candidates: Counter = Counter()
+    for weight, by_table in per_query:
+        for table, columns in by_table.items():
+            for column in columns['eq'] + columns['range'] + columns['join']:
+                candidates[(table, (column,))] += weight
+            equality = sorted(set(columns['eq']), key=lambda c: (-column_weight[(table, c)], c))
+            composites = [equality[:MAX_INDEX_COLUMNS]]
+            if columns['range'] and len(composites[0]) < MAX_INDEX_COLUMNS:
+                composites[0].append(columns['range'][0])
+            for join_column in columns['join']:
+                composites.append([join_column] + [c for c in equality if c != join_column][:MAX_INDEX_COLUMNS - 1])
+            for composite in composites:
+                if len(composite) > 1:
+                    candidates[(table, tuple(composite))] += weight
+    return candidates
+
+
+def existing_indexes(cursor, tables: List[str]) -> Dict[str, List[Tuple[Tuple[str, ...], bool]]]:
+    """Colunas dos índices existentes (sem índices parciais) e se são únicos, por tabela"""
+    cursor.execute(EXISTING_INDEXES_SQL, (tables,))
+    indexes = defaultdict(list)
+    for table, columns, unique in cursor.fetchall():
+        indexes[table].append((tuple(columns), unique))
+    return indexes
+
+
+def _covered(columns: Tuple[str, ...], indexes: List[Tuple[Tuple[str, ...], bool]]) -> bool:
+    """
+    O candidato não acrescenta nada aos índices existentes
+
+    Coberto se algum índice começa pelas mesmas colunas, ou se um índice
+    único já cobre o início do candidato (a busca retorna no máximo uma linha).
+    """
+    for index, unique in indexes:
+        if index[:len(columns)] == columns:
+            return True
+        if unique and columns[:len(index)] == index:
+            return True
+    return False
+
+
+def _plan_cost(cursor, query: WorkloadQuery) -> Tuple[float, dict]:
+    """Custo estimado e plano (EXPLAIN sem executar)"""
+    options = "GENERIC_PLAN, FORMAT JSON" if query.generic else "FORMAT JSON"
+    cursor.execute(f"EXPLAIN ({options})\n{query.sql}")
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Total Cost'], plan[0]['Plan']
+
+
+def _uses_index(plan: dict, index_name: str) -> bool:
+    if plan.get('Index Name') == index_name:
+        return True
+    return any(_uses_index(child, index_name) for child in plan.get('Plans', []))
+
+
+def evaluate(cursor, workload: List[WorkloadQuery], candidates: Dict[Tuple[str, Tuple[str, ...]], float],
+             min_gain_pct: float = 5.0) -> List[Recommendation]:
+    """
+    Mede cada candidato com um índice hipotético
+
+    O ganho é a redução do custo estimado ponderada pelas execuções, somada
+    nas consultas cujo plano passa a usar o índice.
+
+    Args:
+        cursor: Cursor de uma sessão com hypopg
+        workload: Consultas a analisar
+        candidates: Índices candidatos (ver candidate_indexes)
+        min_gain_pct: Ganho mínimo, em % do custo das consultas afetadas
+
+    Returns:
+        Recomendações da maior para a menor economia, sem candidatos cobertos
+        por outro recomendado (prefixo de um índice composto)
+    """
+    baseline = {}
+    for query in workload:
+        try:
+            baseline[query.sql] = _plan_cost(cursor, query)[0]
+        except psycopg2.Error as e:
+            print(f"⚠️  EXPLAIN falhou, consulta ignorada: {(e.pgerror or str(e)).strip()[:120]}")
+
+    results = []
+    for (table, columns), _ in candidates.most_common():
+        cursor.execute(
+            "SELECT indexrelid, indexname FROM hypopg_create_index(%s)",
+            (f"CREATE INDEX ON {table} ({', '.join(columns)})",)
+        )
+        oid, index_name = cursor.fetchone()
+        gain = affected_cost = 0.0
+        used_by = 0
+        try:
+            for query in workload:
+                if table not in query.tables or query.sql not in baseline:
+                    continue
+                cost, plan = _plan_cost(cursor, query)
+                if _uses_index(plan, index_name) and cost < baseline[query.sql]:
+                    gain += (baseline[query.sql] - cost) * query.weight
+                    affected_cost += baseline[query.sql] * query.weight
+                    used_by += 1
+        finally:
+            cursor.execute("SELECT hypopg_drop_index(%s)", (oid,))
+
+        gain_pct = 100 * gain / affected_cost if affected_cost else 0.0
+        if used_by and gain_pct >= min_gain_pct:
+            results.append(Recommendation(table, columns, gain, gain_pct, used_by))
+
+    results.sort(key=lambda r: r.gain, reverse=True)
+    chosen = []
+    for recommendation in results:
+        if not any(r.table == recommendation.table and r.columns[:len(recommendation.columns)] == recommendation.columns
+                   for r in chosen):
+            chosen.append(recommendation)
+    return chosen
+
+
+def index_name(table: str, columns: Tuple[str, ...]) -> str:
+    """Nome no padrão do projeto: idx_<tabela>_<colunas> (até 63 caracteres)"""
+    return f"idx_{table}_{'_'.join(columns)}"[:63]
+
+
+def migration_script(recommendations: List[Recommendation], analyzed: int) -> str:
+    """
+    Script SQL com os índices recomendados, do maior para o menor ganho
+
+    CREATE INDEX CONCURRENTLY não bloqueia escritas, mas não pode rodar dentro
+    de uma transação: execute o script com psql sem --single-transaction.
+    """
+    lines = [
+        f"-- Índices sugeridos pelo index_advisor.py em {datetime.now():%d/%m/%Y %H:%M}",
+        f"-- {analyzed} formatos de consulta analisados; ganho = redução do custo estimado (EXPLAIN)",
+        "-- ponderada pelas execuções, nas consultas que passam a usar o índice",
+        "",
+    ]
+    if not recommendations:
+        lines.append("-- Nenhum índice com ganho relevante")
+    for position, r in enumerate(recommendations, 1):
+        lines.append(
+            f"-- {position}. {r.table} ({', '.join(r.columns)}): custo -{r.gain_pct:.0f}% "
+            f"em {r.queries} consulta(s), ganho estimado {f'{r.gain:,.0f}'.replace(',', '.')}"
+        )
+        lines.append(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name(r.table, r.columns)} "
+            f"ON {r.table} ({', '.join(r.columns)});"
+        )
+        lines.append("")
+    return "\n".join(lines)
+
+
+def advise(statements: int = 200, min_gain_pct: float = 5.0,
+           query_log: Optional[QueryLog] = None) -> Dict[str, Any]:
+    """
+    Executa a análise completa
+
+    Returns:
+        Dict com 'recommendations', 'workload' (formatos analisados) e 'script'
+    """
+    connection = _connect()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'hypopg'")
+            if not cursor.fetchone():
+                raise RuntimeError("Extensão hypopg não instalada. Execute: CREATE EXTENSION hypopg;")
+
+            workload = collect_workload(cursor, query_log, statements)
+            print(f"📊 {len(workload)} formatos de consulta na carga de trabalho")
+            candidates = candidate_indexes(workload)
+
+            tables = sorted({table for table, _ in candidates})
+            indexes = existing_indexes(cursor, tables) if tables else {}
+            candidates = {
+                key: weight for key, weight in candidates.items()
+                if not _covered(key[1], indexes.get(key[0], []))
+            }
+            print(f"🧪 Testando {len(candidates)} índices candidatos com hypopg...")
+            recommendations = evaluate(cursor, workload, Counter(candidates), min_gain_pct)
+    finally:
+        connection.close()
+
+    return {
+        'recommendations': recommendations,
+        'workload': len(workload),
+        'script': migration_script(recommendations, len(workload)),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sugere índices a partir das consultas executadas')
+    parser.add_argument('--statements', type=int, default=200,
+                        help='Consultas mais caras lidas de pg_stat_statements (0 ignora)')
+    parser.add_argument('--min-gain', type=float, default=5.0,
+                        help='Ganho mínimo em %% do custo das consultas afetadas')
+    parser.add_argument('--output', help='Arquivo do script de migração (padrão: imprime)')
+    args = parser.parse_args()
+
+    report = advise(args.statements, args.min_gain)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report['script'] + "\n")
+        print(f"✅ {len(report['recommendations'])} índice(s) sugerido(s) em {args.output}")
+    else:
+        print(report['script'])
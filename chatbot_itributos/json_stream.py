@@ -0,0 +1,175 @@
+"""
+JSON Stream - Leitura incremental do objeto JSON gerado pelo LLM
+
+O modelo escreve {"sql": ..., "explanation": ..., "tables_used": [...]} aos
+poucos. O leitor recebe os trechos conforme chegam e informa, antes do fim da
+resposta, o texto parcial do campo string em andamento e os campos já
+completos: a interface mostra a explicação enquanto é gerada e avalia o SQL
+assim que o campo "sql" termina.
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+
+# Trecho de string sem aspas nem escapes (consumido de uma vez)
+_PLAIN_RUN = re.compile(r'[^"\\]+')
+
+# Caracteres após a barra invertida: \n, \" ... (1) ou \uXXXX (5)
+_ESCAPE_LENGTH = {'u': 6}
+
+# Primeira metade de um par substituto (emoji em \ud83d\ude00): aguarda a segunda
+_HIGH_SURROGATE = re.compile(r'\\u[dD][89abAB][0-9a-fA-F]{2}')
+
+
+class JSONObjectReader:
+    """
+    Leitor incremental de um objeto JSON de primeiro nível
+
+    Só os campos do objeto externo são acompanhados: strings são decodificadas
+    à medida que chegam; outros valores (listas, números) ficam disponíveis
+    quando completos. Texto antes da primeira chave (```json) é ignorado.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}  # campos completos
+        self.current: Optional[str] = None  # campo sendo lido
+        self.done = False
+        self.failed = False
+        self._state = 'start'
+        self._key = []
+        self._string = []  # trechos já decodificáveis da string em andamento
+        self._escape = ''  # escape incompleto (pode ser cortado entre trechos)
+        self._raw = []  # valor não string em andamento
+        self._depth = 0
+        self._in_string = False
+        self._raw_escape = False
+
+    def feed(self, text: str) -> List[str]:
+        """
+        Processa o próximo trecho da resposta
+
+        Args:
+            text: Trecho recebido do modelo
+
+        Returns:
+            Nomes dos campos completados por este trecho
+        """
+        completed = []
+        i = 0
+        while i < len(text) and not (self.done or self.failed):
+            i = self._step(text, i, completed)
+        return completed
+
+    def partial(self, key: str) -> str:
+        """Valor da string do campo: completo, parcial (se em andamento) ou vazio"""
+        if key in self.fields:
+            value = self.fields[key]
+            return value if isinstance(value, str) else ''
+        if key == self.current and self._state == 'string':
+            pieces = self._string
+            if pieces and _HIGH_SURROGATE.fullmatch(pieces[-1]):
+                pieces = pieces[:-1]
+            return json.loads('"' + ''.join(pieces) + '"')
+        return ''
+
+    def _step(self, text: str, i: int, completed: List[str]) -> int:
+        """Consome um ou mais caracteres a partir de i e retorna a nova posição"""
+        c = text[i]
+        state = self._state
+
+        if state == 'start':
+            start = text.find('{', i)
+            if start < 0:
+                return len(text)
+            self._state = 'key'
+            return start + 1
+
+        if state == 'key':
+            if c == '"':
+                self._state = 'key_string'
+            elif c == '}':
+                self.done = True
+            elif not (c.isspace() or c == ','):
+                self.failed = True
+            return i + 1
+
+        if state == 'key_string':
+            if self._escape or c == '\\':
+                return self._read_escape(text, i, self._key)
+            if c == '"':
+                self.current = json.loads('"' + ''.join(self._key) + '"')
+                self._key = []
+                self._state = 'colon'
+                return i + 1
+            run = _PLAIN_RUN.match(text, i)
+            self._key.append(run.group())
+            return run.end()
+
+        if state == 'colon':
+            if c == ':':
+                self._state = 'value'
+            elif not c.isspace():
+                self.failed = True
+            return i + 1
+
+        if state == 'value':
+            if c.isspace():
+                return i + 1
+            if c == '"':
+                self._state = 'string'
+                return i + 1
+            self._state = 'raw'
+            self._raw, self._depth, self._in_string, self._raw_escape = [], 0, False, False
+            return i
+
+        if state == 'string':
+            if self._escape or c == '\\':
+                return self._read_escape(text, i, self._string)
+            if c == '"':
+                self._complete(json.loads('"' + ''.join(self._string) + '"'), completed)
+                self._string = []
+                return i + 1
+            run = _PLAIN_RUN.match(text, i)
+            self._string.append(run.group())
+            return run.end()
+
+        # state == 'raw': lista, objeto, número, true/false/null
+        if self._in_string:
+            if self._raw_escape:
+                self._raw_escape = False
+            elif c == '\\':
+                self._raw_escape = True
+            elif c == '"':
+                self._in_string = False
+        elif c == '"':
+            self._in_string = True
+        elif c in '[{':
+            self._depth += 1
+        elif c in ']}' and self._depth:
+            self._depth -= 1
+        elif self._depth == 0 and c in ',}':
+            try:
+                value = json.loads(''.join(self._raw))
+            except ValueError:
+                self.failed = True
+                return i
+            self._complete(value, completed)
+            return i  # a vírgula ou a chave final é lida no estado 'key'
+        self._raw.append(c)
+        return i + 1
+
+    def _read_escape(self, text: str, i: int, target: List[str]) -> int:
+        """Acumula um escape (\\n, \\uXXXX) e o libera em target quando completo"""
+        self._escape += text[i]
+        expected = _ESCAPE_LENGTH.get(self._escape[1:2], 2) if len(self._escape) > 1 else 2
+        if len(self._escape) == expected:
+            target.append(self._escape)
+            self._escape = ''
+        return i + 1
+
+    def _complete(self, value: Any, completed: List[str]) -> None:
+        self.fields[self.current] = value
+        completed.append(self.current)
+        self.current = None
+        self._state = 'key'
@@ -3,12 +3,101 @@ LLM Service - Ollama e Google Gemini
 """
 import requests
 import json
-from typing import Optional, Dict, Any
+import socket
+import threading
+from typing import Optional, Dict, Any, Callable, Iterator
+from requests.adapters import HTTPAdapter
+from cancellation import CancelToken, QueryCancelled
+from json_stream import JSONObjectReader
 from config import OLLAMA_HOST, OLLAMA_MODEL, GEMINI_API_KEY, GEMINI_MODEL, GEMINI_FALLBACK_MODELS, LLM_PROVIDER
 from google import genai
 from google.genai import types
 
 
+def _shutdown_socket(sock) -> None:
+    """
+    Encerra o socket nos dois sentidos
+
+    Diferente de close(), shutdown() acorda na hora a thread bloqueada
+    lendo o socket, e o servidor vê a desconexão e para de gerar.
+    """
+    if sock is None:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass  # já fechado
+
+
+class _CancellableAdapter(HTTPAdapter):
+    """
+    Adapter do requests que liga cada conexão aberta a um CancelToken
+
+    O callback é registrado quando a conexão sai do pool, antes do envio:
+    o cancelamento interrompe também a espera pelos cabeçalhos (o Ollama só
+    responde depois de avaliar o prompt, o que pode levar minutos).
+    """
+
+    def __init__(self, token: CancelToken):
+        self.token = token
+        self.unregister = []
+        super().__init__()
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        adapter = self
+
+        def tracked(pool_class):
+            class TrackedPool(pool_class):
+                def _get_conn(self, timeout=None):
+                    conn = super()._get_conn(timeout)
+                    adapter.unregister.append(
+                        adapter.token.register(lambda: _shutdown_socket(getattr(conn, 'sock', None)))
+                    )
+                    return conn
+            # Mantém o nome original nas mensagens de erro (HTTPConnectionPool(host=...))
+            TrackedPool.__name__ = TrackedPool.__qualname__ = pool_class.__name__
+            return TrackedPool
+
+        classes = self.poolmanager.pool_classes_by_scheme
+        self.poolmanager.pool_classes_by_scheme = {scheme: tracked(cls) for scheme, cls in classes.items()}
+
+    def close(self):
+        for unregister in self.unregister:
+            unregister()
+        self.unregister = []
+        super().close()
+
+
+# Token do stream Gemini em andamento, por thread (o httpx envia na thread que itera)
+_gemini_stream = threading.local()
+
+
+def _track_gemini_response(response) -> None:
+    """
+    Hook de resposta do httpx usado pelo cliente Gemini
+
+    Com os cabeçalhos recebidos, liga o socket da resposta ao token do
+    stream em andamento nesta thread.
+    """
+    token = getattr(_gemini_stream, 'token', None)
+    network_stream = response.extensions.get('network_stream')
+    if token is None or network_stream is None:
+        return
+    sock = network_stream.get_extra_info('socket')
+    _gemini_stream.unregister.append(token.register(lambda: _shutdown_socket(sock)))
+
+
+def _strip_markdown(text: str) -> str:
+    """Remove o bloco ```json ... ``` que alguns modelos colocam em volta do JSON"""
+    text = text.strip()
+    if text.startswith('```json'):
+        return text.split('```json')[1].split('```')[0].strip()
+    if text.startswith('```'):
+        return text.split('```')[1].split('```')[0].strip()
+    return text
+
+
 class LLMService:
     """Serviço de LLM com Ollama e Google Gemini"""
     
@@ -72,7 +161,13 @@ class LLMService:
         
         try:
             # Criar cliente Gemini
-            self.gemini_client = genai.Client(api_key=GEMINI_API_KEY)
+            # O hook de resposta permite fechar o socket de um stream cancelado
+            self.gemini_client = genai.Client(
+                api_key=GEMINI_API_KEY,
+                http_options=types.HttpOptions(
+                    client_args={'event_hooks': {'response': [_track_gemini_response]}}
+                )
+            )
             self.gemini_model_name = GEMINI_MODEL
             self.gemini_fallback_models = GEMINI_FALLBACK_MODELS.copy()
             self.gemini_current_model_index = 0
@@ -89,25 +184,50 @@ class LLMService:
                 f"Erro: {e}"
             )
     
-    def generate_sql(self, user_question: str, schema_context: str) -> Dict[str, Any]:
+    def get_model_name(self) -> str:
+        """Retorna o nome do modelo ativo do provedor"""
+        if self.provider == 'ollama':
+            return self.ollama_model or OLLAMA_MODEL
+        return self.gemini_model_name
+
+    def generate_sql(self, user_question: str, schema_context: str,
+                     token: Optional[CancelToken] = None,
+                     on_update: Optional[Callable[[JSONObjectReader], Any]] = None) -> Dict[str, Any]:
         """
         Gera SQL a partir da pergunta do usuário
         
+        A resposta é recebida em streaming e lida por um JSONObjectReader:
+        on_update é chamado a cada trecho (na thread que gera), com os campos
+        já completos e o texto parcial do campo em andamento.
+        
         Args:
             user_question: Pergunta do usuário em linguagem natural
             schema_context: Contexto do schema do banco de dados
+            token: Interrompe a requisição ao LLM quando acionado (opcional)
+            on_update: Chamado com o leitor a cada trecho recebido (opcional)
         
         Returns:
             Dict com 'sql', 'explanation' e 'tables_used'
+        
+        Raises:
+            QueryCancelled: se o token for cancelado durante a geração
         """
         prompt = self._build_sql_prompt(user_question, schema_context)
         
         if self.provider == 'ollama':
-            return self._generate_sql_ollama(prompt)
+            result = self._generate_sql_ollama(prompt, token, on_update)
         elif self.provider == 'gemini':
-            return self._generate_sql_gemini(prompt)
+            result = self._generate_sql_gemini(prompt, token, on_update)
+        else:
+            result = None
+        
+        # Um cancelamento durante a requisição aparece como erro; reporta como cancelamento
+        if token is not None:
+            token.check()
+        return result
     
-    def _build_sql_prompt(self, user_question: str, schema_context: str) -> str:
+    @staticmethod
+    def _build_sql_prompt(user_question: str, schema_context: str) -> str:
         """Constrói o prompt para geração de SQL"""
         return f"""Você é um especialista em SQL para o sistema iTributos - sistema de gestão tributária municipal.
 
@@ -119,12 +239,13 @@ REGRAS IMPORTANTES:
 2. agreement_operations.person_id → unico_people.id
 3. payments.payable_id = agreements.id quando payable_type = 'Agreement'
 4. payments.id → payment_parcels.payment_id
-5. payment_parcels.status: 5=Pago, 1=Aberto, 0=Cancelado
+5. payment_parcels.status: 5=Pago, 1=Aberto, 2=Cancelado, 0=Simulado
 6. SEMPRE use aliases curtos e claros (p, pm, pp, a, ao, up)
 7. SEMPRE inclua WHERE clauses apropriadas
 8. Não limitar resultados sem solicitação explícita do usuário
 9. Use JOINs corretos para relacionar tabelas
 10. VALORES MONETÁRIOS: Use nomes de colunas claros (ex: valor_total, valor_pago) para facilitar formatação automática em R$
+11. Se mv_agreement_parcel_summary estiver no contexto, use-a para quantidades e valores de parcelas pagas/abertas/canceladas por acordo (JOIN em agreement_id = agreements.id), sem agregar payments/payment_parcels
 
 EXEMPLOS DE QUERIES CORRETAS:
 
@@ -188,41 +309,161 @@ RESPONDA NO FORMATO JSON (sem markdown):
     "tables_used": ["tabela1", "tabela2"]
 }}"""
     
-    def _generate_sql_ollama(self, prompt: str) -> Dict[str, Any]:
-        """Gera SQL usando Ollama"""
+    def _stream_ollama(self, payload: Dict[str, Any], timeout: int,
+                       token: Optional[CancelToken] = None) -> Iterator[str]:
+        """
+        Trechos de texto gerados pelo Ollama (/api/generate em streaming)
+        
+        Se o token for cancelado, o socket é encerrado na hora, mesmo durante
+        a avaliação do prompt (antes do primeiro trecho), e o Ollama
+        interrompe a geração ao ver a desconexão.
+
+        Args:
+            payload: Corpo da requisição (model, prompt, options...)
+            timeout: Segundos sem receber dados antes de desistir
+            token: Token de cancelamento (opcional)
+
+        Raises:
+            QueryCancelled: se o token for cancelado
+        """
+        model_to_use = payload['model']
+        session = requests.Session()
+        if token is not None:
+            adapter = _CancellableAdapter(token)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        response = None
+        try:
+            try:
+                response = session.post(
+                    f"{OLLAMA_HOST}/api/generate",
+                    json={**payload, 'stream': True},
+                    timeout=timeout,
+                    stream=True
+                )
+            except requests.exceptions.RequestException:
+                if token is not None:
+                    token.check()  # socket encerrado pelo cancelamento
+                raise
+
+            if response.status_code != 200:
+                raise Exception(
+                    f"Ollama retornou status {response.status_code}. "
+                    f"Verifique se o modelo '{model_to_use}' está instalado. "
+                    f"Execute: ollama pull {model_to_use}"
+                )
+            
+            # Uma linha JSON por trecho gerado: {"response": "...", "done": false}
+            try:
+                for line in response.iter_lines():
+                    if token is not None:
+                        token.check()
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get('error'):
+                        raise Exception(chunk['error'])
+                    yield chunk.get('response', '')
+                    if chunk.get('done'):
+                        break
+            except requests.exceptions.RequestException:
+                if token is not None:
+                    token.check()
+                raise
+            if token is not None:
+                token.check()  # socket encerrado: a leitura termina sem erro
+        finally:
+            if response is not None:
+                response.close()
+            session.close()
+
+    def _stream_gemini(self, model_name: str, prompt: str, config: 'types.GenerateContentConfig',
+                       token: Optional[CancelToken] = None) -> Iterator[str]:
+        """
+        Trechos de texto gerados pelo Gemini (generate_content_stream)
+
+        Recebidos os cabeçalhos, o socket da resposta fica ligado ao token
+        (ver _track_gemini_response): cancelado, a leitura é interrompida na
+        hora, sem esperar o próximo trecho, e o restante é descartado.
+
+        Raises:
+            QueryCancelled: se o token for cancelado
+        """
+        _gemini_stream.token = token
+        _gemini_stream.unregister = []
+        try:
+            stream = self.gemini_client.models.generate_content_stream(
+                model=model_name,
+                contents=prompt,
+                config=config
+            )
+            for chunk in stream:
+                if token is not None:
+                    token.check()
+                if chunk.text:
+                    yield chunk.text
+            if token is not None:
+                token.check()
+        except Exception:
+            if token is not None:
+                token.check()  # erro de leitura causado pelo cancelamento
+            raise
+        finally:
+            for unregister in _gemini_stream.unregister:
+                unregister()
+            _gemini_stream.token = None
+            _gemini_stream.unregister = []
+    
+    @staticmethod
+    def _read_json_stream(pieces: Iterator[str],
+                          on_update: Optional[Callable[[JSONObjectReader], Any]] = None) -> str:
+        """
+        Lê os trechos da resposta, informando on_update a cada um
+        
+        Returns:
+            Texto completo recebido
+        """
+        reader = JSONObjectReader()
+        text = []
+        for piece in pieces:
+            text.append(piece)
+            reader.feed(piece)
+            if on_update is not None:
+                on_update(reader)
+        return ''.join(text)
+    
+    @staticmethod
+    def _read_text_stream(pieces: Iterator[str], on_text: Optional[Callable[[str], Any]] = None) -> str:
+        """Junta os trechos de texto livre, informando on_text com o texto acumulado"""
+        text = ''
+        for piece in pieces:
+            text += piece
+            if on_text is not None:
+                on_text(text)
+        return text
+    
+    def _generate_sql_ollama(self, prompt: str, token: Optional[CancelToken] = None,
+                             on_update: Optional[Callable[[JSONObjectReader], Any]] = None) -> Dict[str, Any]:
+        """Gera SQL usando Ollama (resposta em streaming, interrompível pelo token)"""
+        result_text = ""
         try:
             model_to_use = getattr(self, 'ollama_model', OLLAMA_MODEL)
             print(f"⏳ Processando com {model_to_use} (pode demorar 1-2 minutos)...")
             
-            response = requests.post(
-                f"{OLLAMA_HOST}/api/generate",
-                json={
+            pieces = self._stream_ollama(
+                {
                     'model': model_to_use,
                     'prompt': prompt,
-                    'stream': False,
                     'format': 'json',
                     'options': {
                         'temperature': 0.1,
                         'num_predict': 500
                     }
                 },
-                timeout=180  # 3 minutos
+                timeout=180,  # 3 minutos sem receber dados
+                token=token
             )
-            
-            if response.status_code != 200:
-                raise Exception(
-                    f"Ollama retornou status {response.status_code}. "
-                    f"Verifique se o modelo '{model_to_use}' está instalado. "
-                    f"Execute: ollama pull {model_to_use}"
-                )
-            
-            result_text = response.json()['response'].strip()
-            
-            # Remove markdown se presente
-            if result_text.startswith('```json'):
-                result_text = result_text.split('```json')[1].split('```')[0].strip()
-            elif result_text.startswith('```'):
-                result_text = result_text.split('```')[1].split('```')[0].strip()
+            result_text = _strip_markdown(self._read_json_stream(pieces, on_update))
             
             result = json.loads(result_text)
             return result
@@ -253,12 +494,21 @@ RESPONDA NO FORMATO JSON (sem markdown):
                 'error': str(e)
             }
     
-    def _generate_sql_gemini(self, prompt: str) -> Dict[str, Any]:
-        """Gera SQL usando Google Gemini com fallback automático"""
+    def _generate_sql_gemini(self, prompt: str, token: Optional[CancelToken] = None,
+                             on_update: Optional[Callable[[JSONObjectReader], Any]] = None) -> Dict[str, Any]:
+        """
+        Gera SQL usando Google Gemini com fallback automático
+        
+        A resposta chega em streaming e o token é verificado a cada trecho;
+        com o token cancelado, nenhum modelo de fallback é tentado. Cada
+        tentativa usa um leitor novo (on_update recebe o da tentativa atual).
+        """
         result_text = ""
         
         # Tentar cada modelo da lista em sequência até ter sucesso
         for attempt, model_name in enumerate(self.gemini_fallback_models):
+            if token is not None and token.cancelled:
+                break
             try:
                 if attempt > 0:
                     print(f"🔄 Tentando modelo de fallback: {model_name}...")
@@ -266,27 +516,22 @@ RESPONDA NO FORMATO JSON (sem markdown):
                     print(f"⏳ Processando com Gemini ({model_name})...")
                 
                 # Gerar resposta
-                response = self.gemini_client.models.generate_content(
-                    model=model_name,
-                    contents=prompt,
-                    config=types.GenerateContentConfig(
+                pieces = self._stream_gemini(
+                    model_name,
+                    prompt,
+                    types.GenerateContentConfig(
                         temperature=0.1,
                         response_mime_type="application/json"
-                    )
+                    ),
+                    token
                 )
+                result_text = self._read_json_stream(pieces, on_update)
                 
                 # Verificar se há resposta
-                if not response or not response.text:
+                if not result_text.strip():
                     raise Exception("Gemini retornou resposta vazia")
                 
-                result_text = response.text.strip()
-                
-                # Remove markdown se presente
-                if result_text.startswith('```json'):
-                    result_text = result_text.split('```json')[1].split('```')[0].strip()
-                elif result_text.startswith('```'):
-                    result_text = result_text.split('```')[1].split('```')[0].strip()
-                
+                result_text = _strip_markdown(result_text)
                 result = json.loads(result_text)
                 
                 # Sucesso! Atualizar modelo atual
@@ -359,8 +604,25 @@ RESPONDA NO FORMATO JSON (sem markdown):
             'error': 'all_models_failed'
         }
     
-    def explain_results(self, question: str, results: list, sql: str) -> str:
-        """Gera explicação em linguagem natural dos resultados"""
+    def explain_results(self, question: str, results: list, sql: str,
+                        token: Optional[CancelToken] = None,
+                        on_text: Optional[Callable[[str], Any]] = None) -> str:
+        """
+        Gera explicação em linguagem natural dos resultados
+        
+        Args:
+            question: Pergunta original
+            results: Registros retornados
+            sql: SQL executado
+            token: Interrompe a geração quando acionado (opcional)
+            on_text: Chamado com o texto acumulado a cada trecho recebido (opcional)
+        
+        Returns:
+            Explicação (ou mensagem de erro)
+        
+        Raises:
+            QueryCancelled: se o token for cancelado durante a geração
+        """
         if not results:
             return "Nenhum resultado encontrado para esta consulta."
         
@@ -389,17 +651,21 @@ RESPOSTA:"""
                 for attempt, model_name in enumerate([self.gemini_model_name] + 
                     [m for m in self.gemini_fallback_models if m != self.gemini_model_name]):
                     try:
-                        response = self.gemini_client.models.generate_content(
-                            model=model_name,
-                            contents=prompt,
-                            config=types.GenerateContentConfig(
+                        pieces = self._stream_gemini(
+                            model_name,
+                            prompt,
+                            types.GenerateContentConfig(
                                 temperature=0.3,
                                 max_output_tokens=500
-                            )
+                            ),
+                            token
                         )
+                        text = self._read_text_stream(pieces, on_text)
                         if attempt > 0:
                             print(f"✅ Explicação gerada com modelo de fallback: {model_name}")
-                        return response.text
+                        return text
+                    except QueryCancelled:
+                        raise
                     except Exception as e:
                         error_msg = str(e).lower()
                         is_rate_limit = any(k in error_msg for k in [
@@ -414,20 +680,21 @@ RESPOSTA:"""
                             return f"Não foi possível gerar explicação: {e}"
             else:  # ollama
                 model_to_use = getattr(self, 'ollama_model', OLLAMA_MODEL)
-                response = requests.post(
-                    f"{OLLAMA_HOST}/api/generate",
-                    json={
+                pieces = self._stream_ollama(
+                    {
                         'model': model_to_use,
                         'prompt': prompt,
-                        'stream': False,
                         'options': {
                             'temperature': 0.3,
                             'num_predict': 300
                         }
                     },
-                    timeout=120  # 2 minutos
+                    timeout=120,  # 2 minutos sem receber dados
+                    token=token
                 )
-                return response.json()['response']
+                return self._read_text_stream(pieces, on_text)
+        except QueryCancelled:
+            raise
         except Exception as e:
             return f"Não foi possível gerar explicação: {e}"
 
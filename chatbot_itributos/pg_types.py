@@ -0,0 +1,147 @@
+"""
+PG Types - Mapeamento dos tipos do PostgreSQL (OID) para tipos Arrow e pandas,
+e conversão de NUMERIC sem Decimal
+"""
+from collections import namedtuple
+from typing import Any, List, Optional
+from psycopg2 import extensions
+from config import DB_NUMERIC_MODE
+
+try:
+    import pyarrow as pa
+except ImportError:  # Sem pyarrow, arrow_type retorna None
+    pa = None
+
+
+# OIDs dos tipos embutidos (pg_type.oid, estáveis entre versões do PostgreSQL)
+BOOL = 16
+INT8 = 20
+INT2 = 21
+INT4 = 23
+OID = 26
+FLOAT4 = 700
+FLOAT8 = 701
+NUMERIC = 1700
+DATE = 1082
+TIMESTAMP = 1114
+TIMESTAMPTZ = 1184
+
+
+def arrow_type(type_oid: int) -> Optional[Any]:
+    """
+    Tipo Arrow correspondente ao OID
+
+    NUMERIC vira float64: os valores do iTributos (moeda, até 15 dígitos
+    significativos) cabem sem perda e ficam prontos para soma e gráficos.
+
+    Args:
+        type_oid: OID do tipo (cursor.description[i].type_code)
+
+    Returns:
+        Tipo pyarrow, ou None se pyarrow não estiver instalado
+    """
+    if pa is None:
+        return None
+    return {
+        BOOL: pa.bool_(),
+        INT2: pa.int16(),
+        INT4: pa.int32(),
+        INT8: pa.int64(),
+        OID: pa.int64(),
+        FLOAT4: pa.float32(),
+        FLOAT8: pa.float64(),
+        NUMERIC: pa.float64(),
+        DATE: pa.date32(),
+        TIMESTAMP: pa.timestamp('us'),
+        TIMESTAMPTZ: pa.timestamp('us', tz='UTC'),
+    }.get(type_oid, pa.string())
+
+
+# Conversões de NUMERIC aceitas por register_numeric_casters
+# decimal: Decimal (padrão do psycopg2); float: float64; cents: int64 em centavos
+NUMERIC_MODES = ('decimal', 'float', 'cents')
+
+# Metadados de coluna de um resultado (cursor.description)
+Column = namedtuple('Column', ['name', 'type_oid', 'dtype'])
+
+
+def _numeric_to_float(value: Optional[str], cursor) -> Optional[float]:
+    if value is None or value in ('NaN', 'Infinity', '-Infinity'):
+        return None
+    return float(value)
+
+
+def _numeric_to_cents(value: Optional[str], cursor) -> Optional[int]:
+    """Centavos inteiros, arredondando a terceira casa (meio para longe do zero), sem passar por float"""
+    if value is None or value in ('NaN', 'Infinity', '-Infinity'):
+        return None
+    negative = value.startswith('-')
+    whole, _, fraction = value.lstrip('-').partition('.')
+    fraction = fraction.ljust(3, '0')
+    cents = int(whole or '0') * 100 + int(fraction[:2]) + (fraction[2] >= '5')
+    return -cents if negative else cents
+
+
+NUMERIC_CASTERS = {
+    'float': extensions.new_type((NUMERIC,), 'NUMERIC_FLOAT', _numeric_to_float),
+    'cents': extensions.new_type((NUMERIC,), 'NUMERIC_CENTS', _numeric_to_cents),
+}
+
+
+def register_numeric_casters(connection, mode: Optional[str] = None) -> None:
+    """
+    Define como NUMERIC é lido nesta conexão (as demais não mudam)
+
+    Args:
+        connection: Conexão psycopg2
+        mode: 'decimal', 'float' ou 'cents' (padrão: DB_NUMERIC_MODE)
+    """
+    mode = mode or DB_NUMERIC_MODE
+    if mode not in NUMERIC_MODES:
+        raise ValueError(f"Modo de NUMERIC inválido: {mode} (use {', '.join(NUMERIC_MODES)})")
+    if mode in NUMERIC_CASTERS:
+        extensions.register_type(NUMERIC_CASTERS[mode], connection)
+
+
+def pandas_dtype(type_oid: int, numeric_mode: Optional[str] = None) -> Optional[str]:
+    """
+    dtype pandas das colunas do tipo, com NULL representável
+
+    Inteiros usam os tipos anuláveis (Int32, Int64) para não virarem float
+    quando há NULL. NUMERIC segue o modo de leitura da conexão.
+
+    Args:
+        type_oid: OID do tipo (cursor.description[i].type_code)
+        numeric_mode: Modo de NUMERIC da conexão (padrão: DB_NUMERIC_MODE)
+
+    Returns:
+        dtype, ou None para manter o inferido pelo pandas (texto, datas, Decimal)
+    """
+    if type_oid == NUMERIC:
+        return {'float': 'float64', 'cents': 'Int64'}.get(numeric_mode or DB_NUMERIC_MODE)
+    return {
+        BOOL: 'boolean',
+        INT2: 'Int16',
+        INT4: 'Int32',
+        INT8: 'Int64',
+        OID: 'Int64',
+        FLOAT4: 'float32',
+        FLOAT8: 'float64',
+    }.get(type_oid)
+
+
+def describe(description, numeric_mode: Optional[str] = None) -> List[Column]:
+    """
+    Metadados das colunas de um cursor
+
+    Args:
+        description: cursor.description
+        numeric_mode: Modo de NUMERIC da conexão (padrão: DB_NUMERIC_MODE)
+
+    Returns:
+        Lista de Column(name, type_oid, dtype), na ordem do SELECT
+    """
+    return [
+        Column(column.name, column.type_code, pandas_dtype(column.type_code, numeric_mode))
+        for column in description or ()
+    ]
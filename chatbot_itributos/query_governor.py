@@ -0,0 +1,113 @@
+"""
+Query Governor - Avaliação do custo estimado (EXPLAIN) das queries geradas pelo LLM
+"""
+from collections import namedtuple
+from typing import Any, Callable, Dict, Optional
+from config import (
+    GOVERNOR_ENABLED,
+    GOVERNOR_CONFIRM_COST,
+    GOVERNOR_REJECT_COST,
+    GOVERNOR_LIMIT_ROWS,
+    GOVERNOR_ROW_CAP,
+)
+from sql_utils import top_level_limit
+
+
+# Ações possíveis para uma query
+ALLOW = 'allow'      # Executar normalmente
+CONFIRM = 'confirm'  # Executar somente após confirmação do usuário
+REJECT = 'reject'    # Não executar
+
+# Resultado da avaliação: sql pode ter sido reescrito com LIMIT (limited=True)
+GovernorDecision = namedtuple('GovernorDecision', ['action', 'sql', 'cost', 'rows', 'limited', 'reason'])
+
+
+def _fmt(value: float) -> str:
+    """Número com separador de milhar brasileiro"""
+    return f"{value:,.0f}".replace(',', '.')
+
+
+class QueryGovernor:
+    """Decide, pelo plano estimado, se uma query é executada, confirmada, limitada ou recusada"""
+
+    def __init__(self, enabled: Optional[bool] = None, confirm_cost: Optional[float] = None,
+                 reject_cost: Optional[float] = None, limit_rows: Optional[int] = None,
+                 row_cap: Optional[int] = None):
+        """
+        Args:
+            enabled: Liga a avaliação (padrão: GOVERNOR_ENABLED)
+            confirm_cost: Custo estimado a partir do qual é pedida confirmação (padrão: GOVERNOR_CONFIRM_COST)
+            reject_cost: Custo estimado a partir do qual a query é recusada (padrão: GOVERNOR_REJECT_COST)
+            limit_rows: Linhas estimadas a partir das quais a query recebe LIMIT (padrão: GOVERNOR_LIMIT_ROWS)
+            row_cap: LIMIT aplicado na reescrita (padrão: GOVERNOR_ROW_CAP)
+        """
+        self.enabled = GOVERNOR_ENABLED if enabled is None else enabled
+        self.confirm_cost = confirm_cost or GOVERNOR_CONFIRM_COST
+        self.reject_cost = reject_cost or GOVERNOR_REJECT_COST
+        self.limit_rows = limit_rows or GOVERNOR_LIMIT_ROWS
+        self.row_cap = row_cap or GOVERNOR_ROW_CAP
+
+    def limit_sql(self, sql: str) -> Optional[str]:
+        """
+        Envolve a query em SELECT * FROM (...) LIMIT row_cap
+
+        Returns:
+            SQL reescrito, ou None se a query já tem LIMIT menor ou igual ao teto
+        """
+        current = top_level_limit(sql)
+        if current is not None and current <= self.row_cap:
+            return None
+        query = sql.strip()
+        while query.endswith(';'):
+            query = query[:-1].rstrip()
+        # Quebras de linha isolam comentários de linha no fim da query
+        return f"SELECT * FROM (\n{query}\n) AS limited LIMIT {self.row_cap}"
+
+    def evaluate(self, sql: str, explain: Callable[[str], Dict[str, Any]]) -> GovernorDecision:
+        """
+        Avalia a query pelo plano estimado
+
+        Se as linhas estimadas passam de limit_rows, a query é reescrita com
+        LIMIT e o custo avaliado é o da versão limitada (o LIMIT costuma
+        permitir que o planejador pare cedo).
+
+        Args:
+            sql: Query SQL
+            explain: Função que retorna o nó raiz de EXPLAIN (FORMAT JSON) da query
+
+        Returns:
+            GovernorDecision(action, sql, cost, rows, limited, reason)
+        """
+        if not self.enabled:
+            return GovernorDecision(ALLOW, sql, None, None, False, None)
+
+        try:
+            plan = explain(sql)
+        except Exception as e:
+            return GovernorDecision(REJECT, sql, None, None, False, f"Query inválida: {e}")
+
+        cost, rows = plan['Total Cost'], plan['Plan Rows']
+        estimated_rows = rows
+        limited = False
+        if rows > self.limit_rows:
+            limited_sql = self.limit_sql(sql)
+            if limited_sql is not None:
+                try:
+                    plan = explain(limited_sql)
+                    sql, cost, rows, limited = limited_sql, plan['Total Cost'], plan['Plan Rows'], True
+                except Exception as e:
+                    print(f"⚠️  Não foi possível limitar a query: {e}")
+
+        if cost >= self.reject_cost:
+            return GovernorDecision(
+                REJECT, sql, cost, rows, limited,
+                f"Custo estimado ({_fmt(cost)}) acima do limite ({_fmt(self.reject_cost)}). "
+                "Refine a pergunta com filtros (contribuinte, período, status)."
+            )
+        if cost >= self.confirm_cost:
+            return GovernorDecision(
+                CONFIRM, sql, cost, rows, limited,
+                f"Custo estimado ({_fmt(cost)}) acima de {_fmt(self.confirm_cost)}; a consulta pode demorar."
+            )
+        reason = f"Resultado limitado a {self.row_cap} linhas (~{_fmt(estimated_rows)} estimadas)" if limited else None
+        return GovernorDecision(ALLOW, sql, cost, rows, limited, reason)
@@ -0,0 +1,141 @@
+"""
+Query Log - Histórico persistente de perguntas e SQL executados (JSON lines)
+"""
+import json
+import os
+import threading
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from config import QUERY_LOG_PATH, QUERY_LOG_MAX_LINES, QUERY_LOG_MAX_BYTES
+from question_cache import normalize_question
+
+
+class QueryLog:
+    """Registro em disco das perguntas respondidas, compartilhado entre sessões"""
+
+    _lock = threading.Lock()
+
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None):
+        """
+        Args:
+            path: Arquivo JSON lines (padrão: QUERY_LOG_PATH)
+            max_bytes: Tamanho a partir do qual o arquivo é reduzido (padrão: QUERY_LOG_MAX_BYTES, 0 sem limite)
+        """
+        self.path = path or QUERY_LOG_PATH
+        self.max_bytes = QUERY_LOG_MAX_BYTES if max_bytes is None else max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+    def append(self, question: str, sql: str, explanation: str = '',
+               tables_used: Optional[List[str]] = None, rows: Optional[int] = None,
+               duration_ms: Optional[float] = None, from_cache: bool = False) -> None:
+        """
+        Registra uma pergunta respondida
+
+        Args:
+            question: Pergunta do usuário
+            sql: SQL executado
+            explanation: Explicação gerada pelo LLM
+            tables_used: Tabelas informadas pelo LLM
+            rows: Quantidade de linhas retornadas
+            duration_ms: Tempo total de resposta em milissegundos
+            from_cache: Se o resultado veio do cache
+        """
+        record = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'question': question,
+            'sql': sql,
+            'explanation': explanation,
+            'tables_used': tables_used or [],
+            'rows': rows,
+            'duration_ms': duration_ms,
+            'from_cache': from_cache
+        }
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+                size = f.tell()
+            if self.max_bytes and size > self.max_bytes:
+                self._trim()
+
+    def _trim(self) -> None:
+        """
+        Reduz o arquivo aos registros mais recentes (chamado com o lock)
+
+        Ficam até QUERY_LOG_MAX_LINES registros, ocupando no máximo metade de
+        max_bytes, para que o arquivo não volte a ser reescrito a cada
+        registro. O novo conteúdo substitui o antigo de uma vez (os.replace).
+        """
+        with open(self.path, encoding='utf-8') as f:
+            lines = deque(f, maxlen=QUERY_LOG_MAX_LINES)
+
+        budget = self.max_bytes // 2
+        kept = deque()
+        for line in reversed(lines):
+            budget -= len(line.encode('utf-8'))
+            if budget < 0:
+                break
+            kept.appendleft(line)
+
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.writelines(kept)
+        os.replace(temp_path, self.path)
+        print(f"🗂️  Histórico de perguntas reduzido a {len(kept)} registro(s) recentes")
+
+    def read(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Lê os registros mais recentes
+
+        Args:
+            limit: Quantidade máxima de registros (padrão: QUERY_LOG_MAX_LINES)
+
+        Returns:
+            Lista de registros, do mais antigo para o mais recente
+        """
+        if not os.path.exists(self.path):
+            return []
+
+        with self._lock:
+            with open(self.path, encoding='utf-8') as f:
+                lines = deque(f, maxlen=limit or QUERY_LOG_MAX_LINES)
+
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # Linha truncada por escrita interrompida
+        return records
+
+    def top_questions(self, n: int) -> List[Dict[str, Any]]:
+        """
+        Perguntas mais frequentes, agrupadas pela forma normalizada
+
+        Args:
+            n: Quantidade de perguntas
+
+        Returns:
+            Lista de dicts com 'question', 'sql', 'explanation', 'tables_used' e
+            'count', usando o SQL mais recente de cada pergunta
+        """
+        counts = Counter()
+        latest = {}
+        for record in self.read():
+            if not record.get('sql'):
+                continue
+            key = ' '.join(normalize_question(record['question']))
+            counts[key] += 1
+            latest[key] = record
+
+        return [
+            {
+                'question': latest[key]['question'],
+                'sql': latest[key]['sql'],
+                'explanation': latest[key].get('explanation', ''),
+                'tables_used': latest[key].get('tables_used', []),
+                'count': count
+            }
+            for key, count in counts.most_common(n)
+        ]
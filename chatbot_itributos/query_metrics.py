@@ -0,0 +1,144 @@
+"""
+Query Metrics - Medições de cada execução no banco, em um buffer circular em memória
+
+Cada consulta executada pelo DatabaseService gera um registro (tempo total,
+linhas, bytes aproximados, servidor e PID, tempo de planejamento quando
+conhecido). Os últimos QUERY_METRICS_SIZE ficam em memória para os
+percentis da barra lateral e podem ser exportados em JSON lines.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+from config import QUERY_METRICS_SIZE, QUERY_METRICS_PATH
+
+
+# Tamanho máximo do SQL guardado em cada registro
+MAX_SQL_CHARS = 2000
+
+# Tempos de planejamento aguardando a execução da mesma query
+MAX_PENDING_PLANNING = 100
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    """Percentil de uma lista já ordenada (0.0 se vazia)"""
+    return values[int(fraction * (len(values) - 1))] if values else 0.0
+
+
+class QueryMetrics:
+    """Buffer circular dos registros de execução, com resumo por percentis"""
+
+    def __init__(self, max_records: Optional[int] = None):
+        """
+        Args:
+            max_records: Registros mantidos em memória (padrão: QUERY_METRICS_SIZE)
+        """
+        self.records = deque(maxlen=max_records or QUERY_METRICS_SIZE)
+        self.pending_planning = OrderedDict()  # SQL -> ms de planejamento (EXPLAIN ... SUMMARY)
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def note_planning(self, sql: str, planning_ms: float) -> None:
+        """Guarda o tempo de planejamento para o registro da próxima execução do mesmo SQL"""
+        with self.lock:
+            self.pending_planning[sql] = planning_ms
+            self.pending_planning.move_to_end(sql)
+            while len(self.pending_planning) > MAX_PENDING_PLANNING:
+                self.pending_planning.popitem(last=False)
+
+    def start(self, sql: str, kind: str, server: str, pid: int) -> Dict[str, Any]:
+        """
+        Abre o registro de uma execução (concluído por finish)
+
+        Args:
+            sql: Query SQL
+            kind: Caminho de execução ('query', 'cursor', 'prepared', 'copy'...)
+            server: Servidor (nome do pool)
+            pid: PID do backend
+
+        Returns:
+            Registro a preencher com rows/bytes durante a leitura
+        """
+        with self.lock:
+            planning_ms = self.pending_planning.pop(sql, None)
+        return {
+            'at': time.time(),
+            'kind': kind,
+            'server': server,
+            'pid': pid,
+            'sql': sql[:MAX_SQL_CHARS],
+            'rows': 0,
+            'bytes': 0,
+            'planning_ms': planning_ms,
+            'wall_ms': None,
+            'status': 'ok',
+            '_started': time.perf_counter(),
+        }
+
+    def finish(self, record: Dict[str, Any], status: str = 'ok') -> None:
+        """Calcula o tempo total e guarda o registro no buffer"""
+        record['wall_ms'] = (time.perf_counter() - record.pop('_started')) * 1000
+        record['status'] = status
+        with self.lock:
+            self.records.append(record)
+            self.total += 1
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Cópia dos registros em memória, do mais antigo ao mais recente"""
+        with self.lock:
+            return list(self.records)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Resumo dos registros em memória
+
+        Returns:
+            Dict com contagens, percentis de tempo (p50/p95/p99 em ms), linhas e
+            bytes, planejamento médio e percentis por servidor
+        """
+        records = self.snapshot()
+        walls = sorted(r['wall_ms'] for r in records)
+        rows = sorted(r['rows'] for r in records)
+        planning = [r['planning_ms'] for r in records if r['planning_ms'] is not None]
+
+        servers = {}
+        for record in records:
+            servers.setdefault(record['server'], []).append(record['wall_ms'])
+
+        return {
+            'total': self.total,
+            'count': len(records),
+            'errors': sum(1 for r in records if r['status'] == 'error'),
+            'cancelled': sum(1 for r in records if r['status'] == 'cancelled'),
+            'wall_p50_ms': _percentile(walls, 0.50),
+            'wall_p95_ms': _percentile(walls, 0.95),
+            'wall_p99_ms': _percentile(walls, 0.99),
+            'rows_p95': _percentile(rows, 0.95),
+            'bytes_total': sum(r['bytes'] for r in records),
+            'planning_avg_ms': sum(planning) / len(planning) if planning else None,
+            'servers': {
+                server: {'count': len(times), 'wall_p95_ms': _percentile(sorted(times), 0.95)}
+                for server, times in servers.items()
+            },
+        }
+
+    def dump(self, path: Optional[str] = None) -> int:
+        """
+        Acrescenta os registros em memória a um arquivo JSON lines
+
+        Args:
+            path: Arquivo de destino (padrão: QUERY_METRICS_PATH)
+
+        Returns:
+            Quantidade de registros gravados
+        """
+        path = path or QUERY_METRICS_PATH
+        records = self.snapshot()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        print(f"📊 {len(records)} medições de consultas gravadas em {path}")
+        return len(records)
@@ -0,0 +1,239 @@
+"""
+Question Cache - Cache de perguntas em linguagem natural para SQL gerado
+"""
+import hashlib
+import os
+import re
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional
+from diskcache import Cache
+from config import (
+    CACHE_DIR,
+    QUESTION_CACHE_TTL_SECONDS,
+    QUESTION_CACHE_SIMILARITY,
+    QUESTION_CACHE_INDEX_SIZE,
+)
+
+
+# Palavras sem valor semântico para a consulta (já sem acentos)
+STOPWORDS = {
+    'a', 'o', 'as', 'os', 'um', 'uma', 'uns', 'umas', 'de', 'do', 'da', 'dos', 'das',
+    'em', 'no', 'na', 'nos', 'nas', 'por', 'pelo', 'pela', 'para', 'pra', 'com',
+    'e', 'ou', 'que', 'qual', 'quais', 'sao', 'eh', 'me', 'mim', 'eu', 'voce',
+    'favor', 'mostre', 'mostrar', 'liste', 'listar', 'exiba', 'exibir',
+    'traga', 'trazer', 'quero', 'gostaria', 'ver', 'se', 'ao', 'aos',
+    'todos', 'todas', 'isso', 'esse', 'essa', 'este', 'esta',
+}
+
+# Palavras que invertem ou restringem o sentido e nunca podem ser ignoradas
+# na comparação aproximada
+CRITICAL_WORDS = {
+    'nao', 'sem', 'nunca', 'nenhum', 'nenhuma', 'exceto', 'menos', 'mais',
+    'maior', 'menor', 'maiores', 'menores', 'primeiro', 'ultimo', 'antes', 'depois',
+}
+
+
+def normalize_question(question: str) -> List[str]:
+    """
+    Normaliza a pergunta em uma lista de tokens
+
+    Remove acentos, pontuação, caixa e palavras vazias. Números formatados
+    (CPF/CNPJ, datas) são reduzidos aos dígitos para que
+    "34.019.100/0001-81" e "34019100000181" sejam equivalentes.
+
+    Args:
+        question: Pergunta do usuário
+
+    Returns:
+        Lista de tokens normalizados, na ordem original
+    """
+    text = unicodedata.normalize('NFKD', question.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+
+    # Junta dígitos separados por pontuação de formatação (CPF, CNPJ, datas)
+    text = re.sub(r'(?<=\d)[.\-/](?=\d)', '', text)
+
+    tokens = []
+    for token in re.findall(r'[a-z0-9]+', text):
+        if token in STOPWORDS:
+            continue
+        # Plural simples: "parcelamentos" -> "parcelamento"
+        if not token.isdigit() and len(token) > 3 and token.endswith('s'):
+            token = token[:-1]
+        tokens.append(token)
+
+    return tokens
+
+
+def _signature(tokens: List[str]) -> tuple:
+    """
+    Tokens que precisam coincidir exatamente e na mesma ordem (números, negações, comparações)
+
+    A ordem importa: "menor que 100 e maior que 500" e "maior que 100 e
+    menor que 500" têm os mesmos tokens e pedem SQL diferentes.
+    """
+    return tuple(t for t in tokens if any(c.isdigit() for c in t) or t in CRITICAL_WORDS)
+
+
+class QuestionCache:
+    """Cache em disco de pergunta normalizada → SQL gerado pelo LLM"""
+
+    def __init__(self, cache_dir: Optional[str] = None, ttl: Optional[int] = None,
+                 similarity: Optional[float] = None):
+        """
+        Inicializa o cache de perguntas
+
+        Args:
+            cache_dir: Diretório do cache (padrão: CACHE_DIR/questions)
+            ttl: Tempo de vida das entradas em segundos (padrão: QUESTION_CACHE_TTL_SECONDS)
+            similarity: Similaridade mínima (Jaccard) entre as palavras das perguntas; 1.0
+                (padrão) exige os mesmos tokens na mesma ordem, valores menores ativam a
+                busca aproximada
+        """
+        self.cache_dir = cache_dir or os.path.join(CACHE_DIR, 'questions')
+        self.ttl = ttl or QUESTION_CACHE_TTL_SECONDS
+        self.similarity = similarity if similarity is not None else QUESTION_CACHE_SIMILARITY
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.cache = Cache(self.cache_dir)
+        print(f"🧠 Cache de perguntas inicializado em: {self.cache_dir}")
+
+    @staticmethod
+    def context_hash(schema_context: str, provider: str, model: str) -> str:
+        """
+        Gera hash do contexto que influencia o SQL gerado
+
+        Args:
+            schema_context: Contexto do schema enviado ao LLM
+            provider: Provedor de LLM ('gemini' ou 'ollama')
+            model: Nome do modelo
+
+        Returns:
+            Hash MD5 do contexto
+        """
+        content = f"{provider}\n{model}\n{schema_context}"
+        return hashlib.md5(content.encode()).hexdigest()
+
+    def _entry_key(self, tokens: List[str], context: str) -> str:
+        return 'q:' + hashlib.md5(f"{context}|{' '.join(tokens)}".encode()).hexdigest()
+
+    def _index_key(self, context: str) -> str:
+        return f'index:{context}'
+
+    def get(self, question: str, context: str) -> Optional[Dict[str, Any]]:
+        """
+        Busca resposta do LLM para a pergunta
+
+        Com similarity 1.0 (padrão), só a mesma lista de tokens normalizados,
+        na mesma ordem, é reaproveitada. Com similarity < 1.0, uma pergunta
+        com palavras parecidas é aceita ('similar') se números, negações e
+        comparações coincidirem, na mesma ordem.
+
+        Args:
+            question: Pergunta do usuário
+            context: Hash do contexto (ver context_hash)
+
+        Returns:
+            Dict com 'sql', 'explanation', 'tables_used' e 'match' ('exact' ou
+            'similar'), ou None se não encontrado
+        """
+        tokens = normalize_question(question)
+        if not tokens:
+            return None
+
+        entry = self.cache.get(self._entry_key(tokens, context))
+        if entry is not None:
+            print(f"✅ Pergunta em cache (exata): {question[:40]}...")
+            return {**entry, 'match': 'exact'}
+
+        if self.similarity >= 1:
+            print(f"❌ Pergunta fora do cache: {question[:40]}...")
+            return None
+
+        # Busca aproximada (opcional)
+        index = self.cache.get(self._index_key(context)) or []
+        token_set = set(tokens)
+        signature = _signature(tokens)
+        best_key, best_score = None, 0.0
+
+        for cached_tokens, key in index:
+            if _signature(cached_tokens) != signature:
+                continue
+            cached_set = set(cached_tokens)
+            score = len(token_set & cached_set) / len(token_set | cached_set)
+            if score > best_score:
+                best_key, best_score = key, score
+
+        if best_key and best_score >= self.similarity:
+            entry = self.cache.get(best_key)
+            if entry is not None:
+                print(f"✅ Pergunta em cache (similaridade {best_score:.2f}): {question[:40]}...")
+                return {**entry, 'match': 'similar'}
+
+        print(f"❌ Pergunta fora do cache: {question[:40]}...")
+        return None
+
+    def set(self, question: str, context: str, llm_response: Dict[str, Any]) -> None:
+        """
+        Armazena resposta do LLM para a pergunta
+
+        Args:
+            question: Pergunta do usuário
+            context: Hash do contexto (ver context_hash)
+            llm_response: Resposta do LLM com 'sql', 'explanation' e 'tables_used'
+        """
+        tokens = normalize_question(question)
+        if not tokens or not llm_response.get('sql') or 'error' in llm_response:
+            return
+
+        key = self._entry_key(tokens, context)
+        entry = {
+            'question': question,
+            'sql': llm_response['sql'],
+            'explanation': llm_response.get('explanation', ''),
+            'tables_used': llm_response.get('tables_used', []),
+            'created_at': time.time(),
+        }
+        self.cache.set(key, entry, expire=self.ttl)
+
+        # Atualiza índice de busca aproximada (mais recentes no final)
+        with self.cache.transact():
+            index_key = self._index_key(context)
+            index = [item for item in (self.cache.get(index_key) or []) if item[1] != key]
+            index.append((tokens, key))
+            self.cache.set(index_key, index[-QUESTION_CACHE_INDEX_SIZE:], expire=self.ttl)
+
+    def clear(self) -> None:
+        """Limpa todo o cache de perguntas"""
+        self.cache.clear()
+        print("🗑️  Cache de perguntas limpo")
+
+    def close(self) -> None:
+        """Fecha o acesso ao diretório do cache de perguntas"""
+        self.cache.close()
+
+    def get_stats(self) -> dict:
+        """Retorna estatísticas do cache de perguntas"""
+        return {
+            'size': sum(1 for key in self.cache.iterkeys() if str(key).startswith('q:')),
+            'directory': self.cache_dir,
+            'ttl_seconds': self.ttl,
+            'similarity': self.similarity
+        }
+
+
+# Exemplo de uso
+if __name__ == '__main__':
+    qcache = QuestionCache()
+    ctx = QuestionCache.context_hash('schema', 'gemini', 'gemini-2.0-flash-exp')
+
+    qcache.set("Quais são os parcelamentos ativos?", ctx, {
+        'sql': "SELECT * FROM agreements",
+        'explanation': 'Lista parcelamentos',
+        'tables_used': ['agreements']
+    })
+
+    print(qcache.get("quais sao os parcelamentos ativos", ctx))
+    print(qcache.get("Mostre os parcelamentos ativos", ctx))
+    print(qcache.get("Quais são os parcelamentos não ativos?", ctx))
@@ -0,0 +1,109 @@
+"""
+Result Codec - Serialização colunar (Arrow IPC + zstd) dos resultados em cache
+"""
+import pickle
+from typing import Any, Tuple
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # Sem pyarrow, todo resultado é serializado com pickle
+    pa = None
+
+
+# Primeiro byte do blob indica o formato
+FORMAT_ARROW = b'A'
+FORMAT_PICKLE = b'P'
+
+ARROW_COMPRESSION = 'zstd'
+
+
+def to_dataframe(results: Any) -> Any:
+    """
+    Converte lista de dicionários em DataFrame (outros valores são mantidos)
+
+    Se a lista traz os metadados das colunas (QueryResult.columns), o
+    DataFrame segue a ordem do SELECT e cada coluna recebe o dtype do tipo no
+    PostgreSQL, sem inspecionar os valores (mesmo sem linhas).
+    """
+    if isinstance(results, list) and all(isinstance(row, dict) for row in results):
+        columns = {column.name: column for column in getattr(results, 'columns', None) or ()}
+        frame = pd.DataFrame(results, columns=list(columns) or None)
+        dtypes = {name: column.dtype for name, column in columns.items() if column.dtype}
+        if dtypes:
+            try:
+                frame = frame.astype(dtypes)
+            except (TypeError, ValueError) as e:
+                print(f"⚠️  Tipos das colunas não aplicados: {e}")
+        return frame
+    return results
+
+
+def encode_results(results: Any) -> Tuple[bytes, Any]:
+    """
+    Serializa resultado para armazenamento em disco
+
+    Listas de dicionários e DataFrames são gravados em Arrow IPC comprimido
+    com zstd; tipos que o Arrow não representa (colunas com tipos mistos, por
+    exemplo) e demais valores usam pickle.
+
+    Args:
+        results: Lista de dicionários, DataFrame ou outro valor serializável
+
+    Returns:
+        Tupla (blob, valor decodificado equivalente), para que a camada em
+        memória guarde exatamente o que uma leitura do disco devolveria
+    """
+    value = to_dataframe(results)
+
+    if pa is not None and isinstance(value, pd.DataFrame):
+        try:
+            table = pa.Table.from_pandas(value, preserve_index=False)
+            sink = pa.BufferOutputStream()
+            options = pa.ipc.IpcWriteOptions(compression=ARROW_COMPRESSION)
+            with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+                writer.write_table(table)
+            return FORMAT_ARROW + sink.getvalue().to_pybytes(), value
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+            print(f"⚠️  Resultado não suportado pelo Arrow, usando pickle: {e}")
+
+    return FORMAT_PICKLE + pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), value
+
+
+def decode_results(blob: bytes) -> Any:
+    """
+    Desserializa blob gerado por encode_results
+
+    Args:
+        blob: Bytes armazenados no cache
+
+    Returns:
+        DataFrame (formato Arrow) ou o valor original (pickle)
+    """
+    data = memoryview(blob)
+    if data[:1] == FORMAT_ARROW:
+        if pa is None:
+            raise RuntimeError("pyarrow é necessário para ler resultados em formato Arrow")
+        with pa.ipc.open_file(pa.py_buffer(data[1:])) as reader:
+            return reader.read_all().to_pandas()
+    return pickle.loads(data[1:])
+
+
+def copy_results(value: Any) -> Any:
+    """
+    Cópia de um resultado mantido em memória, para entregar a quem consulta
+
+    DataFrames são mutáveis e a camada em memória atende todas as sessões:
+    sem a cópia, uma sessão que altera o DataFrame (rename, sort inplace,
+    nova coluna) alteraria o resultado das demais.
+    """
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    return value
+
+
+def estimate_size(value: Any, blob: bytes) -> int:
+    """Bytes ocupados em memória pelo valor decodificado (aproximado)"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    return len(blob)
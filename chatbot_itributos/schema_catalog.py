@@ -0,0 +1,296 @@
+"""
+Schema Catalog - Contexto do schema para o LLM a partir do pg_catalog
+
+Colunas, tipos, chaves primárias e estrangeiras de todas as tabelas vêm de
+uma única query. O texto gerado é guardado em disco sob a impressão digital
+do DDL, então reinícios e novas sessões o carregam sem consultar o catálogo.
+"""
+import hashlib
+import os
+from collections import namedtuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from diskcache import Cache
+from config import CACHE_DIR
+
+
+# Alterar quando o formato do texto mudar, para descartar contextos antigos
+SCHEMA_CONTEXT_VERSION = 2
+
+# Impressão digital do DDL das tabelas: colunas, tipos, nulidade e restrições
+FINGERPRINT_SQL = """
+    SELECT md5(
+        coalesce(string_agg(
+            c.relname || '.' || a.attname || ':' || format_type(a.atttypid, a.atttypmod)
+                || ':' || a.attnotnull::text,
+            ',' ORDER BY c.relname, a.attnum
+        ), '')
+        || coalesce((
+            SELECT string_agg(con.conname || ':' || pg_get_constraintdef(con.oid), ',' ORDER BY con.conname)
+            FROM pg_constraint con
+            JOIN pg_class cc ON cc.oid = con.conrelid
+            WHERE cc.relname::text = ANY (%s) AND pg_table_is_visible(cc.oid) AND con.contype IN ('p', 'f')
+        ), '')
+    ) AS fingerprint
+    FROM pg_class c
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    WHERE c.relname::text = ANY (%s)
+      AND c.relkind IN ('r', 'p', 'v', 'm')
+      AND pg_table_is_visible(c.oid)
+"""
+
+# Colunas de todas as tabelas com chave primária e chave estrangeira (se houver)
+CATALOG_SQL = """
+    SELECT
+        c.relname AS table_name,
+        a.attname AS column_name,
+        format_type(a.atttypid, a.atttypmod) AS data_type,
+        a.attnotnull AS not_null,
+        EXISTS (
+            SELECT 1 FROM pg_constraint pk
+            WHERE pk.conrelid = c.oid AND pk.contype = 'p' AND a.attnum = ANY (pk.conkey)
+        ) AS primary_key,
+        fk.ref_table,
+        fk.ref_column
+    FROM pg_class c
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    LEFT JOIN LATERAL (
+        SELECT rc.relname AS ref_table, ra.attname AS ref_column
+        FROM pg_constraint f
+        CROSS JOIN LATERAL unnest(f.conkey, f.confkey) AS k(attnum, ref_attnum)
+        JOIN pg_class rc ON rc.oid = f.confrelid
+        JOIN pg_attribute ra ON ra.attrelid = f.confrelid AND ra.attnum = k.ref_attnum
+        WHERE f.conrelid = c.oid AND f.contype = 'f' AND k.attnum = a.attnum
+        ORDER BY f.conname
+        LIMIT 1
+    ) fk ON true
+    WHERE c.relname::text = ANY (%s)
+      AND c.relkind IN ('r', 'p', 'v', 'm')
+      AND pg_table_is_visible(c.oid)
+    ORDER BY c.relname, a.attnum
+"""
+
+# Relacionamentos sem chave estrangeira no banco e que a convenção <tabela>_id
+# não revela (associações polimórficas, nomes irregulares, colunas de status)
+MANUAL_RELATIONSHIPS = [
+    ('payments', 'payable_id', 'agreements', 'id', "quando payable_type='Agreement'"),
+    ('payments', 'person_id', 'unico_people', 'id', None),
+    ('agreement_operations', 'person_id', 'unico_people', 'id', None),
+    ('payment_parcels', 'status', 'payment_status', 'id', None),
+    ('active_debts', 'status', 'active_debt_status', 'id', None),
+]
+
+# Orientações exibidas junto das colunas quando a tabela está no contexto
+TABLE_NOTES = {
+    'mv_agreement_parcel_summary': [
+        "Resumo pré-calculado de payments → payment_parcels: uma linha por acordo (agreement_id = agreements.id)",
+        "*_parcels = quantidade e *_amount = soma de payment_parcels.total por status (paid=5, open=1, cancelled=2)",
+        "USE esta view para quantidades e valores de parcelas por acordo em vez de agregar payment_parcels",
+        "Atualizada periodicamente: para parcelas individuais ou situação do momento exato, use payment_parcels",
+    ],
+}
+
+# Conhecimento de domínio que não está no catálogo
+DOMAIN_NOTES = """
+=== VALORES DE STATUS ===
+payment_parcels.status:
+  - 0 = Cancelado
+  - 1 = Aberto (em aberto, não pago)
+  - 5 = Pago
+
+active_debts.status:
+  - É um INTEGER que referencia active_debt_status.id
+  - NÃO existe coluna 'active_debt_status' na tabela active_debts
+  - Use: ad.status para filtrar, NÃO ad.active_debt_status
+
+=== CAMPOS IMPORTANTES ===
+unico_people:
+  - cpf_cnpj: CPF/CNPJ do contribuinte
+  - name: Nome do contribuinte
+
+payments:
+  - payable_type: 'Agreement' (parcelamento) ou outros
+  - payable_id: ID do acordo quando type='Agreement'
+  - person_id: ID do contribuinte
+
+agreements:
+  - protocol_number: Número do protocolo do parcelamento
+  - agreement_operation_id: FK para agreement_operations
+
+payment_entries:
+  - barcode: Código de barras do boleto"""
+
+Relationship = Tuple[str, str, str, str, Optional[str]]  # (tabela, coluna, tabela ref., coluna ref., observação)
+
+# Colunas de cada tabela e vizinhos pelos relacionamentos (usado na seleção de tabelas por pergunta)
+SchemaGraph = namedtuple('SchemaGraph', ['columns', 'neighbors'])
+
+
+def _derive_relationships(columns: List[Dict[str, Any]], tables: List[str]) -> List[Relationship]:
+    """
+    Relacionamentos das chaves estrangeiras, da convenção <tabela>_id e da lista manual
+
+    A convenção liga coluna 'agreement_operation_id' à tabela
+    'agreement_operations' (ou 'agreement_operation') quando ela está listada.
+    """
+    listed = set(tables)
+    relationships = []
+    seen = set()
+
+    def add(table, column, ref_table, ref_column, note=None):
+        if (table, column) in seen:
+            return
+        seen.add((table, column))
+        relationships.append((table, column, ref_table, ref_column, note))
+
+    for col in columns:
+        if col['ref_table']:
+            add(col['table_name'], col['column_name'], col['ref_table'], col['ref_column'])
+
+    for table, column, ref_table, ref_column, note in MANUAL_RELATIONSHIPS:
+        if table in listed:
+            add(table, column, ref_table, ref_column, note)
+
+    for col in columns:
+        name = col['column_name']
+        if not name.endswith('_id'):
+            continue
+        base = name[:-3]
+        for candidate in (base + 's', base + 'es', base):
+            if candidate in listed and candidate != col['table_name']:
+                add(col['table_name'], name, candidate, 'id')
+                break
+
+    return relationships
+
+
+def render_schema_context(columns: List[Dict[str, Any]], tables: List[str]) -> str:
+    """
+    Monta o texto do schema enviado ao LLM
+
+    Args:
+        columns: Linhas de CATALOG_SQL
+        tables: Tabelas na ordem de exibição
+
+    Returns:
+        Texto com colunas, relacionamentos e notas de domínio
+    """
+    by_table: Dict[str, List[Dict[str, Any]]] = {}
+    for col in columns:
+        by_table.setdefault(col['table_name'], []).append(col)
+
+    parts = []
+    for table in tables:
+        if table not in by_table:
+            print(f"Erro ao obter schema de {table}: tabela não encontrada")
+            continue
+        parts.append(f"\nTabela: {table}")
+        parts.append("Colunas:")
+        for col in by_table[table]:
+            nullable = "NOT NULL" if col['not_null'] else "NULL"
+            extra = " PK" if col['primary_key'] else ""
+            parts.append(f"  - {col['column_name']}: {col['data_type']} {nullable}{extra}")
+        if table in TABLE_NOTES:
+            parts.append("Observações:")
+            parts.extend(f"  - {note}" for note in TABLE_NOTES[table])
+
+    # Relacionamentos agrupados por tabela: saída (→) e entrada (←)
+    relationships = _derive_relationships(columns, tables)
+    parts.append("\n=== RELACIONAMENTOS (CRÍTICO) ===")
+    for table in tables:
+        lines = []
+        for source, column, ref_table, ref_column, note in relationships:
+            suffix = f" ({note})" if note else ""
+            if source == table:
+                lines.append(f"  - {source}.{column} → {ref_table}.{ref_column}{suffix}")
+            if ref_table == table:
+                lines.append(f"  - {ref_table}.{ref_column} ← {source}.{column}{suffix}")
+        if lines:
+            parts.append(f"{table}:")
+            parts.extend(lines)
+            parts.append("")
+
+    if parts[-1] == "":
+        parts.pop()
+    parts.append(DOMAIN_NOTES)
+    return "\n".join(parts)
+
+
+def build_schema_graph(columns: List[Dict[str, Any]], tables: List[str]) -> SchemaGraph:
+    """
+    Grafo não direcionado das tabelas pelos mesmos relacionamentos do contexto
+
+    Args:
+        columns: Linhas de CATALOG_SQL
+        tables: Tabelas consideradas
+
+    Returns:
+        SchemaGraph com as colunas de cada tabela e os vizinhos de cada tabela
+    """
+    by_table = {table: [] for table in tables}
+    for col in columns:
+        by_table.setdefault(col['table_name'], []).append(col['column_name'])
+    by_table = {table: names for table, names in by_table.items() if names}  # Só as que existem no banco
+
+    neighbors = {table: set() for table in by_table}
+    for source, _, ref_table, _, _ in _derive_relationships(columns, tables):
+        if source in neighbors and ref_table in neighbors and source != ref_table:
+            neighbors[source].add(ref_table)
+            neighbors[ref_table].add(source)
+    return SchemaGraph(by_table, neighbors)
+
+
+class SchemaStore:
+    """Contextos de schema já gerados, guardados em disco pela impressão digital do DDL"""
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        """
+        Args:
+            cache_dir: Diretório do armazenamento (padrão: CACHE_DIR/schema)
+        """
+        self.cache_dir = cache_dir or os.path.join(CACHE_DIR, 'schema')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.cache = Cache(self.cache_dir)
+
+    @staticmethod
+    def _tables_key(database: str, tables: List[str]) -> str:
+        return hashlib.md5(f"{database}|{','.join(tables)}".encode()).hexdigest()
+
+    @staticmethod
+    def _latest_key(kind: str, tables_key: str) -> tuple:
+        if kind == 'context':
+            return ('latest', SCHEMA_CONTEXT_VERSION, tables_key)
+        return ('latest', SCHEMA_CONTEXT_VERSION, tables_key, kind)
+
+    def get(self, database: str, tables: List[str], fingerprint: str, kind: str = 'context') -> Optional[Any]:
+        """Contexto (ou grafo, kind='graph') gerado para este DDL, ou None"""
+        return self.cache.get((kind, SCHEMA_CONTEXT_VERSION, self._tables_key(database, tables), fingerprint))
+
+    def get_latest(self, database: str, tables: List[str], kind: str = 'context') -> Optional[Any]:
+        """Último contexto gerado para as tabelas (usado se o catálogo estiver inacessível)"""
+        return self.cache.get(self._latest_key(kind, self._tables_key(database, tables)))
+
+    def set(self, database: str, tables: List[str], fingerprint: str, value: Any, kind: str = 'context') -> None:
+        """Guarda o contexto (ou grafo) gerado para este DDL"""
+        tables_key = self._tables_key(database, tables)
+        self.cache.set((kind, SCHEMA_CONTEXT_VERSION, tables_key, fingerprint), value)
+        self.cache.set(self._latest_key(kind, tables_key), value)
+
+
+def schema_fingerprint(execute: Callable[..., List[Dict[str, Any]]], tables: List[str]) -> str:
+    """
+    Impressão digital do DDL das tabelas (muda com qualquer ALTER/CREATE/DROP relevante)
+
+    Args:
+        execute: Função que executa SQL com parâmetros (DatabaseService.execute_query)
+        tables: Tabelas consideradas
+
+    Returns:
+        Hash MD5 calculado no servidor
+    """
+    rows = execute(FINGERPRINT_SQL, (list(tables), list(tables)))
+    return rows[0]['fingerprint'] if rows else ''
+
+
+def load_catalog(execute: Callable[..., List[Dict[str, Any]]], tables: List[str]) -> List[Dict[str, Any]]:
+    """Colunas, tipos e chaves de todas as tabelas em uma única query"""
+    return execute(CATALOG_SQL, (list(tables),))
@@ -0,0 +1,171 @@
+"""
+Schema Pruning - Seleção das tabelas relevantes para cada pergunta
+
+Em vez de enviar ao LLM o schema de todas as tabelas, as tabelas recebem
+pontos pelas palavras da pergunta (termos e sinônimos do domínio, nomes de
+colunas) e as escolhidas são ligadas pelo caminho mais curto no grafo de
+relacionamentos, para que os JOINs necessários continuem no contexto.
+"""
+from collections import deque
+from typing import Dict, List, Optional, Set
+from contributors import extract_documents
+from question_cache import normalize_question
+from schema_catalog import SchemaGraph
+
+
+# Termos da pergunta (já normalizados: sem acento, minúsculos, singular) que indicam cada tabela
+TABLE_TERMS = {
+    'unico_people': {
+        'contribuinte', 'pessoa', 'cpf', 'cnpj', 'nome', 'cadastro', 'email', 'telefone', 'empresa',
+        'devedor', 'cidadao', 'titular',
+    },
+    'payments': {
+        'pagamento', 'historico', 'financeiro', 'guia', 'cobranca', 'pago', 'pagou', 'realizado',
+        'quitado', 'valor',
+    },
+    'payment_parcels': {
+        'parcela', 'vencimento', 'vencida', 'vencido', 'atrasada', 'atraso', 'aberto', 'aberta',
+        'inadimplencia', 'inadimplente', 'cancelada', 'cancelado', 'ativo',
+    },
+    'payment_status': {'status', 'situacao'},
+    'active_debts': {'divida', 'inscricao', 'inscrito', 'cda', 'debito', 'situacao_divida'},
+    'active_debt_status': {'situacao_divida'},
+    'agreements': {'parcelamento', 'acordo', 'protocolo', 'negociacao', 'renegociacao'},
+    'agreement_operations': {'parcelamento', 'acordo', 'negociacao', 'data_acordo'},
+    'other_debts_agreement_operations': {'outros_debitos'},
+    'taxable_debts': {'tributo', 'imposto', 'iptu', 'iss', 'itbi', 'taxa', 'lancamento', 'tributario'},
+    'revenues': {'receita', 'arrecadacao', 'arrecadado', 'rubrica'},
+    'payment_entries': {'boleto', 'codigo_barra', 'baixa', 'entrada', 'banco', 'bancario'},
+    'graphic_files': {'arquivo', 'remessa', 'grafica', 'carne', 'impressao'},
+    'graphic_files_payment_parcels': {'carne', 'impressao'},
+    'mv_agreement_parcel_summary': {'parcelamento', 'acordo'},
+}
+
+# Expressões de duas palavras tratadas como um termo ("código de barras" → "codigo_barra");
+# as palavras isoladas deixam de contar ("situação" da dívida não é payment_status)
+PHRASES = {
+    ('codigo', 'barra'): 'codigo_barra',
+    ('outro', 'debito'): 'outros_debitos',
+    ('data', 'acordo'): 'data_acordo',
+    ('situacao', 'divida'): 'situacao_divida',
+}
+
+# Palavras da pergunta que correspondem a partes de nomes de colunas (em inglês)
+COLUMN_SYNONYMS = {
+    'vencimento': 'due',
+    'protocolo': 'protocol',
+    'telefone': 'phone',
+    'nome': 'name',
+    'boleto': 'barcode',
+    'descricao': 'description',
+}
+
+# Tabelas que entram sempre que um vizinho direto é selecionado: quem é o
+# contribuinte (nome, CPF/CNPJ) é parte de quase toda resposta sobre pagamentos e acordos
+CONTEXT_TABLES = {'unico_people'}
+
+# Pontos por termo do domínio e por parte de nome de coluna
+TERM_WEIGHT = 3
+COLUMN_WEIGHT = 1
+
+# Partes de nomes de colunas presentes em mais tabelas que isso não distinguem nada (id, created_at...)
+MAX_COLUMN_SPREAD = 2
+
+
+def _question_terms(question: str) -> Set[str]:
+    """Palavras normalizadas da pergunta, com as expressões de duas palavras"""
+    tokens = normalize_question(question)
+    terms = set(tokens)
+    for first, second in zip(tokens, tokens[1:]):
+        if (first, second) in PHRASES:
+            terms.add(PHRASES[(first, second)])
+            terms.difference_update((first, second))
+    terms.update(COLUMN_SYNONYMS[t] for t in tokens if t in COLUMN_SYNONYMS)
+    return terms
+
+
+def score_tables(question: str, graph: SchemaGraph) -> Dict[str, int]:
+    """
+    Pontuação de cada tabela para a pergunta
+
+    Args:
+        question: Pergunta do usuário
+        graph: Colunas e relacionamentos das tabelas (DatabaseService.get_schema_graph)
+
+    Returns:
+        Dict tabela -> pontos (só as tabelas com pontos)
+    """
+    terms = _question_terms(question)
+    scores = {}
+    for table in graph.columns:
+        hits = len(terms & TABLE_TERMS.get(table, set()))
+        if hits:
+            scores[table] = scores.get(table, 0) + hits * TERM_WEIGHT
+
+    # Partes de nomes de colunas que aparecem em poucas tabelas
+    spread = {}
+    for table, columns in graph.columns.items():
+        for part in {p for column in columns for p in column.split('_')}:
+            spread.setdefault(part, set()).add(table)
+    for part in terms:
+        tables = spread.get(part, ())
+        if 0 < len(tables) <= MAX_COLUMN_SPREAD:
+            for table in tables:
+                scores[table] = scores.get(table, 0) + COLUMN_WEIGHT
+
+    # CPF/CNPJ citado: o contribuinte está na pergunta
+    if extract_documents(question) and 'unico_people' in graph.columns:
+        scores['unico_people'] = scores.get('unico_people', 0) + TERM_WEIGHT
+    return scores
+
+
+def _shortest_path(graph: SchemaGraph, sources: Set[str], target: str) -> List[str]:
+    """Tabelas do caminho mais curto de qualquer tabela de sources até target (vazio se desconexo)"""
+    previous = {source: None for source in sources}
+    queue = deque(sources)
+    while queue:
+        table = queue.popleft()
+        if table == target:
+            path = []
+            while table is not None:
+                path.append(table)
+                table = previous[table]
+            return path
+        for neighbor in sorted(graph.neighbors.get(table, ())):
+            if neighbor not in previous:
+                previous[neighbor] = table
+                queue.append(neighbor)
+    return []
+
+
+def select_tables(question: str, graph: SchemaGraph) -> Optional[List[str]]:
+    """
+    Tabelas a enviar ao LLM para a pergunta
+
+    As tabelas pontuadas são ligadas, da mais para a menos pontuada, pelo
+    caminho mais curto no grafo de relacionamentos (as intermediárias entram
+    para que o JOIN seja possível); CONTEXT_TABLES vizinhas são incluídas.
+
+    Args:
+        question: Pergunta do usuário
+        graph: Colunas e relacionamentos das tabelas
+
+    Returns:
+        Tabelas na ordem do grafo, ou None se nenhuma for reconhecida (usar o schema completo)
+    """
+    scores = score_tables(question, graph)
+    if not scores:
+        return None
+
+    order = list(graph.columns)
+    seeds = sorted(scores, key=lambda table: (-scores[table], order.index(table)))
+    selected = {seeds[0]}
+    for table in seeds[1:]:
+        if table in selected:
+            continue
+        path = _shortest_path(graph, selected, table)
+        selected.update(path or [table])
+    for table in CONTEXT_TABLES:
+        if graph.neighbors.get(table, set()) & selected:
+            selected.add(table)
+    return [table for table in order if table in selected]
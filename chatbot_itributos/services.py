@@ -0,0 +1,107 @@
+"""
+Services - Instâncias compartilhadas pelo processo (banco, cache, LLM)
+
+O Streamlit executa o app.py uma vez por sessão, mas os módulos importados
+são carregados uma única vez por processo. As instâncias criadas aqui são
+reaproveitadas por todas as sessões; o session_state guarda apenas o estado
+do usuário (histórico, provedor escolhido, flags de processamento).
+"""
+import atexit
+import threading
+from typing import Dict, Optional
+from config import QUESTION_CACHE_ENABLED
+from database import DatabaseService
+from llm_service import LLMService
+from cache_manager import CacheManager
+from question_cache import QuestionCache
+from query_log import QueryLog
+from change_tracker import start_change_tracker, stop_change_tracker
+
+
+_lock = threading.RLock()
+_llm_lock = threading.Lock()  # Separado: iniciar o Ollama pode levar segundos
+_database: Optional[DatabaseService] = None
+_cache: Optional[CacheManager] = None
+_question_cache: Optional[QuestionCache] = None
+_query_log: Optional[QueryLog] = None
+_llms: Dict[str, LLMService] = {}
+
+
+def get_database() -> DatabaseService:
+    """Serviço de banco de dados compartilhado (conecta na primeira chamada)"""
+    global _database
+    with _lock:
+        if _database is None:
+            database = DatabaseService()
+            database.connect()
+            _database = database
+        return _database
+
+
+def get_cache() -> CacheManager:
+    """Cache de resultados compartilhado (inicia o monitoramento de alterações)"""
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = CacheManager()
+            start_change_tracker(_cache)
+        return _cache
+
+
+def get_question_cache() -> Optional[QuestionCache]:
+    """Cache de perguntas compartilhado (None se QUESTION_CACHE_ENABLED=false)"""
+    global _question_cache
+    if not QUESTION_CACHE_ENABLED:
+        return None
+    with _lock:
+        if _question_cache is None:
+            _question_cache = QuestionCache()
+        return _question_cache
+
+
+def get_query_log() -> QueryLog:
+    """Histórico persistente de perguntas compartilhado"""
+    global _query_log
+    with _lock:
+        if _query_log is None:
+            _query_log = QueryLog()
+        return _query_log
+
+
+def get_llm(provider: str) -> LLMService:
+    """
+    Serviço de LLM compartilhado por provedor
+
+    Falhas de inicialização não são guardadas: a próxima chamada tenta de novo.
+
+    Args:
+        provider: 'gemini' ou 'ollama'
+
+    Returns:
+        Instância de LLMService do provedor
+    """
+    with _llm_lock:
+        if provider not in _llms:
+            _llms[provider] = LLMService(provider=provider)
+        return _llms[provider]
+
+
+def shutdown() -> None:
+    """Encerra as instâncias compartilhadas (chamado automaticamente ao sair)"""
+    global _database, _cache, _question_cache
+    with _lock:
+        stop_change_tracker()
+        if _database is not None:
+            _database.disconnect()
+            _database = None
+        if _cache is not None:
+            _cache.close()
+            _cache = None
+        if _question_cache is not None:
+            _question_cache.close()
+            _question_cache = None
+    with _llm_lock:
+        _llms.clear()
+
+
+atexit.register(shutdown)
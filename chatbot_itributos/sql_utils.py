@@ -0,0 +1,554 @@
+"""
+SQL Utils - Tokenização e análise leve de SQL gerado pelo LLM
+"""
+import hashlib
+import re
+from collections import namedtuple
+from decimal import Decimal
+from typing import Any, List, Optional, Tuple
+
+
+Token = namedtuple('Token', ['kind', 'value'])
+
+# Coluna comparada em WHERE/ON: kind é 'eq' (=, IN, IS NULL), 'range' (<, >,
+# BETWEEN, LIKE) ou 'join' (igualdade entre colunas de tabelas diferentes)
+Predicate = namedtuple('Predicate', ['table', 'column', 'kind'])
+
+TOKEN_RE = re.compile(r"""
+     (?P<ws>\s+)
+    |(?P<line_comment>--[^\n]*)
+    |(?P<block_comment>/\*.*?\*/)
+    |(?P<string>[eE]?'(?:[^']|'')*')
+    |(?P<dollar>\$(?P<tag>[A-Za-z_]*)\$.*?\$(?P=tag)\$)
+    |(?P<quoted_ident>"(?:[^"]|"")*")
+    |(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    |(?P<param>%\(\w+\)s|%s|\$\d+)
+    |(?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    |(?P<op>::|[-+*/<>=~!@\#%^&|`?]+|[(),.;\[\]:{}])
+""", re.S | re.X)
+
+# Operadores de vários caracteres (->>, @>, <=) seguem a regra do PostgreSQL:
+# terminam em + ou - só se tiverem algum destes caracteres ("=-1" é "=" "-" "1")
+OPERATOR_SPECIAL_CHARS = set('~!@#%^&|`?')
+
+# Palavras após FROM que não são tabelas (ex.: EXTRACT(YEAR FROM data))
+FROM_FUNCTIONS = {'extract', 'substring', 'trim', 'overlay', 'position'}
+
+# Palavras que encerram uma lista de tabelas após FROM
+FROM_TERMINATORS = {
+    'where', 'group', 'order', 'having', 'limit', 'offset', 'union', 'intersect',
+    'except', 'window', 'fetch', 'for', 'returning', 'select',
+}
+
+
+def tokenize(sql: str, keep_whitespace: bool = False) -> List[Token]:
+    """
+    Divide o SQL em tokens
+
+    Args:
+        sql: Query SQL
+        keep_whitespace: Se True, mantém espaços e comentários
+
+    Returns:
+        Lista de tokens (kind, value)
+    """
+    tokens = []
+    pos = 0
+    while pos < len(sql):
+        match = TOKEN_RE.match(sql, pos)
+        if not match:
+            # Caractere desconhecido: mantém como operador isolado
+            tokens.append(Token('op', sql[pos]))
+            pos += 1
+            continue
+
+        kind = match.lastgroup
+        if kind == 'tag':
+            kind = 'dollar'
+        value = match.group(0)
+        if kind == 'op' and len(value) > 1 and value != '::':
+            value = _operator(value)
+        pos = match.start() + len(value)
+        if not keep_whitespace and kind in ('ws', 'line_comment', 'block_comment'):
+            continue
+        tokens.append(Token(kind, value))
+    return tokens
+
+
+def _operator(run: str) -> str:
+    """Operador no início de uma sequência de caracteres de operador"""
+    for comment in ('--', '/*'):
+        if comment in run[1:]:
+            run = run[:run.index(comment, 1)]
+    if not OPERATOR_SPECIAL_CHARS & set(run):
+        while len(run) > 1 and run[-1] in '+-':
+            run = run[:-1]
+    return run
+
+
+def _identifier(token: Token) -> str:
+    """Nome normalizado de um identificador (sem aspas, minúsculo se não citado)"""
+    if token.kind == 'quoted_ident':
+        return token.value[1:-1].replace('""', '"')
+    return token.value.lower()
+
+
+def _skip_parens(tokens: List[Token], i: int) -> int:
+    """Retorna a posição após o parêntese que fecha tokens[i] == '('"""
+    depth = 0
+    while i < len(tokens):
+        if tokens[i].value == '(':
+            depth += 1
+        elif tokens[i].value == ')':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return i
+
+
+def _cte_names(tokens: List[Token]) -> set:
+    """Nomes definidos em WITH name AS (...)"""
+    names = set()
+    for i, token in enumerate(tokens):
+        if token.kind not in ('word', 'quoted_ident') or i == 0:
+            continue
+        previous = tokens[i - 1].value.lower()
+        if previous not in ('with', 'recursive', ','):
+            continue
+        j = i + 1
+        # Lista opcional de colunas: name(col1, col2) AS (
+        if j < len(tokens) and tokens[j].value == '(':
+            j = _skip_parens(tokens, j)
+        if j + 1 < len(tokens) and tokens[j].value.lower() == 'as':
+            after = tokens[j + 1].value.lower()
+            if after == '(' or (after in ('materialized', 'not') and j + 2 < len(tokens)):
+                names.add(_identifier(token))
+    return names
+
+
+# Palavras que não podem ser alias de tabela (FROM payments WHERE ...)
+ALIAS_STOPWORDS = FROM_TERMINATORS | {
+    'on', 'using', 'join', 'inner', 'left', 'right', 'full', 'outer', 'cross',
+    'natural', 'lateral', 'as', 'tablesample', 'with', 'and', 'or',
+}
+
+
+def _from_items(tokens: List[Token]) -> List[tuple]:
+    """
+    Percorre as referências de FROM/JOIN (incluindo listas com vírgula)
+
+    Returns:
+        Lista de (tabela, índice do token de alias); tabela é None para
+        subconsultas e funções, e o índice é None quando não há alias
+    """
+    items = []
+    positional_parens = set()  # '(' de subconsulta/função em posição de tabela
+
+    def read_alias(i: int) -> Optional[int]:
+        if i < len(tokens) and tokens[i].value.lower() == 'as':
+            i += 1
+        if (i < len(tokens) and tokens[i].kind in ('word', 'quoted_ident')
+                and tokens[i].value.lower() not in ALIAS_STOPWORDS):
+            return i
+        return None
+
+    def read_table(i: int) -> int:
+        """Lê uma referência [schema.]tabela [AS alias] a partir de tokens[i]"""
+        if i < len(tokens) and tokens[i].value.lower() in ('only', 'lateral'):
+            i += 1
+        if i < len(tokens) and tokens[i].value == '(':
+            positional_parens.add(i)  # Subconsulta: tratada pelo laço principal
+            return i
+        if i >= len(tokens) or tokens[i].kind not in ('word', 'quoted_ident'):
+            return i
+        name = _identifier(tokens[i])
+        i += 1
+        while i + 1 < len(tokens) and tokens[i].value == '.' and tokens[i + 1].kind in ('word', 'quoted_ident'):
+            name = _identifier(tokens[i + 1])
+            i += 2
+        if i < len(tokens) and tokens[i].value == '(':
+            # Chamada de função (generate_series(...)) não é tabela
+            positional_parens.add(i)
+            return i
+        items.append((name, read_alias(i)))
+        return i
+
+    depth = 0
+    active_from = set()  # Níveis de parênteses com lista FROM aberta
+    paren_stack = []  # (índice do '(', pertence a EXTRACT/SUBSTRING/...)
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        value = token.value.lower()
+
+        if value == '(':
+            previous = tokens[i - 1].value.lower() if i > 0 else ''
+            paren_stack.append((i, previous in FROM_FUNCTIONS))
+            depth += 1
+        elif value == ')':
+            active_from.discard(depth)
+            depth = max(depth - 1, 0)
+            if paren_stack:
+                opened, _ = paren_stack.pop()
+                if opened in positional_parens:
+                    items.append((None, read_alias(i + 1)))
+        elif token.kind == 'word' and value in ('from', 'join'):
+            if not (paren_stack and paren_stack[-1][1]):
+                if value == 'from':
+                    active_from.add(depth)
+                i = read_table(i + 1)
+                continue
+        elif value == ',' and depth in active_from:
+            i = read_table(i + 1)
+            continue
+        elif token.kind == 'word' and value in FROM_TERMINATORS:
+            active_from.discard(depth)
+        i += 1
+
+    return items
+
+
+def top_level_limit(sql: str) -> Optional[int]:
+    """
+    LIMIT numérico da query principal (fora de subconsultas e CTEs)
+
+    Args:
+        sql: Query SQL
+
+    Returns:
+        Valor do LIMIT, ou None se não houver (ou não for um número)
+    """
+    tokens = tokenize(sql)
+    depth = 0
+    for i, token in enumerate(tokens):
+        if token.value == '(':
+            depth += 1
+        elif token.value == ')':
+            depth -= 1
+        elif depth == 0 and token.kind == 'word' and token.value.lower() == 'limit':
+            if i + 1 < len(tokens) and tokens[i + 1].kind == 'number' and tokens[i + 1].value.isdigit():
+                return int(tokens[i + 1].value)
+            return None
+    return None
+
+
+# Operadores de comparação que um índice B-tree pode aproveitar
+EQUALITY_OPERATORS = {'=', 'in', 'is'}
+RANGE_OPERATORS = {'<', '>', '<=', '>=', 'between', 'like'}
+
+
+def column_predicates(sql: str) -> List[Predicate]:
+    """
+    Colunas de tabelas usadas em comparações indexáveis (WHERE, ON, HAVING)
+
+    Aliases são resolvidos para o nome da tabela; colunas sem qualificação só
+    são atribuídas quando a query lê uma única tabela. Comparações negadas
+    (NOT IN, NOT LIKE, IS NOT NULL), expressões sobre a coluna e colunas de
+    CTEs ou subconsultas são ignoradas.
+
+    Args:
+        sql: Query SQL (literais ou parâmetros $1/%s)
+
+    Returns:
+        Lista de Predicate sem repetições, na ordem em que aparecem
+    """
+    tokens = tokenize(sql)
+    ctes = _cte_names(tokens)
+    aliases = {}
+    tables = set()
+    for name, index in _from_items(tokens):
+        if name is None or name in ctes:
+            continue
+        tables.add(name)
+        aliases.setdefault(name, name)
+        if index is not None:
+            aliases[_identifier(tokens[index])] = name
+    single_table = next(iter(tables)) if len(tables) == 1 else None
+
+    def is_name(i: int) -> bool:
+        return 0 <= i < len(tokens) and tokens[i].kind in ('word', 'quoted_ident')
+
+    def column_ending_at(i: int) -> Optional[Tuple[str, str]]:
+        """Referência de coluna terminando em tokens[i] (alias.coluna ou coluna)"""
+        if not is_name(i):
+            return None
+        if i >= 2 and tokens[i - 1].value == '.' and is_name(i - 2):
+            if i >= 3 and tokens[i - 3].value == '.':
+                return None  # schema.tabela.coluna: raro em SQL gerado
+            table = aliases.get(_identifier(tokens[i - 2]))
+            return (table, _identifier(tokens[i])) if table else None
+        if i >= 1 and tokens[i - 1].value == '.':
+            return None
+        if single_table and tokens[i].kind == 'word' and tokens[i].value.lower() not in ALIAS_STOPWORDS:
+            return single_table, _identifier(tokens[i])
+        return None
+
+    def column_starting_at(i: int) -> Optional[Tuple[str, str]]:
+        """Referência de coluna começando em tokens[i]; só alias.coluna (lado direito)"""
+        if is_name(i) and i + 2 < len(tokens) and tokens[i + 1].value == '.' and is_name(i + 2):
+            if i + 3 < len(tokens) and tokens[i + 3].value in ('.', '('):
+                return None
+            table = aliases.get(_identifier(tokens[i]))
+            return (table, _identifier(tokens[i + 2])) if table else None
+        return None
+
+    predicates = []
+
+    def add(table: str, column: str, kind: str) -> None:
+        predicate = Predicate(table, column, kind)
+        if predicate not in predicates:
+            predicates.append(predicate)
+
+    for k, token in enumerate(tokens):
+        op = token.value.lower()
+        if op not in EQUALITY_OPERATORS and op not in RANGE_OPERATORS:
+            continue
+        if token.kind == 'word' and k + 1 < len(tokens) and tokens[k + 1].value.lower() == 'not':
+            continue  # IS NOT NULL
+        left_end = k - 1
+        if left_end >= 0 and tokens[left_end].value.lower() == 'not':
+            continue  # NOT IN / NOT LIKE / NOT BETWEEN
+        if left_end >= 0 and tokens[left_end].value == ')':
+            left = None  # Expressão: lower(coluna), EXTRACT(...)
+        else:
+            left = column_ending_at(left_end)
+        right = column_starting_at(k + 1) if token.kind == 'op' else None
+
+        if op == '=' and left and right and left[0] != right[0]:
+            add(left[0], left[1], 'join')
+            add(right[0], right[1], 'join')
+            continue
+        kind = 'eq' if op in EQUALITY_OPERATORS else 'range'
+        if left and not right:
+            add(left[0], left[1], kind)
+        elif right and not left and tokens[left_end].kind in ('string', 'number', 'param'):
+            add(right[0], right[1], kind)
+    return predicates
+
+
+def extract_tables(sql: str) -> List[str]:
+    """
+    Extrai as tabelas lidas por uma query (FROM, JOIN e listas separadas por vírgula)
+
+    Nomes de CTEs, subconsultas e funções são ignorados; o schema é removido
+    (public.payments → payments). Em caso de dúvida o nome é incluído, pois
+    uma tabela a mais apenas invalida o cache com mais frequência.
+
+    Args:
+        sql: Query SQL
+
+    Returns:
+        Lista ordenada de nomes de tabelas
+    """
+    tokens = tokenize(sql)
+    ctes = _cte_names(tokens)
+    return sorted({name for name, _ in _from_items(tokens) if name and name not in ctes})
+
+
+def _canonical_tokens(sql: str) -> List[Token]:
+    """
+    Tokens da forma canônica do SQL
+
+    - comentários, espaços e ';' final são descartados
+    - palavras-chave, funções e identificadores sem aspas vão para minúsculas
+      (o PostgreSQL já os trata sem diferenciar maiúsculas)
+    - aliases de tabela são renomeados para t1, t2... na ordem de definição,
+      e o AS opcional antes deles é removido
+    - literais (strings, números) e identificadores entre aspas são mantidos
+      exatamente como escritos
+    """
+    tokens = tokenize(sql)
+    while tokens and tokens[-1].value == ';':
+        tokens.pop()
+
+    definitions = {index for _, index in _from_items(tokens) if index is not None}
+    used = {_identifier(t) for t in tokens if t.kind in ('word', 'quoted_ident')}
+
+    # Alias usado sem qualificar coluna (referência à linha inteira ou nome
+    # repetido de coluna) não é renomeado, para não igualar queries diferentes
+    bare = {
+        _identifier(t) for i, t in enumerate(tokens)
+        if t.kind in ('word', 'quoted_ident') and i not in definitions
+        and not (i > 0 and tokens[i - 1].value == '.')
+        and not (i + 1 < len(tokens) and tokens[i + 1].value == '.')
+    }
+
+    aliases = {}
+    for index in sorted(definitions):
+        alias = _identifier(tokens[index])
+        if alias not in aliases and alias not in bare:
+            canonical = f"t{len(aliases) + 1}"
+            while canonical in used:
+                canonical = '_' + canonical
+            aliases[alias] = canonical
+
+    result = []
+    for i, token in enumerate(tokens):
+        if token.kind in ('word', 'quoted_ident'):
+            ident = _identifier(token)
+            is_qualifier = (
+                i + 1 < len(tokens) and tokens[i + 1].value == '.'
+                and (i == 0 or tokens[i - 1].value != '.')
+            )
+            if ident in aliases and (i in definitions or is_qualifier):
+                result.append(Token('word', aliases[ident]))
+                continue
+            if token.kind == 'word' and ident == 'as' and i + 1 in definitions:
+                continue
+            result.append(Token(token.kind, ident if token.kind == 'word' else token.value))
+        elif token.kind == 'string' and token.value[0] == 'E':
+            result.append(Token('string', 'e' + token.value[1:]))
+        else:
+            result.append(token)
+    return result
+
+
+# Cláusulas cujos literais viram parâmetros (comparações). Fora delas o literal
+# faz parte da estrutura: lista do SELECT, ORDER BY 1 / GROUP BY 1, LIMIT
+PARAMETER_CLAUSES = {'where', 'on', 'having'}
+CLAUSE_KEYWORDS = {
+    'select', 'from', 'join', 'where', 'on', 'using', 'group', 'having', 'order',
+    'limit', 'offset', 'window', 'union', 'intersect', 'except', 'returning', 'fetch',
+}
+
+# Literais tipados (DATE '2024-01-01', INTERVAL '1 day') não aceitam parâmetro
+TYPED_LITERAL_PREFIXES = {'date', 'time', 'timestamp', 'timestamptz', 'interval'}
+
+# Literal ao lado de um operador aritmético (CURRENT_DATE - 30, valor * 1.1) fica
+# no texto: o tipo do resultado depende do tipo do literal
+ARITHMETIC_OPERATORS = {'+', '-', '*', '/', '%', '^'}
+
+# Tipo explícito dos parâmetros numéricos: sem ele, o PostgreSQL deduz o tipo
+# pela coluna (2.5 comparado a integer viraria 3). Strings ficam sem tipo
+# (unknown), como o literal original: o tipo vem do outro lado da comparação
+# (jsonb, uuid, enum, date...)
+PARAMETER_CASTS = {int: 'int8', Decimal: 'numeric'}
+
+
+def _literal_value(token: Token) -> Any:
+    """Valor Python de um literal string ou numérico"""
+    if token.kind == 'string':
+        return token.value[1:-1].replace("''", "'")
+    if token.value.isdigit():
+        return int(token.value)
+    return Decimal(token.value)
+
+
+def _parameterizable(tokens: List[Token], i: int) -> bool:
+    """Se o literal tokens[i] pode virar parâmetro sem mudar o significado da query"""
+    token = tokens[i]
+    previous = tokens[i - 1].value if i > 0 else ''
+    following = tokens[i + 1].value if i + 1 < len(tokens) else ''
+    if token.kind == 'string':
+        return not token.value.startswith('e')
+    return previous not in ARITHMETIC_OPERATORS and following not in ARITHMETIC_OPERATORS
+
+
+def parameterize(sql: str) -> Tuple[str, List[Any]]:
+    """
+    Troca os literais das comparações por parâmetros $1, $2::int8...
+
+    O modelo resultante é a forma canônica do SQL: consultas que diferem
+    só nos valores comparados (CPF/CNPJ, IDs) têm o mesmo modelo e podem
+    compartilhar um prepared statement. Números recebem o tipo do literal
+    (int8, numeric), ou o do cast já escrito ('1'::int); strings ficam sem
+    tipo e o servidor o deduz pela coluna comparada. Ficam no texto:
+    strings E'...' (com escapes), literais tipados e números em expressões
+    aritméticas.
+
+    Args:
+        sql: Query SQL sem parâmetros
+
+    Returns:
+        Tupla (modelo com $n, valores na ordem dos parâmetros)
+    """
+    tokens = _canonical_tokens(sql)
+    clauses = ['']  # Cláusula corrente em cada nível de parênteses
+    values = []
+    params = []
+    for i, token in enumerate(tokens):
+        value = token.value
+        if value == '(':
+            clauses.append(clauses[-1])
+        elif value == ')':
+            if len(clauses) > 1:
+                clauses.pop()
+        elif token.kind == 'word' and value in CLAUSE_KEYWORDS:
+            clauses[-1] = value
+        elif (token.kind in ('string', 'number') and clauses[-1] in PARAMETER_CLAUSES
+              and not (i > 0 and tokens[i - 1].value in TYPED_LITERAL_PREFIXES)
+              and _parameterizable(tokens, i)):
+            params.append(_literal_value(token))
+            value = f"${len(params)}"
+            cast = PARAMETER_CASTS.get(type(params[-1]))
+            if cast and not (i + 1 < len(tokens) and tokens[i + 1].value == '::'):
+                value += '::' + cast
+        values.append(value)
+    return ' '.join(values), params
+
+
+def canonicalize_sql(sql: str) -> str:
+    """
+    Forma canônica do SQL, usada como chave de cache
+
+    Queries que diferem apenas em formatação, comentários, caixa de
+    palavras-chave ou nomes de alias de tabela têm a mesma forma canônica;
+    literais diferentes ('Agreement' x 'agreement') continuam distintos.
+
+    Args:
+        sql: Query SQL
+
+    Returns:
+        SQL canônico em uma linha
+    """
+    return ' '.join(token.value for token in _canonical_tokens(sql))
+
+
+def shape_sql(sql: str) -> str:
+    """
+    Forma parametrizada do SQL: forma canônica com literais trocados por '?'
+
+    Listas IN (1, 2, 3) viram IN (?), de modo que todas as variações de uma
+    mesma consulta (contribuintes, datas, limites diferentes) têm o mesmo formato.
+
+    Args:
+        sql: Query SQL
+
+    Returns:
+        SQL parametrizado em uma linha
+    """
+    values = []
+    for token in _canonical_tokens(sql):
+        value = '?' if token.kind in ('string', 'number', 'dollar', 'param') else token.value
+        # Colapsa listas de literais: ( ? , ? , ? ) → ( ? )
+        if value == '?' and len(values) >= 2 and values[-1] == ',' and values[-2] == '?':
+            values.pop()
+            continue
+        values.append(value)
+    return ' '.join(values)
+
+
+def fingerprint(sql: str) -> str:
+    """Hash MD5 da forma canônica (identifica a query exata)"""
+    return hashlib.md5(canonicalize_sql(sql).encode()).hexdigest()
+
+
+def shape_fingerprint(sql: str) -> str:
+    """Hash MD5 da forma parametrizada (identifica o formato da query)"""
+    return hashlib.md5(shape_sql(sql).encode()).hexdigest()
+
+
+# Exemplo de uso
+if __name__ == '__main__':
+    sql = """
+        WITH ativos AS (SELECT payment_id FROM payment_parcels WHERE status = 1)
+        SELECT up.name, EXTRACT(YEAR FROM pm.created_at)
+        FROM public.payments pm, unico_people AS up
+        JOIN ativos ON ativos.payment_id = pm.id
+        LEFT JOIN (SELECT * FROM agreements) a ON a.id = pm.payable_id
+        WHERE up.id = pm.person_id -- FROM comentario
+    """
+    print(extract_tables(sql))
+    print(canonicalize_sql(sql))
+    print(shape_sql("SELECT * FROM payments AS x WHERE x.id IN (1, 2, 3) AND x.payable_type = 'Agreement';"))